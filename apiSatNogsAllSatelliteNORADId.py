@@ -1,10 +1,14 @@
 import requests
+import ijson
 import json
 import os
-from datetime import datetime, timedelta
-import pytz
+import time
 import ephem
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import errorSatNogs, medirSatNogs
+from tleStore import NUNCA, PASA, SIEMPRE, TLEStore
+from timeUtils import ephemAEpoch, epochAEphem, formatearFecha
 
 with open('config.json') as config_file:
     config = json.load(config_file)
@@ -16,49 +20,61 @@ elevation = config.get('elev')
 
 if api_key is None:
     raise ValueError("No API key found in config file.")
+
+# Directorio donde se guarda el catalogo de los satelites disponibles.
+DIRECTORIO_RECURSOS = os.path.join(os.path.dirname(__file__), 'resources')
+# Campos de SatNogs que se conservan de cada transmisor, el resto se descarta al leer la respuesta.
+CAMPOS_TRANSMISOR = ('uuid', 'description', 'alive', 'type', 'uplink_low', 'uplink_high', 'uplink_drift',
+                     'downlink_low', 'downlink_high', 'downlink_drift', 'mode', 'mode_id', 'uplink_mode',
+                     'invert', 'baud', 'norad_cat_id', 'status', 'service')
 # else:
 #     print(f"API Key: {api_key}")
 #     print(f"Longitude: {longitude}")
 #     print(f"Latitude: {latitude}")
 #     print(f"Elevation: {elevation}")
 
-def computoSatelite(tle_data):
+def computoSatelite(tle, vigente=True, visibilidad=PASA):
     """Computes the time of rising and setting of the Satellite.
 
+    Parameters:
+    tle (TLERecord): TLE of the satellite, None if SatNogs has no TLE for it.
+    vigente (bool, optional): False if the TLE is too old for a concise computation, see TLEStore.vigentes.
+    visibilidad (str, optional): Visibility from the station, see TLEStore.visibilidad. The pass is only searched for PASA.
+
     Returns:
     The time of rising and setting of the satellite and the last updated time of the TLE data.
     """
-    tle_data_parsed = [{'tle0': item['tle0'], 'tle1': item['tle1'], 'tle2': item['tle2'], 'Updated': item['updated']} for item in tle_data]
-    
-    if not tle_data_parsed:
+    if tle is None:
         Tiempo_Inicio = "No existen datos TLE del satelite, imposible hacer computo de la orbita"
         Tiempo_Fin = "No existen datos TLE del satelite, imposible hacer computo de la orbita"
         fechaUltimoActualizado = "No existen datos TLE del satelite, imposible hacer computo de la orbita"
         return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
 
-    nombre_satellite = f"{tle_data_parsed[0]['tle0']}"
-    if '0' in nombre_satellite: nombre_satellite = nombre_satellite.replace('0 ', '')
-    nombre_satellite = nombre_satellite.replace("/", "-")
-    tle1 = f"{tle_data_parsed[0]['tle1']}"
-    tle2 = f"{tle_data_parsed[0]['tle2']}"
-    Updated = f"{tle_data_parsed[0]['Updated']}"
-    Updated = Updated[:-5]
-    
-    ultimoActualizado = datetime.strptime(Updated, '%Y-%m-%dT%H:%M:%S.%f').replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Chile/Continental'))
-    now_time = datetime.now(pytz.timezone('Chile/Continental'))
-    time_difference = (now_time - ultimoActualizado)
-    fechaUltimoActualizado= ultimoActualizado.strftime('%Y-%m-%dT%H:%M:%S')
+    nombre_satellite = tle.nombre.replace("/", "-")
+    fechaUltimoActualizado = formatearFecha(tle.actualizado)
 
-    if time_difference > timedelta(days=3):
+    if not vigente:
         Tiempo_Inicio = "La TLE esta muy desactualizada para realizar un calculo conciso de la orbita del satelite"
         Tiempo_Fin = "La TLE esta muy desactualizada para realizar un calculo conciso de la orbita del satelite"
         return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
 
-    satellite = ephem.readtle(nombre_satellite, tle1, tle2)
+    if visibilidad == NUNCA:
+        Tiempo_Inicio = "Error de Computo, objeto nunca pasa por el area"
+        Tiempo_Fin = "Error de Computo, objeto nunca pasa por el area"
+        fechaUltimoActualizado = "Error de Computo, objeto nunca pasa por el area"
+        return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
+
+    if visibilidad == SIEMPRE:
+        Tiempo_Inicio = "Satelite estacionario, siempre visible desde la estacion"
+        Tiempo_Fin = "Satelite estacionario, siempre visible desde la estacion"
+        return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
+
+    satellite = ephem.readtle(nombre_satellite, tle.tle1, tle.tle2)
     obs = ephem.Observer()
     obs.lat = latitude
     obs.long = longitude
     obs.elev = elevation
+    obs.date = epochAEphem(time.time())
     try:
         tr, azr, tt, altt, ts, azs = obs.next_pass(satellite)
         
@@ -68,8 +84,8 @@ def computoSatelite(tle_data):
             fechaUltimoActualizado = "Error de Computo, objeto nunca pasa por el area"
             return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
         
-        Tiempo_Inicio = ephem.localtime(tr).strftime('%Y-%m-%dT%H:%M:%S')
-        Tiempo_Fin = ephem.localtime(ts).strftime('%Y-%m-%dT%H:%M:%S')
+        Tiempo_Inicio = formatearFecha(ephemAEpoch(tr))
+        Tiempo_Fin = formatearFecha(ephemAEpoch(ts))
         return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
     
     except ValueError:
@@ -78,43 +94,62 @@ def computoSatelite(tle_data):
         fechaUltimoActualizado = "Error de Computo, objeto nunca pasa por el area"
         return Tiempo_Inicio, Tiempo_Fin, fechaUltimoActualizado
 
+def leerRespuesta(response, campos=None):
+    """Parses a SatNogs list response incrementally, one record at a time, instead of loading the whole document.
+
+    Parameters:
+    response: Response of requests made with stream=True.
+    campos (tuple, optional): Fields kept from each record, all of them if None.
+
+    Returns:
+    Generator of the records of the list.
+    """
+    response.raw.decode_content = True
+    for item in ijson.items(response.raw, 'item', use_float=True):
+        if campos is None:
+            yield item
+        else:
+            yield {campo: item.get(campo) for campo in campos}
+
 def getTLESatelite():
     """Gets the TLE data from the SatNogs Database using their API
 
     Returns:
-    The TLE data of all the available satellites in the database of SatNogs.
+    The TLE data of all the available satellites in the database of SatNogs, as a TLEStore.
     """
     url = 'https://db.satnogs.org/api/tle/?norad_cat_id=&tle_source=&sat_id='
     headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
-    response = requests.get(url, headers)
-    if response.status_code == 200:
-        print(f'Conexion con la API exitosa: {response.status_code}\nObteniendo el listado de los TLE de los satelites')
-        tle_data = response.json()
-        if not tle_data:
-            tle_data = "No hay datos de transmisores registrados en SatNogs"
-        return tle_data
-    else:
-        print(f'Error en la solicitud: {response.status_code}')
-        return None
+    with medirSatNogs('tle'), requests.get(url, headers, stream=True) as response:
+        if response.status_code == 200:
+            print(f'Conexion con la API exitosa: {response.status_code}\nObteniendo el listado de los TLE de los satelites')
+            tle_data = TLEStore.fromSatNogs(leerRespuesta(response))
+            if not len(tle_data):
+                print("No hay datos de TLE registrados en SatNogs")
+            return tle_data
+        else:
+            errorSatNogs('tle', response.status_code)
+            print(f'Error en la solicitud: {response.status_code}')
+            return None
 
 def getTransmitterSatellite():
     """Gets the transmitter data from the SatNogs Database using their API
 
     Returns:
-    The transmitter data of all the available satellites in the database of SatNogs.
+    The transmitter data of all the available satellites in the database of SatNogs, only with the fields of CAMPOS_TRANSMISOR.
     """
     url = f'https://db.satnogs.org/api/transmitters/?uuid=&mode=&uplink_mode=&type=&satellite__norad_cat_id=&alive=&status=&service=&sat_id='
     headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
-    response = requests.get(url, headers)
-    if response.status_code == 200:
-        print(f'Conexion con la API exitosa: {response.status_code}\nObteniendo el listado de los tranmisores de disponibles de los satelites')
-        transmitter_data = response.json()
-        if not transmitter_data:
-            transmitter_data = "No hay datos de transmisores registrados en SatNogs"
-        return transmitter_data
-    else:
-        print(f'Error en la solicitud: {response.status_code}')
-        return None
+    with medirSatNogs('transmitters'), requests.get(url, headers, stream=True) as response:
+        if response.status_code == 200:
+            print(f'Conexion con la API exitosa: {response.status_code}\nObteniendo el listado de los tranmisores de disponibles de los satelites')
+            transmitter_data = list(leerRespuesta(response, CAMPOS_TRANSMISOR))
+            if not transmitter_data:
+                print("No hay datos de transmisores registrados en SatNogs")
+            return transmitter_data
+        else:
+            errorSatNogs('transmitters', response.status_code)
+            print(f'Error en la solicitud: {response.status_code}')
+            return None
 
 def getSatellitesData():
     """Gets a list of all satellite that are alive from the SatNogs Database using their API, 
@@ -123,52 +158,158 @@ def getSatellitesData():
     Returns:
     The data of all the available satellites in the database of SatNogs.
     """
+    catalog_data = getCatalogData()
+    if catalog_data is None:
+        return None
+    return catalog_data['satelites']
+
+def claveSatelite(satellite):
+    """Identity of a satellite between two snapshots of the catalog, its SatNogs sat_id or its NORAD id."""
+    return satellite.get('sat_id') or satellite.get('norad_cat_id')
+
+def _diffTransmisores(anteriores, actuales):
+    anteriores = {transmisor.get('uuid'): transmisor for transmisor in anteriores or []}
+    actuales = {transmisor.get('uuid'): transmisor for transmisor in actuales or []}
+    diff = {
+        'agregados': [transmisor for uuid, transmisor in actuales.items() if uuid not in anteriores],
+        'eliminados': [uuid for uuid in anteriores if uuid not in actuales],
+        'cambiados': [transmisor for uuid, transmisor in actuales.items() if uuid in anteriores and anteriores[uuid] != transmisor],
+    }
+    return {clave: valor for clave, valor in diff.items() if valor}
+
+def diffCatalogo(anterior, actual):
+    """Computes the changes between two snapshots of the catalog.
+
+    Parameters:
+    anterior, actual (list): Satellites of getCatalogData.
+
+    Returns:
+    Dict with:
+        "agregados": Satellites that are new, complete.
+        "eliminados": sat_id of the satellites that are gone.
+        "cambiados": For every changed satellite its "sat_id" and "norad_cat_id", "campos" with the new value of
+                     the changed fields, "sin_campos" with the removed fields and "transmitters" with the
+                     "agregados", "eliminados" (uuid) and "cambiados" transmitters.
+    Every list is empty when nothing changed.
+    """
+    anteriores = {claveSatelite(satellite): satellite for satellite in anterior}
+    claves_actuales = set()
+    agregados = []
+    cambiados = []
+    for satellite in actual:
+        clave = claveSatelite(satellite)
+        claves_actuales.add(clave)
+        previo = anteriores.get(clave)
+        if previo is None:
+            agregados.append(satellite)
+            continue
+        if previo == satellite:
+            continue
+        cambio = {'sat_id': clave, 'norad_cat_id': satellite.get('norad_cat_id')}
+        campos = {campo: valor for campo, valor in satellite.items()
+                  if campo != 'transmitters' and (campo not in previo or previo[campo] != valor)}
+        if campos:
+            cambio['campos'] = campos
+        sin_campos = [campo for campo in previo if campo not in satellite]
+        if sin_campos:
+            cambio['sin_campos'] = sin_campos
+        transmisores = _diffTransmisores(previo.get('transmitters'), satellite.get('transmitters'))
+        if transmisores:
+            cambio['transmitters'] = transmisores
+        cambiados.append(cambio)
+    return {
+        'agregados': agregados,
+        'eliminados': [clave for clave in anteriores if clave not in claves_actuales],
+        'cambiados': cambiados,
+    }
+
+def getCatalogData(anterior=None):
+    """Gets the satellites that are alive with their pass times and transmitters, like getSatellitesData,
+    and keeps the TLE used for each satellite so it can be propagated again without asking SatNogs.
+    Satellites that never rise over the station are not searched for passes, and the stationary ones
+    visible from it get their "Posicion_Estacionaria" {az, el} instead of pass times.
+
+    Parameters:
+    anterior (list, optional): Satellites of the previous refresh, to compute what changed since then.
+
+    Returns:
+    Dict with "satelites", the list of satellites, "tle", the TLERecord of each satellite by NORAD id,
+    "tle_store", the TLEStore of the catalog (None if the TLE request failed), and "diff", the
+    diffCatalogo against *anterior* (None without it).
+    None if the request fails.
+    """
     url = 'https://db.satnogs.org/api/satellites/?norad_cat_id=&status=alive&in_orbit=true&sat_id='
     headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
-    response = requests.get(url, headers)
-    if response.status_code == 200:
+    with medirSatNogs('satellites'), requests.get(url, headers, stream=True) as response:
+        if response.status_code != 200:
+            errorSatNogs('satellites', response.status_code)
+            print(f'Error en la solicitud: {response.status_code}')
+            return None
         print(f'Conexion con la API exitosa: {response.status_code}\nObteniendo el listado de los satelites vivos')
-        satellite_data = response.json()
-        transmitters = getTransmitterSatellite()
-        tle_data_all = getTLESatelite()
-
-        def process_satellite(satellite):
-            norad_cat_id = satellite["norad_cat_id"]
-
-            matching_tle_data = [t for t in tle_data_all if t["norad_cat_id"] == norad_cat_id]
-            if matching_tle_data:
-                return satellite, computoSatelite(matching_tle_data)
-            else:
-                return satellite, None
-
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {executor.submit(process_satellite, sat): sat for sat in satellite_data}
-            for future in as_completed(futures):
-                sat, result = future.result()
-                if result and isinstance(result, tuple):
-                    tiempo_inicio, tiempo_fin, ultimo_actualizado = result
-                    sat["Tiempo_Inicio"] = tiempo_inicio
-                    sat["Tiempo_Fin"] = tiempo_fin
-                    sat["Ultimo_actualizado"] = ultimo_actualizado
-
-                norad_cat_id = sat["norad_cat_id"]
-                matching_transmitters = [t for t in transmitters if t["norad_cat_id"] == norad_cat_id]
-                sat["transmitters"] = matching_transmitters
-            
-
-        satelliteInOrbit_available_file = "SatelliteDataSatNogsAliveInOrbit.json"
-        dir = os.path.dirname(__file__)
-        newDir = os.path.join(dir, 'resources', satelliteInOrbit_available_file)
-        os.makedirs(os.path.dirname(newDir), exist_ok=True)
-        with open(newDir, 'w', encoding="utf-8") as file:
-            json.dump(satellite_data, file, ensure_ascii=False, indent=4)
-        print(f'Se han guardado los satelites disponibles en SatNogs en la direccion:')
-        print(f'{newDir}')
-
-        return satellite_data
+        satellite_data = list(leerRespuesta(response))
+
+    # Se agrupan los transmisores por satelite a medida que se leen, en vez de recorrer las listas completas por cada satelite.
+    # Las TLE ya quedan una por satelite en el TLEStore, y su vigencia y visibilidad se calculan para todas a la vez.
+    tle_store = getTLESatelite()
+    if tle_store is not None:
+        ahora = time.time()
+        tle_por_norad = tle_store.registros()
+        norad_ids = tle_store.norad_ids.tolist()
+        vigentes = dict(zip(norad_ids, tle_store.vigentes(ahora).tolist()))
+        visibilidad, az, el = tle_store.visibilidad(latitude, longitude, elevation, ahora)
+        visibilidades = dict(zip(norad_ids, visibilidad.tolist()))
+        posiciones = {norad_ids[fila]: {'az': round(float(az[fila]), 1), 'el': round(float(el[fila]), 1)}
+                      for fila in np.flatnonzero(visibilidad == SIEMPRE)}
     else:
-        print(f'Error en la solicitud: {response.status_code}')
-        return None
+        tle_por_norad = {}
+        vigentes = {}
+        visibilidades = {}
+        posiciones = {}
+    transmitters_por_norad = {}
+    for t in getTransmitterSatellite() or []:
+        transmitters_por_norad.setdefault(t["norad_cat_id"], []).append(t)
+
+    def process_satellite(satellite):
+        norad_cat_id = satellite["norad_cat_id"]
+
+        matching_tle_data = tle_por_norad.get(norad_cat_id)
+        if matching_tle_data:
+            return satellite, computoSatelite(matching_tle_data, vigentes[norad_cat_id], visibilidades[norad_cat_id])
+        else:
+            return satellite, None
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {executor.submit(process_satellite, sat): sat for sat in satellite_data}
+        for future in as_completed(futures):
+            sat, result = future.result()
+            if result and isinstance(result, tuple):
+                tiempo_inicio, tiempo_fin, ultimo_actualizado = result
+                sat["Tiempo_Inicio"] = tiempo_inicio
+                sat["Tiempo_Fin"] = tiempo_fin
+                sat["Ultimo_actualizado"] = ultimo_actualizado
+
+            norad_cat_id = sat["norad_cat_id"]
+            if norad_cat_id in posiciones and vigentes[norad_cat_id]:
+                sat["Posicion_Estacionaria"] = posiciones[norad_cat_id]
+            sat["transmitters"] = transmitters_por_norad.get(norad_cat_id, [])
+        
+
+    satelliteInOrbit_available_file = "SatelliteDataSatNogsAliveInOrbit.json"
+    newDir = os.path.join(DIRECTORIO_RECURSOS, satelliteInOrbit_available_file)
+    os.makedirs(DIRECTORIO_RECURSOS, exist_ok=True)
+    # Se escribe satelite por satelite, sin armar el documento completo en memoria.
+    with open(newDir, 'w', encoding="utf-8") as file:
+        file.write('[\n')
+        for posicion, sat in enumerate(satellite_data):
+            if posicion:
+                file.write(',\n')
+            json.dump(sat, file, ensure_ascii=False)
+        file.write('\n]\n')
+    print(f'Se han guardado los satelites disponibles en SatNogs en la direccion:')
+    print(f'{newDir}')
+
+    diff = diffCatalogo(anterior, satellite_data) if anterior is not None else None
+    return {'satelites': satellite_data, 'tle': tle_por_norad, 'tle_store': tle_store, 'diff': diff}
 
 if __name__ == '__main__':
     getSatellitesData()
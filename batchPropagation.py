@@ -0,0 +1,153 @@
+"""Vectorized SGP4 propagation of many TLEs at once.
+
+All the satellites are propagated together with sgp4's SatrecArray, and the conversion from TEME
+to the topocentric frame of the station (azimuth, elevation, range) is done with NumPy arrays.
+"""
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+
+from dopplerSeries import geodeticAEcef
+
+# Velocidad angular de rotación de la Tierra en rad/s
+OMEGA_TIERRA = 7.292115146706979e-5
+
+def epochAJulian(epochs):
+    """Converts UNIX epochs in seconds to the (jd, fr) pair used by sgp4, keeping the precision of the fraction."""
+    dias = np.asarray(epochs, dtype=float) / 86400.0
+    enteros = np.floor(dias)
+    return enteros + 2440587.5, dias - enteros
+
+def gmst(jd, fr):
+    """Greenwich mean sidereal time in radians (IAU 1982), same model used by SGP4 for the TEME frame."""
+    tut1 = (jd - 2451545.0 + fr) / 36525.0
+    temp = (-6.2e-6 * tut1 * tut1 * tut1 + 0.093104 * tut1 * tut1
+            + (876600.0 * 3600 + 8640184.812866) * tut1 + 67310.54841)
+    return np.mod(np.radians(temp / 240.0), 2 * np.pi)
+
+def temeAEcef(r, v, jd, fr):
+    """Rotates TEME positions and velocities (km, km/s) to the Earth-fixed frame, ignoring polar motion.
+
+    Parameters:
+    r, v (array): Arrays of shape (n, m, 3), n satellites and m instants.
+    jd, fr (array): Julian date of the m instants.
+
+    Returns:
+    Positions and velocities in the Earth-fixed frame, same shape as the input.
+    """
+    theta = gmst(jd, fr)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    x = cos_t * r[..., 0] + sin_t * r[..., 1]
+    y = -sin_t * r[..., 0] + cos_t * r[..., 1]
+    r_ecef = np.stack((x, y, r[..., 2]), axis=-1)
+    vx = cos_t * v[..., 0] + sin_t * v[..., 1] + OMEGA_TIERRA * y
+    vy = -sin_t * v[..., 0] + cos_t * v[..., 1] - OMEGA_TIERRA * x
+    v_ecef = np.stack((vx, vy, v[..., 2]), axis=-1)
+    return r_ecef, v_ecef
+
+def topocentrico(r_ecef, v_ecef, lat, lon, elev):
+    """Computes the look angles from a station to Earth-fixed positions.
+
+    Parameters:
+    r_ecef, v_ecef (array): Positions (km) and velocities (km/s) of shape (..., 3).
+    lat, lon (float): Latitude and longitude of the station in degrees.
+    elev (float): Elevation of the station in meters.
+
+    Returns:
+    Azimuth and elevation in degrees, range in km and range-rate in km/s.
+    """
+    estacion = geodeticAEcef(float(lat), float(lon), float(elev)) / 1000.0
+    d = r_ecef - estacion
+    phi = np.radians(float(lat))
+    lam = np.radians(float(lon))
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+    este = -sin_lam * d[..., 0] + cos_lam * d[..., 1]
+    norte = -sin_phi * cos_lam * d[..., 0] - sin_phi * sin_lam * d[..., 1] + cos_phi * d[..., 2]
+    arriba = cos_phi * cos_lam * d[..., 0] + cos_phi * sin_lam * d[..., 1] + sin_phi * d[..., 2]
+    rango = np.sqrt(este * este + norte * norte + arriba * arriba)
+    az = np.mod(np.degrees(np.arctan2(este, norte)), 360.0)
+    el = np.degrees(np.arctan2(arriba, np.hypot(este, norte)))
+    tasa_rango = np.einsum('...i,...i->...', d, v_ecef) / rango
+    return az, el, rango, tasa_rango
+
+class BatchPropagator:
+    """Set of TLEs propagated together."""
+
+    def __init__(self, tles):
+        """Parses the TLEs.
+
+        Parameters:
+        tles (iterable): Tuples (norad_cat_id, nombre, tle1, tle2). TLEs that sgp4 cannot parse are skipped.
+        """
+        norad_ids = []
+        nombres = []
+        satrecs = []
+        for norad_cat_id, nombre, tle1, tle2 in tles:
+            try:
+                satrec = Satrec.twoline2rv(tle1, tle2)
+            except ValueError:
+                continue
+            norad_ids.append(norad_cat_id)
+            nombres.append(nombre)
+            satrecs.append(satrec)
+        self.norad_ids = np.array(norad_ids, dtype=np.int64)
+        self.nombres = nombres
+        self._satrecs = SatrecArray(satrecs) if satrecs else None
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def propagate(self, epochs):
+        """Propagates every satellite to the given instants.
+
+        Parameters:
+        epochs (array): UNIX epochs in seconds.
+
+        Returns:
+        Earth-fixed positions (km) and velocities (km/s) of shape (n, m, 3), and a boolean array (n, m)
+        that is False where SGP4 returned an error (decayed orbit, bad elements).
+        """
+        epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+        if self._satrecs is None:
+            vacio = np.zeros((0, len(epochs), 3))
+            return vacio, vacio, np.zeros((0, len(epochs)), dtype=bool)
+        jd, fr = epochAJulian(epochs)
+        error, r, v = self._satrecs.sgp4(jd, fr)
+        r_ecef, v_ecef = temeAEcef(r, v, jd, fr)
+        return r_ecef, v_ecef, error == 0
+
+    def lookAngles(self, epochs, lat, lon, elev):
+        """Propagates every satellite and computes its azimuth, elevation, range and range-rate from the station.
+
+        Returns:
+        Arrays of shape (n, m): azimuth and elevation in degrees, range in km, range-rate in km/s, and validity.
+        """
+        r_ecef, v_ecef, valido = self.propagate(epochs)
+        az, el, rango, tasa_rango = topocentrico(r_ecef, v_ecef, lat, lon, elev)
+        return az, el, rango, tasa_rango, valido
+
+    def visibles(self, epochs, lat, lon, elev, elevacion_minima=0.0):
+        """Returns the satellites above *elevacion_minima* at each of the instants.
+
+        Returns:
+        A list with one entry per instant, each a list of dicts with norad_cat_id, name, az, el and range.
+        """
+        epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+        az, el, rango, _, valido = self.lookAngles(epochs, lat, lon, elev)
+        visibles = valido & (el >= elevacion_minima)
+
+        instantes = []
+        for j in range(len(epochs)):
+            indices = np.flatnonzero(visibles[:, j])
+            instantes.append([
+                {
+                    'norad_cat_id': int(self.norad_ids[i]),
+                    'name': self.nombres[i],
+                    'az': round(float(az[i, j]), 1),
+                    'el': round(float(el[i, j]), 1),
+                    'rango_km': round(float(rango[i, j]), 1),
+                }
+                for i in indices
+            ])
+        return instantes
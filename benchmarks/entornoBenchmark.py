@@ -0,0 +1,136 @@
+"""Fixed environment of the benchmarks: clock, station, SatNogs and serial port.
+
+instalar() must run before the modules of the services are imported. It moves to a temporary
+directory with the config.json of the fixtures (the modules read it at import, and ROT2Prog writes
+its log in the current directory), freezes time.time at the clock of escenario.json, answers
+requests.get with the recorded SatNogs lists and replaces the serial port of ROT2Prog with a
+controller in memory. Timings then measure only the CPU work of the services, without network or
+serial latency.
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(RAIZ, 'benchmarks', 'fixtures')
+
+class RespuestaGrabada:
+    """Response of requests with a recorded body, for both .json() and stream=True reads of .raw."""
+
+    def __init__(self, cuerpo, status_code=200):
+        self.status_code = status_code
+        self._cuerpo = cuerpo
+        self.raw = io.BytesIO(cuerpo)
+
+    def json(self):
+        return json.loads(self._cuerpo)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class SatNogsGrabado:
+    """Answers the SatNogs URLs used by the services with the lists of the fixtures.
+
+    The filters by NORAD id of the single-satellite requests are applied here, and their bodies are
+    kept after the first time, so the cost of the replay stays out of the timings.
+    """
+
+    def __init__(self, directorio=FIXTURES):
+        self._listas = {}
+        for nombre in ('satellites', 'tle', 'transmitters'):
+            with open(os.path.join(directorio, f'{nombre}.json'), 'rb') as archivo:
+                self._listas[nombre] = archivo.read()
+        self._filtradas = {}
+
+    def _cuerpo(self, nombre, norad_cat_id):
+        if not norad_cat_id:
+            return self._listas[nombre]
+        clave = (nombre, norad_cat_id)
+        if clave not in self._filtradas:
+            registros = [registro for registro in json.loads(self._listas[nombre])
+                         if str(registro.get('norad_cat_id')) == norad_cat_id]
+            self._filtradas[clave] = json.dumps(registros).encode('utf-8')
+        return self._filtradas[clave]
+
+    def get(self, url, params=None, **kwargs):
+        partes = urlparse(url)
+        consulta = parse_qs(partes.query)
+        if partes.path.startswith('/api/satellites/'):
+            return RespuestaGrabada(self._cuerpo('satellites', None))
+        if partes.path.startswith('/api/tle/'):
+            return RespuestaGrabada(self._cuerpo('tle', consulta.get('norad_cat_id', [''])[0]))
+        if partes.path.startswith('/api/transmitters/'):
+            return RespuestaGrabada(self._cuerpo('transmitters', consulta.get('satellite__norad_cat_id', [''])[0]))
+        return RespuestaGrabada(b'{"detail": "Not found."}', 404)
+
+class SerialEnLazo:
+    """ROT2Prog controller in memory: answers status and stop, and moves instantly with set."""
+
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        self.name = port
+        self.az = 0.0
+        self.el = 0.0
+        self.resolucion = 10
+        self._salida = b''
+
+    def write(self, paquete):
+        paquete = bytes(paquete)
+        comando = paquete[11]
+        if comando == 0x2f:
+            self.az = int(paquete[1:5].decode()) / self.resolucion - 360
+            self.el = int(paquete[6:10].decode()) / self.resolucion - 360
+        elif comando in (0x0f, 0x1f):
+            self._salida += self._respuesta()
+
+    def _respuesta(self):
+        az = round((self.az + 360) * 10)
+        el = round((self.el + 360) * 10)
+        digitos = lambda valor: [valor // 1000, valor // 100 % 10, valor // 10 % 10, valor % 10]
+        return bytes([0x57] + digitos(az) + [self.resolucion] + digitos(el) + [self.resolucion, 0x20])
+
+    def read(self, cantidad):
+        leido, self._salida = self._salida[:cantidad], self._salida[cantidad:]
+        return leido
+
+def escenario(directorio=FIXTURES):
+    """Returns escenario.json: the clock, the NORAD id of the single-satellite predictions and the celestial body."""
+    with open(os.path.join(directorio, 'escenario.json')) as archivo:
+        return json.load(archivo)
+
+def instalar(directorio=FIXTURES):
+    """Installs the fixed environment and returns its escenario.
+
+    Returns:
+    Dict of escenario.json, plus "directorio", the temporary working directory.
+    """
+    datos = escenario(directorio)
+    trabajo = tempfile.mkdtemp(prefix='benchmarks-')
+    shutil.copy(os.path.join(directorio, 'config.json'), trabajo)
+    os.chdir(trabajo)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+    reloj = float(datos['reloj'])
+    time.time = lambda: reloj
+    requests.get = SatNogsGrabado(directorio).get
+
+    import rot2ProgInteractor
+    rot2ProgInteractor.serial.Serial = SerialEnLazo
+    # El catalogo se guarda en el directorio de trabajo, no en resources/ del repositorio.
+    import apiSatNogsAllSatelliteNORADId
+    apiSatNogsAllSatelliteNORADId.DIRECTORIO_RECURSOS = os.path.join(trabajo, 'resources')
+    datos['directorio'] = trabajo
+    return datos
@@ -0,0 +1,144 @@
+"""Records the SatNogs fixtures of the benchmarks.
+
+    python benchmarks/grabarFixtures.py                 # graba las respuestas de db.satnogs.org
+    python benchmarks/grabarFixtures.py --sintetico 200 # catálogo sintético, sin conexión
+
+The satellites, TLEs and transmitters are saved as the lists returned by SatNogs, together with
+escenario.json, that fixes the clock of the benchmarks at the moment of the recording and the
+satellite used for the single-satellite predictions. The synthetic catalog has the same shape,
+with TLEs generated with sgp4 at a fixed clock, so the suite can run without an API key.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+URLS = {
+    'satellites': 'https://db.satnogs.org/api/satellites/?norad_cat_id=&status=alive&in_orbit=true&sat_id=',
+    'tle': 'https://db.satnogs.org/api/tle/?norad_cat_id=&tle_source=&sat_id=',
+    'transmitters': 'https://db.satnogs.org/api/transmitters/?uuid=&mode=&uplink_mode=&type=&satellite__norad_cat_id=&alive=&status=&service=&sat_id=',
+}
+
+# Reloj del catálogo sintético, 2026-10-19T12:00:00 UTC.
+RELOJ_SINTETICO = datetime(2026, 10, 19, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+# Inclinaciones típicas de órbitas bajas: ISS, heliosincrónicas, Iridium y Starlink.
+INCLINACIONES = (51.6, 97.4, 97.6, 98.2, 86.4, 53.0)
+MODOS = ('FM', 'AFSK', 'GMSK', 'BPSK', 'CW', 'LoRa')
+# Cada tantos satelites uno es geoestacionario y uno de órbita baja casi ecuatorial, que no se ven todos desde la estación.
+CADA_GEO = 10
+CADA_ECUATORIAL = 20
+MOVIMIENTO_GEO = 1.00273791
+
+def guardar(nombre, datos):
+    with open(os.path.join(FIXTURES, nombre), 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=1)
+        archivo.write('\n')
+
+def fechaSatNogs(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f') + '+0000'
+
+def grabarSatNogs(api_key):
+    """Downloads the lists of SatNogs used by the services."""
+    headers = {'Authorization': f'Token {api_key}', 'Content-Type': 'application/json'}
+    for nombre, url in URLS.items():
+        response = requests.get(url, headers=headers, timeout=120)
+        response.raise_for_status()
+        guardar(f'{nombre}.json', response.json())
+        print(f'{nombre}: {len(response.json())} registros')
+    return time.time()
+
+def lineasTLE(norad_cat_id, epoch, inclinacion, movimiento_medio, raan, excentricidad, argumento_perigeo, anomalia_media):
+    from sgp4.api import WGS72, Satrec, jday
+    from sgp4.exporter import export_tle
+
+    fecha = datetime.fromtimestamp(epoch, timezone.utc)
+    jd, fr = jday(fecha.year, fecha.month, fecha.day, fecha.hour, fecha.minute, fecha.second)
+    satrec = Satrec()
+    satrec.sgp4init(WGS72, 'i', norad_cat_id, jd + fr - 2433281.5, 3e-5, 0.0, 0.0, excentricidad,
+                    math.radians(argumento_perigeo), math.radians(inclinacion), math.radians(anomalia_media),
+                    movimiento_medio * 2 * math.pi / 1440, math.radians(raan))
+    return export_tle(satrec)
+
+def catalogoSintetico(cantidad, reloj):
+    """Builds a catalog of *cantidad* satellites, the first one the ISS, with the shape of SatNogs.
+
+    Most are in low orbits; one of every CADA_GEO is geostationary and one of every CADA_ECUATORIAL
+    is in a low orbit of less than 15° of inclination. Their elements come from a second generator,
+    so the other satellites are the same as in a catalog of low orbits only.
+    """
+    aleatorio = random.Random(0)
+    especiales = random.Random(1)
+    actualizado = fechaSatNogs(reloj - 6 * 3600)
+    satellites, tles, transmitters = [], [], []
+    for indice in range(cantidad):
+        norad_cat_id = 25544 if indice == 0 else 40000 + indice
+        nombre = 'ISS' if indice == 0 else f'SAT-{norad_cat_id}'
+        sat_id = f'SYN-{norad_cat_id}'
+        inclinacion = 51.6 if indice == 0 else aleatorio.choice(INCLINACIONES)
+        movimiento_medio = 15.5 if indice == 0 else aleatorio.uniform(14.2, 15.8)
+        raan = aleatorio.uniform(0, 360)
+        excentricidad = aleatorio.uniform(0.0001, 0.01)
+        argumento_perigeo = aleatorio.uniform(0, 360)
+        anomalia_media = aleatorio.uniform(0, 360)
+        if indice % CADA_GEO == CADA_GEO - 1:
+            inclinacion = especiales.uniform(0.0, 0.1)
+            movimiento_medio = MOVIMIENTO_GEO
+            excentricidad = especiales.uniform(0.0001, 0.0005)
+        elif indice % CADA_ECUATORIAL == CADA_ECUATORIAL // 2:
+            inclinacion = especiales.uniform(0.0, 15.0)
+        tle1, tle2 = lineasTLE(norad_cat_id, reloj - 6 * 3600, inclinacion, movimiento_medio, raan,
+                               excentricidad, argumento_perigeo, anomalia_media)
+        satellites.append({
+            'sat_id': sat_id, 'norad_cat_id': norad_cat_id, 'norad_follow_id': None, 'name': nombre,
+            'names': '', 'image': '', 'status': 'alive', 'decayed': None, 'launched': '2020-01-01T00:00:00Z',
+            'deployed': '2020-01-01T00:00:00Z', 'website': '', 'operator': 'None', 'countries': 'CL',
+            'telemetries': [], 'updated': actualizado, 'citation': '', 'is_frequency_violator': False,
+            'associated_satellites': [],
+        })
+        tles.append({'tle0': f'0 {nombre}', 'tle1': tle1, 'tle2': tle2, 'tle_source': 'Sintetico',
+                     'sat_id': sat_id, 'norad_cat_id': norad_cat_id, 'updated': actualizado})
+        for _ in range(aleatorio.randint(1, 3)):
+            bajada = aleatorio.choice((145.8e6, 435.0e6, 437.5e6, 2400.0e6)) + aleatorio.randint(0, 500) * 1000
+            transmitters.append({
+                'uuid': str(uuid.UUID(int=aleatorio.getrandbits(128))), 'description': 'Telemetria', 'alive': True,
+                'type': 'Transmitter', 'uplink_low': None, 'uplink_high': None, 'uplink_drift': None,
+                'downlink_low': int(bajada), 'downlink_high': None, 'downlink_drift': None,
+                'mode': aleatorio.choice(MODOS), 'mode_id': 1, 'uplink_mode': None, 'invert': False,
+                'baud': aleatorio.choice((1200, 9600, None)), 'sat_id': sat_id, 'norad_cat_id': norad_cat_id,
+                'status': 'active', 'updated': actualizado, 'citation': '', 'service': 'Amateur',
+                'iaru_coordination': 'N/A', 'iaru_coordination_url': '', 'frequency_violation': False, 'unconfirmed': False,
+            })
+    guardar('satellites.json', satellites)
+    guardar('tle.json', tles)
+    guardar('transmitters.json', transmitters)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Graba los fixtures de SatNogs de los benchmarks.')
+    parser.add_argument('--sintetico', type=int, metavar='N', help='genera un catalogo sintetico de N satelites en vez de consultar SatNogs')
+    parser.add_argument('--norad', type=int, default=25544, help='satelite de las predicciones de un satelite')
+    parser.add_argument('--config', default='config.json', help='config.json con el api_key de SatNogs')
+    args = parser.parse_args(argv)
+
+    os.makedirs(FIXTURES, exist_ok=True)
+    if args.sintetico:
+        reloj = RELOJ_SINTETICO
+        catalogoSintetico(args.sintetico, reloj)
+    else:
+        with open(args.config) as config_file:
+            api_key = json.load(config_file).get('api_key')
+        if not api_key:
+            sys.exit('No API key found in config file.')
+        reloj = grabarSatNogs(api_key)
+    guardar('escenario.json', {'reloj': reloj, 'norad_cat_id': args.norad, 'cuerpo_celeste': 1})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""Load tests of the two APIs at increasing concurrency, to find how many clients they sustain.
+
+    python benchmarks/pruebaCarga.py                                # mezcla "tablero", 1 a 32 clientes
+    python benchmarks/pruebaCarga.py --mezcla rotor --concurrencia 1,4,16,64 --duracion 20
+    python benchmarks/pruebaCarga.py --guardar                      # guarda el resultado en baselineCarga.json
+
+Both APIs are started by servidorCarga.py, each in its own process as deployed, with the recorded
+SatNogs and a simulated ROT2Prog controller. Every step of concurrency runs that many clients for
+*duracion* seconds, each one sending the requests of the mix back to back, plus the Socket.IO
+clients of the mix subscribed to the telemetry of the rotor.
+
+For every step it reports the requests per second, the error rate and the latency percentiles,
+overall and by operation, and the fraction of the telemetry frames that arrived. The saturation
+point is the first step where the error rate or the p99 go over their limits, or the throughput
+grows less than GANANCIA_MINIMA over the best of the previous steps.
+
+With --baseline the throughput and the p99 of each step are compared with a previous run, and the
+script exits with status 1 when they regress by more than the tolerance. As with runBenchmarks.py,
+baselines are only comparable on the same machine.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+import socketio
+
+import servidorCarga
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(DIRECTORIO, 'baselineCarga.json')
+FIXTURES = os.path.join(DIRECTORIO, 'fixtures')
+
+CONCURRENCIA = (1, 2, 4, 8, 16, 32)
+DURACION_SEGUNDOS = 10.0
+TIMEOUT_SEGUNDOS = 30.0
+ESPERA_SERVIDOR_SEGUNDOS = 60.0
+
+# Límites del punto de saturación.
+ERROR_MAXIMO = 0.01
+P99_MAXIMO_MS = 2000.0
+GANANCIA_MINIMA = 0.10
+# Aumento relativo del p99 o caída del throughput que se considera regresión.
+TOLERANCIA = 0.25
+
+# Sin websocket-client el cliente de Socket.IO solo puede usar long-polling.
+TRANSPORTES = ['polling', 'websocket'] if importlib.util.find_spec('websocket') else ['polling']
+
+# Peso de cada operación y clientes de Socket.IO por cliente HTTP, con su tasa de telemetría.
+MEZCLAS = {
+    # Consolas de operación: catálogo, predicciones y estado del rotor, con la telemetría abierta.
+    'tablero': {'operaciones': {'satelliteData': 3, 'pasadaSatelite': 2, 'rutaSatelite': 1, 'status': 4},
+                'suscriptores': 1.0, 'hz': 2.0},
+    'prediccion': {'operaciones': {'satelliteData': 1, 'pasadaSatelite': 3, 'rutaSatelite': 2},
+                   'suscriptores': 0.0, 'hz': 0.0},
+    'rotor': {'operaciones': {'status': 1}, 'suscriptores': 1.0, 'hz': 10.0},
+}
+
+def _satelliteData(sesion, urls, norad_cat_id):
+    return sesion.get(f'{urls[servidorCarga.PREDICCION]}/satelliteData', timeout=TIMEOUT_SEGUNDOS)
+
+def _pasadaSatelite(sesion, urls, norad_cat_id):
+    return sesion.post(f'{urls[servidorCarga.PREDICCION]}/pasadaSatelite', json={'satelliteNoradCatId': norad_cat_id},
+                       timeout=TIMEOUT_SEGUNDOS)
+
+def _rutaSatelite(sesion, urls, norad_cat_id):
+    return sesion.post(f'{urls[servidorCarga.PREDICCION]}/rutaSatelite', json={'satelliteNoradCatId': norad_cat_id, 'maxPuntos': 500},
+                       timeout=TIMEOUT_SEGUNDOS)
+
+def _status(sesion, urls, norad_cat_id):
+    return sesion.get(f'{urls[servidorCarga.ROTOR]}/status', timeout=TIMEOUT_SEGUNDOS)
+
+OPERACIONES = {
+    'satelliteData': _satelliteData,
+    'pasadaSatelite': _pasadaSatelite,
+    'rutaSatelite': _rutaSatelite,
+    'status': _status,
+}
+
+def percentil(valores, fraccion):
+    """Nearest-rank percentile of a sorted list."""
+    return valores[max(0, math.ceil(fraccion * len(valores)) - 1)]
+
+def puertoLibre():
+    with socket.socket() as libre:
+        libre.bind((servidorCarga.HOST, 0))
+        return libre.getsockname()[1]
+
+def iniciarServidores():
+    """Starts both APIs with servidorCarga.py and waits until they answer.
+
+    Returns:
+    The processes and the base URL of each API, by servicio.
+    """
+    procesos = {}
+    urls = {}
+    for servicio, ruta in ((servidorCarga.PREDICCION, '/estaciones'), (servidorCarga.ROTOR, '/rotores')):
+        puerto = puertoLibre()
+        # Los servicios imprimen cada petición, eso queda fuera de la salida de la prueba.
+        procesos[servicio] = subprocess.Popen([sys.executable, os.path.join(DIRECTORIO, 'servidorCarga.py'), servicio, str(puerto)],
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        urls[servicio] = f'http://{servidorCarga.HOST}:{puerto}'
+        limite = time.monotonic() + ESPERA_SERVIDOR_SEGUNDOS
+        while True:
+            try:
+                if requests.get(urls[servicio] + ruta, timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if procesos[servicio].poll() is not None or time.monotonic() > limite:
+                detenerServidores(procesos)
+                raise RuntimeError(f'No se pudo iniciar el servicio {servicio}')
+            time.sleep(0.2)
+    return procesos, urls
+
+def detenerServidores(procesos):
+    for proceso in procesos.values():
+        proceso.terminate()
+    for proceso in procesos.values():
+        proceso.wait()
+
+class Suscriptor:
+    """Socket.IO client subscribed to the telemetry of the main rotor, that counts the frames it receives."""
+
+    def __init__(self, url, hz):
+        self.cuadros = 0
+        self.cliente = socketio.Client(reconnection=False)
+        self.cliente.on('estado_actual', self._cuadro)
+        inicio = time.perf_counter()
+        self.cliente.connect(url, transports=TRANSPORTES, wait_timeout=TIMEOUT_SEGUNDOS)
+        respuesta = self.cliente.call('suscribir_estado', {'hz': hz}, timeout=TIMEOUT_SEGUNDOS)
+        if 'Error' in respuesta:
+            raise RuntimeError(respuesta['Error'])
+        self.latencia = time.perf_counter() - inicio
+
+    def _cuadro(self, datos):
+        self.cuadros += 1
+
+    def cerrar(self):
+        self.cliente.disconnect()
+
+def cliente(indice, mezcla, urls, norad_ids, fin, resultado):
+    """Sends the requests of the mix until the perf_counter *fin*, adding the latencies and errors by operation to *resultado*."""
+    aleatorio = random.Random(indice)
+    nombres = list(mezcla['operaciones'])
+    pesos = [mezcla['operaciones'][nombre] for nombre in nombres]
+    with requests.Session() as sesion:
+        while time.perf_counter() < fin:
+            nombre = aleatorio.choices(nombres, pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                error = OPERACIONES[nombre](sesion, urls, aleatorio.choice(norad_ids)).status_code >= 400
+            except requests.RequestException:
+                error = True
+            latencias, errores = resultado.setdefault(nombre, ([], [0]))
+            latencias.append(time.perf_counter() - inicio)
+            errores[0] += error
+
+def resumen(latencias, errores, duracion):
+    """Dict with n, req_s (successful per second), error (rate) and the p50, p90, p99 and max in ms."""
+    latencias = sorted(latencias)
+    if not latencias:
+        return {'n': 0, 'req_s': 0.0, 'error': 0.0}
+    return {
+        'n': len(latencias),
+        'req_s': (len(latencias) - errores) / duracion,
+        'error': errores / len(latencias),
+        'p50_ms': percentil(latencias, 0.5) * 1000,
+        'p90_ms': percentil(latencias, 0.9) * 1000,
+        'p99_ms': percentil(latencias, 0.99) * 1000,
+        'max_ms': latencias[-1] * 1000,
+    }
+
+def escalon(concurrencia, mezcla, urls, norad_ids, duracion):
+    """Runs one step of concurrency.
+
+    Returns:
+    Dict with the resumen of all the requests, "operaciones" with the resumen of each operation,
+    "socketio" with the subscribers, their errors, the latency of the subscription and the fraction
+    of the frames delivered, and "cpu_cliente", the CPU used by this process over the duration,
+    that tells when the load generator is the bottleneck.
+    """
+    suscriptores = []
+    errores_socketio = 0
+    latencias_socketio = []
+    for _ in range(math.ceil(concurrencia * mezcla['suscriptores'])):
+        try:
+            suscriptor = Suscriptor(urls[servidorCarga.ROTOR], mezcla['hz'])
+        except Exception:
+            errores_socketio += 1
+            continue
+        suscriptores.append(suscriptor)
+        latencias_socketio.append(suscriptor.latencia)
+
+    resultados = [{} for _ in range(concurrencia)]
+    cpu = time.process_time()
+    inicio = time.perf_counter()
+    fin = inicio + duracion
+    cuadros = sum(suscriptor.cuadros for suscriptor in suscriptores)
+    hilos = [threading.Thread(target=cliente, args=(indice, mezcla, urls, norad_ids, fin, resultados[indice]), daemon=True)
+             for indice in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+    cuadros = sum(suscriptor.cuadros for suscriptor in suscriptores) - cuadros
+    cpu = (time.process_time() - cpu) / transcurrido
+    for suscriptor in suscriptores:
+        suscriptor.cerrar()
+
+    por_operacion = {}
+    for resultado in resultados:
+        for nombre, (latencias, errores) in resultado.items():
+            acumulado = por_operacion.setdefault(nombre, ([], [0]))
+            acumulado[0].extend(latencias)
+            acumulado[1][0] += errores[0]
+    todas = [latencia for latencias, _ in por_operacion.values() for latencia in latencias]
+    datos = resumen(todas, sum(errores[0] for _, errores in por_operacion.values()), transcurrido)
+    datos['concurrencia'] = concurrencia
+    datos['operaciones'] = {nombre: resumen(latencias, errores[0], transcurrido) for nombre, (latencias, errores) in sorted(por_operacion.items())}
+    esperados = len(suscriptores) * mezcla['hz'] * transcurrido
+    datos['socketio'] = {
+        'suscriptores': len(suscriptores),
+        'errores': errores_socketio,
+        'suscripcion_p99_ms': percentil(sorted(latencias_socketio), 0.99) * 1000 if latencias_socketio else None,
+        'entrega': cuadros / esperados if esperados else None,
+    }
+    datos['cpu_cliente'] = cpu
+    return datos
+
+def saturacion(escalones, error_maximo=ERROR_MAXIMO, p99_maximo_ms=P99_MAXIMO_MS):
+    """Finds the first saturated step.
+
+    Returns:
+    (concurrencia, motivo) of the first step over the limits, or None if none is.
+    """
+    mejor = 0.0
+    for datos in escalones:
+        if datos['error'] > error_maximo:
+            return datos['concurrencia'], f'{datos["error"]:.1%} de errores'
+        if datos.get('p99_ms', 0.0) > p99_maximo_ms:
+            return datos['concurrencia'], f'p99 de {datos["p99_ms"]:.0f} ms'
+        if mejor and datos['req_s'] < mejor * (1 + GANANCIA_MINIMA):
+            return datos['concurrencia'], f'{datos["req_s"]:.1f} req/s, no supera en {GANANCIA_MINIMA:.0%} los {mejor:.1f} req/s anteriores'
+        mejor = max(mejor, datos['req_s'])
+    return None
+
+def regresiones(escalones, baseline, tolerancia):
+    """Steps whose throughput fell or whose p99 rose by more than *tolerancia* against the baseline of the same concurrency."""
+    anteriores = {datos['concurrencia']: datos for datos in baseline}
+    encontradas = []
+    for datos in escalones:
+        anterior = anteriores.get(datos['concurrencia'])
+        if anterior is None:
+            continue
+        if datos['req_s'] < anterior['req_s'] * (1 - tolerancia):
+            encontradas.append(f'{datos["concurrencia"]} clientes: req/s {anterior["req_s"]:.1f} -> {datos["req_s"]:.1f}')
+        if 'p99_ms' in anterior and datos.get('p99_ms', 0.0) > anterior['p99_ms'] * (1 + tolerancia):
+            encontradas.append(f'{datos["concurrencia"]} clientes: p99_ms {anterior["p99_ms"]:.1f} -> {datos["p99_ms"]:.1f}')
+    return encontradas
+
+def imprimir(datos):
+    socketio_datos = datos['socketio']
+    entrega = f'{socketio_datos["entrega"]:.0%}' if socketio_datos['entrega'] is not None else '-'
+    print(f'{datos["concurrencia"]:>4} {"total":<16} {datos["n"]:>7} {datos["req_s"]:>8.1f} {datos["error"]:>7.1%} '
+          f'{datos.get("p50_ms", 0):>9.1f} {datos.get("p90_ms", 0):>9.1f} {datos.get("p99_ms", 0):>9.1f} '
+          f'{socketio_datos["suscriptores"]:>5} {entrega:>8} {datos["cpu_cliente"]:>8.0%}')
+    for nombre, operacion in datos['operaciones'].items():
+        print(f'{"":>4} {nombre:<16} {operacion["n"]:>7} {operacion["req_s"]:>8.1f} {operacion["error"]:>7.1%} '
+              f'{operacion.get("p50_ms", 0):>9.1f} {operacion.get("p90_ms", 0):>9.1f} {operacion.get("p99_ms", 0):>9.1f}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga de las APIs de prediccion y rotor con SatNogs grabado.')
+    parser.add_argument('--mezcla', choices=sorted(MEZCLAS), default='tablero', help='operaciones de cada cliente')
+    parser.add_argument('--concurrencia', default=','.join(map(str, CONCURRENCIA)), help='clientes de cada escalon separados por coma')
+    parser.add_argument('--duracion', type=float, default=DURACION_SEGUNDOS, help='segundos de cada escalon')
+    parser.add_argument('--p99-maximo', type=float, default=P99_MAXIMO_MS, help='p99 en ms a partir del cual se considera saturado')
+    parser.add_argument('--baseline', default=BASELINE, help='archivo del baseline')
+    parser.add_argument('--guardar', action='store_true', help='guarda los resultados de la mezcla en el baseline')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help='variacion relativa que se considera regresion')
+    args = parser.parse_args(argv)
+
+    mezcla = MEZCLAS[args.mezcla]
+    concurrencias = [int(valor) for valor in args.concurrencia.split(',')]
+    with open(os.path.join(FIXTURES, 'satellites.json')) as archivo:
+        norad_ids = [satellite['norad_cat_id'] for satellite in json.load(archivo) if satellite.get('norad_cat_id')]
+
+    procesos, urls = iniciarServidores()
+    try:
+        # El primer pedido carga el catalogo de SatNogs, que no es parte de la carga medida.
+        requests.get(f'{urls[servidorCarga.PREDICCION]}/satelliteData', timeout=ESPERA_SERVIDOR_SEGUNDOS)
+        print(f'Mezcla {args.mezcla}: {mezcla["operaciones"]}, {mezcla["suscriptores"]} suscriptores por cliente a {mezcla["hz"]} Hz')
+        print(f'{"conc":>4} {"operacion":<16} {"n":>7} {"req/s":>8} {"error":>7} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} '
+              f'{"subs":>5} {"entrega":>8} {"cpu cli":>8}')
+        escalones = []
+        for concurrencia in concurrencias:
+            datos = escalon(concurrencia, mezcla, urls, norad_ids, args.duracion)
+            escalones.append(datos)
+            imprimir(datos)
+    finally:
+        detenerServidores(procesos)
+
+    saturado = saturacion(escalones, p99_maximo_ms=args.p99_maximo)
+    if saturado is None:
+        print(f'Sin saturacion hasta {concurrencias[-1]} clientes')
+    else:
+        concurrencia, motivo = saturado
+        capacidad = max((datos['req_s'] for datos in escalones if datos['concurrencia'] < concurrencia), default=0.0)
+        print(f'Saturacion con {concurrencia} clientes ({motivo}), capacidad de {capacidad:.1f} req/s')
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as archivo:
+            baseline = json.load(archivo)
+    encontradas = regresiones(escalones, baseline.get(args.mezcla, []), args.tolerancia)
+    for regresion in encontradas:
+        print(f'REGRESION {regresion}')
+
+    if args.guardar:
+        baseline[args.mezcla] = escalones
+        with open(args.baseline, 'w') as archivo:
+            json.dump(baseline, archivo, indent=2)
+            archivo.write('\n')
+        print(f'Baseline guardado en {args.baseline}')
+    return 1 if encontradas and not args.guardar else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
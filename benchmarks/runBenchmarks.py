@@ -0,0 +1,206 @@
+"""Offline benchmarks of the prediction, catalog and rotor paths.
+
+    python benchmarks/runBenchmarks.py              # compara con benchmarks/baseline.json
+    python benchmarks/runBenchmarks.py --guardar    # guarda los casos ejecutados en el baseline
+    python benchmarks/runBenchmarks.py --solo ruta,rot2prog -n 20
+
+Every case runs in the fixed environment of entornoBenchmark (recorded SatNogs, fixed clock and
+station, serial port in memory). It is run once to warm up, then timed *n* times for the
+throughput and the latency percentiles, and once more under tracemalloc for the peak memory, that
+is measured apart because tracemalloc slows the code down.
+
+A case regresses when its minimum latency or its peak memory is above the baseline by more than the
+tolerance, and the script then exits with status 1. The minimum is what the code costs without the
+interruptions of the rest of the machine, so it does not flap from run to run as the p50 does (timeit
+reports it for the same reason); the percentiles are printed to see the spread. Baselines are only
+comparable on the same machine.
+"""
+import argparse
+import atexit
+import contextlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import entornoBenchmark
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Aumento relativo de la latencia mínima o de la memoria máxima que se considera una regresión.
+TOLERANCIA = 0.25
+
+class Caso:
+    """Benchmark case: a function without arguments and how many times it is timed by default."""
+
+    def __init__(self, nombre, funcion, repeticiones):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.repeticiones = repeticiones
+
+def casos(escenario):
+    """Builds the cases; the modules of the services are imported here, after the environment is installed."""
+    import rot2ProgInteractor
+    import satellitePrediction
+    from apiSatNogsAllSatelliteNORADId import getSatellitesData
+    from satellitePrediction import prediccionPasadaSatelite, prediccionRutaSatelite, predictionCelestialBody
+    from tleStore import TLEStore
+    from trackHandoff import TrackHandoffServer, adjuntarPasada
+
+    norad_cat_id = escenario['norad_cat_id']
+    cuerpo_celeste = escenario['cuerpo_celeste']
+    rotor = rot2ProgInteractor.ROT2Prog('/dev/benchmark')
+    # El logger de ROT2Prog escribe cada paquete en Rot2log.log, como en el servicio.
+    posiciones = [(az * 1.5 % 360, az * 0.7 % 90) for az in range(100)]
+
+    with open(os.path.join(entornoBenchmark.FIXTURES, 'tle.json')) as archivo:
+        tles = json.load(archivo)
+
+    # Las pasadas se calculan siempre, salvo en pasada_archivada, que se sirve del archivo de predicciones.
+    archivo = satellitePrediction.archivo
+    satellitePrediction.archivo = None
+
+    def pasadaArchivada():
+        satellitePrediction.archivo = archivo
+        try:
+            return prediccionPasadaSatelite(norad_cat_id)
+        finally:
+            satellitePrediction.archivo = None
+
+    # La pasada archivada adjuntada por memoria compartida, como la recibe el servicio de los rotores.
+    handoff = {}
+
+    def pasadaCompartida():
+        if not handoff:
+            handoff['servidor'] = TrackHandoffServer(archivo).iniciar()
+            atexit.register(handoff['servidor'].detener)
+            handoff['prediccion_id'] = pasadaArchivada()['Prediccion_ID']
+        with adjuntarPasada(handoff['servidor'].ruta, handoff['prediccion_id']) as pasada:
+            return len(pasada.puntos)
+
+    def rot2prog():
+        for az, el in posiciones:
+            rotor.set(az, el)
+            rotor.status()
+
+    return [
+        Caso('pasada', lambda: prediccionPasadaSatelite(norad_cat_id), 50),
+        Caso('pasada_doppler', lambda: prediccionPasadaSatelite(norad_cat_id, doppler=True), 50),
+        Caso('pasada_archivada', pasadaArchivada, 100),
+        Caso('pasada_compartida', pasadaCompartida, 200),
+        Caso('ruta', lambda: prediccionRutaSatelite(norad_cat_id), 15),
+        Caso('ruta_simplificada', lambda: prediccionRutaSatelite(norad_cat_id, max_puntos=500), 15),
+        Caso('cuerpo_celeste', lambda: predictionCelestialBody(cuerpo_celeste), 10),
+        Caso('catalogo', getSatellitesData, 6),
+        # Lectura columnar de las TLE del catalogo, con la vigencia y las clases de órbita.
+        Caso('tle_store', lambda: TLEStore.fromSatNogs(tles).vigentes(escenario['reloj']), 200),
+        # 100 pares set + status, la codificación y decodificación de los paquetes del controlador.
+        Caso('rot2prog', rot2prog, 50),
+    ]
+
+def percentil(valores, fraccion):
+    """Nearest-rank percentile of a sorted list."""
+    return valores[max(0, math.ceil(fraccion * len(valores)) - 1)]
+
+def medir(caso, repeticiones):
+    """Times a case.
+
+    Returns:
+    Dict with n, ops_s, min_ms, p50_ms, p90_ms, p99_ms, max_ms and pico_kib.
+    """
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        caso.funcion()
+        latencias = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            caso.funcion()
+            latencias.append(time.perf_counter() - inicio)
+
+        tracemalloc.start()
+        try:
+            caso.funcion()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    latencias.sort()
+    return {
+        'n': repeticiones,
+        'ops_s': round(repeticiones / sum(latencias), 3),
+        'min_ms': round(latencias[0] * 1000, 3),
+        'p50_ms': round(percentil(latencias, 0.50) * 1000, 3),
+        'p90_ms': round(percentil(latencias, 0.90) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 0.99) * 1000, 3),
+        'max_ms': round(latencias[-1] * 1000, 3),
+        'pico_kib': round(pico / 1024, 1),
+    }
+
+def comparar(resultados, baseline, tolerancia):
+    """Returns the regressions as (caso, metrica, baseline, actual) tuples."""
+    regresiones = []
+    for nombre, resultado in resultados.items():
+        base = baseline.get(nombre)
+        if base is None:
+            continue
+        for metrica in ('min_ms', 'pico_kib'):
+            # Los baselines anteriores a min_ms no la tienen.
+            if metrica in base and resultado[metrica] > base[metrica] * (1 + tolerancia):
+                regresiones.append((nombre, metrica, base[metrica], resultado[metrica]))
+    return regresiones
+
+def imprimir(resultados, baseline):
+    print(f"{'caso':<20}{'n':>5}{'ops/s':>10}{'min ms':>11}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'max ms':>11}{'pico KiB':>11}{'min base':>11}")
+    for nombre, r in resultados.items():
+        base = baseline.get(nombre, {}).get('min_ms')
+        variacion = f'{(r["min_ms"] / base - 1) * 100:+.0f}%' if base else '-'
+        print(f"{nombre:<20}{r['n']:>5}{r['ops_s']:>10.2f}{r['min_ms']:>11.2f}{r['p50_ms']:>11.2f}{r['p90_ms']:>11.2f}{r['p99_ms']:>11.2f}"
+              f"{r['max_ms']:>11.2f}{r['pico_kib']:>11.1f}{variacion:>11}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de prediccion, catalogo y rotor con SatNogs grabado.')
+    parser.add_argument('-n', '--repeticiones', type=int, help='repeticiones de cada caso, por defecto las del caso')
+    parser.add_argument('--solo', help='casos a ejecutar separados por coma')
+    parser.add_argument('--baseline', help='archivo del baseline, por defecto benchmarks/baseline.json')
+    parser.add_argument('--guardar', action='store_true', help='guarda los resultados como baseline')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help='aumento relativo que se considera regresion')
+    args = parser.parse_args(argv)
+    # instalar() cambia el directorio de trabajo, la ruta se resuelve antes.
+    explicito = args.baseline is not None
+    args.baseline = os.path.abspath(args.baseline or BASELINE)
+    if explicito and not args.guardar and not os.path.exists(args.baseline):
+        parser.error(f'no existe el baseline {args.baseline}')
+
+    escenario = entornoBenchmark.instalar()
+    seleccion = set(args.solo.split(',')) if args.solo else None
+    resultados = {}
+    for caso in casos(escenario):
+        if seleccion is not None and caso.nombre not in seleccion:
+            continue
+        resultados[caso.nombre] = medir(caso, args.repeticiones or caso.repeticiones)
+
+    try:
+        with open(args.baseline) as archivo:
+            baseline = json.load(archivo)['casos']
+    except FileNotFoundError:
+        baseline = {}
+    imprimir(resultados, baseline)
+
+    if args.guardar:
+        with open(args.baseline, 'w') as archivo:
+            json.dump({
+                'maquina': {'python': platform.python_version(), 'plataforma': platform.platform(), 'procesador': platform.machine()},
+                'casos': {**baseline, **resultados},
+            }, archivo, indent=2)
+            archivo.write('\n')
+        print(f'Baseline guardado en {args.baseline}')
+        return 0
+
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    for nombre, metrica, base, actual in regresiones:
+        print(f'REGRESION {nombre}: {metrica} {base} -> {actual}')
+    return 1 if regresiones else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Serves one of the APIs in the fixed environment of the benchmarks, for the load tests of pruebaCarga.py.
+
+    python benchmarks/servidorCarga.py prediccion 5018
+    python benchmarks/servidorCarga.py rotor 5019
+
+The API runs as in its __main__: the same gevent WSGIServer, rotorMovementAPI.py monkey-patched by
+gevent and satellitePredictionAPI.py with its catalog refresh task and without the patch. SatNogs
+answers with the recorded fixtures and the clock is fixed, as in runBenchmarks.py. The ROT2Prog
+controller is simulated: it answers after the time the packet takes on the serial line and its
+azimuth turns continuously, so the telemetry subscriptions receive a frame in every period.
+"""
+import argparse
+import time
+
+HOST = '127.0.0.1'
+PREDICCION = 'prediccion'
+ROTOR = 'rotor'
+
+# Respuesta de 13 bytes a 9600 baudios más el procesamiento del controlador.
+LATENCIA_SERIE_SEGUNDOS = 0.015
+# Grados por segundo que gira el azimut del rotor simulado.
+VELOCIDAD_AZ = 6.0
+
+def serialSimulado(base):
+    """Subclass of entornoBenchmark.SerialEnLazo with the latency of the serial line and a turning azimuth."""
+
+    class SerialSimulado(base):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._inicio = time.monotonic()
+
+        def write(self, paquete):
+            super().write(paquete)
+            time.sleep(LATENCIA_SERIE_SEGUNDOS)
+
+        def _respuesta(self):
+            self.az = (time.monotonic() - self._inicio) * VELOCIDAD_AZ % 360
+            return super()._respuesta()
+
+    return SerialSimulado
+
+def servir(servicio, puerto):
+    """Serves an API on HOST:*puerto* until the process is terminated."""
+    if servicio == ROTOR:
+        # Como en rotorMovementAPI.py, antes de importar cualquier otro módulo.
+        from gevent import monkey
+        monkey.patch_all()
+
+    import entornoBenchmark
+    entornoBenchmark.instalar()
+    import rot2ProgInteractor
+    rot2ProgInteractor.serial.Serial = serialSimulado(entornoBenchmark.SerialEnLazo)
+    from gevent.pywsgi import WSGIServer
+    from geventwebsocket.handler import WebSocketHandler
+
+    if servicio == PREDICCION:
+        import satellitePredictionAPI
+        satellitePredictionAPI.socketio.start_background_task(satellitePredictionAPI.refrescarCatalogo)
+        http_server = WSGIServer((HOST, puerto), satellitePredictionAPI.app, handler_class=WebSocketHandler)
+    else:
+        import rotorMovementAPI
+        http_server = WSGIServer((HOST, puerto), rotorMovementAPI.app, handler_class=WebSocketHandler)
+    http_server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sirve una API en el entorno fijo de los benchmarks.')
+    parser.add_argument('servicio', choices=(PREDICCION, ROTOR))
+    parser.add_argument('puerto', type=int)
+    args = parser.parse_args(argv)
+    servir(args.servicio, args.puerto)
+
+if __name__ == '__main__':
+    main()
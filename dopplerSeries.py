@@ -0,0 +1,120 @@
+"""Slant range, range-rate and Doppler correction computed over a whole pass with NumPy.
+
+The range and range-rate come from the SGP4 state of the satellite at the instants of the pass,
+rotated to the Earth-fixed frame by batchPropagation, with the relative velocity projected on the
+line of sight. The sub-satellite point of the samples can not be used instead: ephem gives a
+geocentric latitude and the height over a spherical Earth, not WGS84 geodetic coordinates.
+"""
+import numpy as np
+
+# Elipsoide WGS84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+VELOCIDAD_LUZ = 299792458.0
+
+def geodeticAEcef(lat, lon, alt):
+    """Converts geodetic coordinates to Earth-centred Earth-fixed coordinates.
+
+    Parameters:
+    lat (array): Latitude in degrees.
+    lon (array): Longitude in degrees.
+    alt (array): Height above the ellipsoid in meters.
+
+    Returns:
+    Array of shape (..., 3) with x, y, z in meters.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    x = (n + alt) * cos_lat * np.cos(lon)
+    y = (n + alt) * cos_lat * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+
+def ecefAGeodetic(xyz):
+    """Converts Earth-centred Earth-fixed coordinates in meters to geodetic coordinates (Bowring, two iterations).
+
+    Returns:
+    Latitude and longitude in degrees and height above the ellipsoid in meters.
+    """
+    x = xyz[..., 0]
+    y = xyz[..., 1]
+    z = xyz[..., 2]
+    lon = np.arctan2(y, x)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(2):
+        sin_lat = np.sin(lat)
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+        alt = p / np.cos(lat) - n
+        lat = np.arctan2(z, p * (1 - WGS84_E2 * n / (n + alt)))
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(lon), alt
+
+def rangoYTasaRango(propagador, tiempos, obs_lat, obs_lon, obs_elev):
+    """Computes the slant range and the range-rate from the station to the satellite.
+
+    Parameters:
+    propagador (BatchPropagator): Propagator with the TLE of the satellite only.
+    tiempos (array): UNIX epochs of the samples.
+    obs_lat, obs_lon (float): Latitude and longitude of the station in degrees.
+    obs_elev (float): Elevation of the station in meters.
+
+    Returns:
+    Slant range in meters and range-rate in meters per second, positive when the satellite moves away.
+    """
+    _, _, rango, tasa_rango, _ = propagador.lookAngles(np.asarray(tiempos, dtype=float), obs_lat, obs_lon, obs_elev)
+    return rango[0] * 1000.0, tasa_rango[0] * 1000.0
+
+def frecuenciaDownlink(frecuencia, tasa_rango):
+    """Frequency received at the station for a downlink transmitted at *frecuencia* Hz."""
+    return frecuencia * (1 - np.asarray(tasa_rango) / VELOCIDAD_LUZ)
+
+def frecuenciaUplink(frecuencia, tasa_rango):
+    """Frequency the station has to transmit so the satellite receives *frecuencia* Hz."""
+    return frecuencia / (1 - np.asarray(tasa_rango) / VELOCIDAD_LUZ)
+
+def dopplerPasada(propagador, tiempos, obs_lat, obs_lon, obs_elev, transmitters):
+    """Computes the range, range-rate and Doppler-corrected frequencies of every transmitter for one pass.
+
+    Parameters:
+    propagador, tiempos, obs_lat, obs_lon, obs_elev: See rangoYTasaRango.
+    transmitters (list): Transmitters of the satellite as returned by SatNogs.
+
+    Returns:
+    JSON object with the following data, each list aligned with the points of the pass:
+                    "Rango_km" : Distancia entre la estacion y el satelite,
+                    "Tasa_Rango_km_s" : Velocidad con la que cambia la distancia,
+                    "Transmisores" : [{
+                                        "uuid", "description", "mode", "downlink_low", "uplink_low",
+                                        "Downlink_corregido": Frecuencia a recibir en Hz,
+                                        "Uplink_corregido": Frecuencia a transmitir en Hz,
+                                        }],
+    """
+    rango, tasa_rango = rangoYTasaRango(propagador, tiempos, obs_lat, obs_lon, obs_elev)
+
+    transmisores = []
+    for transmitter in transmitters or []:
+        downlink = transmitter.get('downlink_low')
+        uplink = transmitter.get('uplink_low')
+        transmisores.append({
+            'uuid': transmitter.get('uuid'),
+            'description': transmitter.get('description'),
+            'mode': transmitter.get('mode'),
+            'downlink_low': downlink,
+            'uplink_low': uplink,
+            'Downlink_corregido': np.rint(frecuenciaDownlink(downlink, tasa_rango)).astype(np.int64).tolist() if downlink else None,
+            'Uplink_corregido': np.rint(frecuenciaUplink(uplink, tasa_rango)).astype(np.int64).tolist() if uplink else None,
+        })
+
+    return {
+        'Rango_km': np.round(rango / 1000, 3).tolist(),
+        'Tasa_Rango_km_s': np.round(tasa_rango / 1000, 4).tolist(),
+        'Transmisores': transmisores,
+    }
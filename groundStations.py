@@ -0,0 +1,68 @@
+"""Registry of the ground stations served by the prediction API.
+
+The station of the deployment is the one of "lat", "long" and "elev" in config.json, with the id
+"principal". Partner stations are added in config.json under "estaciones":
+
+    "estaciones": {
+        "temuco": {"lat": "-38.7487032", "long": "-72.6174925", "elev": 107}
+    }
+"""
+import json
+import time
+
+import ephem
+
+from timeUtils import epochAEphem
+
+ESTACION_PRINCIPAL = 'principal'
+
+with open('config.json') as config_file:
+    config = json.load(config_file)
+
+estaciones = {
+    ESTACION_PRINCIPAL: {
+        'lat': config.get('lat'),
+        'long': config.get('long'),
+        'elev': config.get('elev'),
+    }
+}
+for station_id, estacion in (config.get('estaciones') or {}).items():
+    estaciones[station_id] = {
+        'lat': estacion['lat'],
+        'long': estacion['long'],
+        'elev': estacion.get('elev', 0),
+    }
+
+def getStation(station_id=None):
+    """Returns the position of a station of the registry.
+
+    Parameters:
+    station_id (str, optional): Id of the station, defaults to the main station.
+
+    Returns:
+    Dict with lat, long (degrees as in config.json) and elev (meters).
+
+    Raises:
+    ValueError: The station is not in the registry.
+    """
+    if station_id is None:
+        station_id = ESTACION_PRINCIPAL
+    try:
+        return estaciones[station_id]
+    except KeyError:
+        raise ValueError(f'La estacion {station_id} no esta registrada')
+
+def listStations():
+    """Returns the ids and positions of every registered station."""
+    return [{'id': station_id, **estacion} for station_id, estacion in estaciones.items()]
+
+def observador(station_id=None):
+    """Returns an ephem Observer placed at the station, with the current time as its date."""
+    estacion = getStation(station_id)
+    obs = ephem.Observer()
+    obs.lat = estacion['lat']
+    obs.long = estacion['long']
+    obs.elev = estacion['elev']
+    # La fecha se toma de time.time, como el resto de los tiempos, y no del reloj interno de ephem.
+    obs.date = epochAEphem(time.time())
+    return obs
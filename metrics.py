@@ -0,0 +1,254 @@
+"""Lightweight metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms keep plain Python numbers, so an observation on a hot path is a
+dict lookup for the labels, a bisect over the bucket bounds and a few additions, without locks. A
+concurrent update can be lost once in a while, which is acceptable for monitoring. The text is
+only built when /metrics is scraped.
+
+Every service has its own process, and so its own REGISTRO. Metrics with labels only appear once
+they have been observed, so the SatNogs metrics of this module are not shown by the rotor service.
+"""
+import bisect
+import math
+import time
+
+from flask import Response, g, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites de los histogramas de latencia, en segundos.
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Límites del histograma del error de apuntamiento, en grados.
+BUCKETS_GRADOS = (0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 45.0, 90.0, 180.0)
+
+def _valor(numero):
+    if numero == math.inf:
+        return '+Inf'
+    if numero == -math.inf:
+        return '-Inf'
+    if isinstance(numero, float) and numero.is_integer() and abs(numero) < 1e15:
+        return str(int(numero))
+    return repr(numero)
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra is not None:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class _Metrica:
+    """Family of series with the same name, one child for every combination of label values."""
+
+    tipo = None
+    # Clase de los hijos de la familia, se instancia con _argumentos_hijo.
+    _hijo = None
+    _argumentos_hijo = ()
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._hijos = {}
+        if not self.etiquetas:
+            self._hijos[()] = self._nuevoHijo()
+
+    def labels(self, *valores):
+        """Returns the child of the given label values, creating it the first time."""
+        hijo = self._hijos.get(valores)
+        if hijo is None:
+            if len(valores) != len(self.etiquetas):
+                raise ValueError(f'{self.nombre} espera las etiquetas {self.etiquetas}')
+            hijo = self._hijos.setdefault(valores, self._nuevoHijo())
+        return hijo
+
+    def _nuevoHijo(self):
+        return self._hijo(*self._argumentos_hijo)
+
+    def render(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} {self.tipo}']
+        for valores, hijo in list(self._hijos.items()):
+            lineas.extend(hijo.render(self.nombre, self.etiquetas, valores))
+        return lineas
+
+class _ValorCounter:
+
+    __slots__ = ('valor',)
+
+    def __init__(self):
+        self.valor = 0.0
+
+    def inc(self, cantidad=1):
+        self.valor += cantidad
+
+    def render(self, nombre, etiquetas, valores):
+        return [f'{nombre}{_etiquetas(etiquetas, valores)} {_valor(self.valor)}']
+
+class _ValorGauge(_ValorCounter):
+
+    __slots__ = ()
+
+    def set(self, valor):
+        self.valor = valor
+
+    def dec(self, cantidad=1):
+        self.valor -= cantidad
+
+class _ValorHistogram:
+
+    __slots__ = ('limites', 'conteos', 'suma')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.conteos = [0] * (len(limites) + 1)
+        self.suma = 0.0
+
+    def observe(self, valor):
+        self.conteos[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+
+    def time(self):
+        """Context manager that observes the seconds spent inside it."""
+        return _Cronometro(self)
+
+    def render(self, nombre, etiquetas, valores):
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.limites + (math.inf,), self.conteos):
+            acumulado += conteo
+            le = 'le="' + _valor(limite) + '"'
+            lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, valores, le)} {acumulado}')
+        lineas.append(f'{nombre}_sum{_etiquetas(etiquetas, valores)} {_valor(self.suma)}')
+        lineas.append(f'{nombre}_count{_etiquetas(etiquetas, valores)} {acumulado}')
+        return lineas
+
+class _Cronometro:
+
+    __slots__ = ('histograma', 'inicio')
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observe(time.perf_counter() - self.inicio)
+        return False
+
+class Counter(_Metrica):
+    """Monotonic counter, see inc."""
+
+    tipo = 'counter'
+    _hijo = _ValorCounter
+
+    def inc(self, cantidad=1):
+        self._hijos[()].inc(cantidad)
+
+class Gauge(_Metrica):
+    """Value that goes up and down, see set."""
+
+    tipo = 'gauge'
+    _hijo = _ValorGauge
+
+    def set(self, valor):
+        self._hijos[()].set(valor)
+
+class Histogram(_Metrica):
+    """Distribution of observations in cumulative buckets, see observe and time."""
+
+    tipo = 'histogram'
+    _hijo = _ValorHistogram
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.buckets = tuple(sorted(buckets))
+        self._argumentos_hijo = (self.buckets,)
+        super().__init__(nombre, ayuda, etiquetas)
+
+    def observe(self, valor):
+        self._hijos[()].observe(valor)
+
+    def time(self):
+        return self._hijos[()].time()
+
+class Registry:
+    """Metrics of one service."""
+
+    def __init__(self):
+        self._metricas = {}
+
+    def registrar(self, metrica):
+        """Adds a metric to the registry, returning the one already registered with the same name."""
+        return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def counter(self, nombre, ayuda, etiquetas=()):
+        return self.registrar(Counter(nombre, ayuda, etiquetas))
+
+    def gauge(self, nombre, ayuda, etiquetas=()):
+        return self.registrar(Gauge(nombre, ayuda, etiquetas))
+
+    def histogram(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self.registrar(Histogram(nombre, ayuda, etiquetas, buckets))
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas.extend(metrica.render())
+        return '\n'.join(lineas) + '\n'
+
+REGISTRO = Registry()
+
+SATNOGS_LATENCIA = REGISTRO.histogram('satnogs_request_duration_seconds', 'Duration of the requests to the SatNogs API, including the parsing of the response.', ('endpoint',))
+SATNOGS_ERRORES = REGISTRO.counter('satnogs_request_errors_total', 'Failed requests to the SatNogs API by HTTP status or exception.', ('endpoint', 'error'))
+PROPAGACION = REGISTRO.histogram('prediction_propagation_seconds', 'Time spent propagating orbits for one request.', ('calculo',))
+
+class medirSatNogs:
+    """Context manager that observes the duration of a request to SatNogs and counts its exceptions.
+
+    Non-200 answers are counted with errorSatNogs.
+    """
+
+    __slots__ = ('endpoint', 'inicio')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, error, traza):
+        SATNOGS_LATENCIA.labels(self.endpoint).observe(time.perf_counter() - self.inicio)
+        if tipo is not None:
+            SATNOGS_ERRORES.labels(self.endpoint, tipo.__name__).inc()
+        return False
+
+def errorSatNogs(endpoint, status_code):
+    """Counts an answer of SatNogs with an HTTP status other than 200."""
+    SATNOGS_ERRORES.labels(endpoint, str(status_code)).inc()
+
+def instrumentarApp(app, registro=REGISTRO):
+    """Measures the latency of every route of a Flask app and serves the registry at /metrics."""
+    latencia = registro.histogram('http_request_duration_seconds', 'Latency of the HTTP requests by route.', ('route', 'method', 'status'))
+
+    @app.before_request
+    def iniciarMedicion():
+        g.metricas_inicio = time.perf_counter()
+
+    @app.after_request
+    def terminarMedicion(response):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is not None:
+            ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+            latencia.labels(ruta, request.method, str(response.status_code)).observe(time.perf_counter() - inicio)
+        return response
+
+    def metricas():
+        return Response(registro.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metricas, methods=['GET'])
+    return latencia
@@ -0,0 +1,251 @@
+"""Plans a conflict-free timetable of passes for the antenna.
+
+The candidate passes of the requested satellites are found with ephem and cut to the elevations
+the rotor reaches, and the schedule is chosen with weighted interval scheduling: a pass can follow another
+one only if the rotor has time to slew from the LOS position of the first to the AOS position of
+the second.
+
+Positions are costed in the coordinates of the rotor, whose azimuth goes past 360 (-180 to 540 with
+the ROT2Prog limits): a compass azimuth is reached at az + 360 * k, and the track of a pass that
+crosses north keeps turning the same way. Every turn k from which the whole track of a pass fits
+within the limits is a separate candidate, so the schedule also chooses how each pass is wound.
+"""
+import bisect
+import math
+
+import ephem
+import numpy as np
+
+from predictionRecords import PUNTO_PASADA
+from timeUtils import ephemAEpoch, epochAEphem
+
+# Modelo de giro del rotor SPID BIG-RAS/HR, en grados por segundo.
+VELOCIDAD_AZ = 1.0
+VELOCIDAD_EL = 1.0
+# Tiempo extra que se deja entre pasadas para asentar la antena, en segundos.
+MARGEN_GIRO = 10
+# Límites por defecto de ROT2Prog.set_limits
+LIMITES_POR_DEFECTO = (-180, 540, -15, 195)
+# Segundos entre las posiciones con las que se sigue el azimut de una pasada candidata.
+PASO_RECORRIDO = 10
+
+def tiempoGiro(az_desde, el_desde, az_hasta, el_hasta, velocidad_az=VELOCIDAD_AZ, velocidad_el=VELOCIDAD_EL):
+    """Seconds the rotor needs to move between two positions in its own coordinates, both axes moving at the same time."""
+    return max(abs(az_hasta - az_desde) / velocidad_az, abs(el_hasta - el_desde) / velocidad_el) + MARGEN_GIRO
+
+def desenrollarAzimut(azimuts):
+    """Continuous azimuths of a track of compass azimuths, starting at the first one and taking the shortest way at each step."""
+    azimuts = np.asarray(azimuts, dtype=float)
+    pasos = (np.diff(azimuts) + 180) % 360 - 180
+    return np.concatenate((azimuts[:1], azimuts[0] + np.cumsum(pasos)))
+
+def vueltasPosibles(az_aos, recorrido_min, recorrido_max, limites):
+    """Rotor azimuths at AOS, az_aos + 360 * k, from which a track that moves between recorrido_min and recorrido_max degrees from AOS stays within the limits."""
+    min_az, max_az = limites[0], limites[1]
+    primera = math.ceil((min_az - recorrido_min - az_aos) / 360)
+    ultima = math.floor((max_az - recorrido_max - az_aos) / 360)
+    return [az_aos + 360 * k for k in range(primera, ultima + 1)]
+
+def pasadasCandidatas(tles, prioridades, desde, hasta, lat, lon, elev, elevacion_minima=0.0, limites=LIMITES_POR_DEFECTO):
+    """Finds every pass of the requested satellites between two instants.
+
+    Parameters:
+    tles (dict): TLERecord of each satellite by NORAD id, as stored by getCatalogData.
+    prioridades (list of int): NORAD ids ordered from the highest to the lowest priority.
+    desde, hasta (float): UNIX epochs of the horizon.
+    lat, lon, elev: Position of the station.
+    elevacion_minima (float, optional): Passes with a lower maximum elevation are discarded.
+    limites (tuple, optional): min_az, max_az, min_el, max_el of the rotor, as returned by its get_limits.
+        AOS and LOS are taken where the pass crosses min_el (the horizon when it is lower), passes higher than max_el are
+        discarded and every turn of the azimuth that keeps the track within min_az and max_az is a candidate.
+
+    Returns:
+    List of dicts with norad_cat_id, nombre, peso, aos, los (epochs), az/el at AOS and LOS, the maximum
+    elevation and rotor_az_aos/rotor_az_los, the azimuths of the rotor at AOS and LOS for that turn.
+    """
+    obs = ephem.Observer()
+    obs.lat = lat
+    obs.long = lon
+    obs.elev = elev
+    fin = epochAEphem(hasta)
+
+    pasadas = []
+    for rango, norad_cat_id in enumerate(prioridades):
+        tle = tles.get(norad_cat_id)
+        if tle is None:
+            continue
+        nombre = tle.nombre
+        try:
+            satellite = ephem.readtle(nombre, tle.tle1, tle.tle2)
+        except ValueError:
+            continue
+        peso = len(prioridades) - rango
+        obs.date = epochAEphem(desde)
+
+        while obs.date < fin:
+            try:
+                tr, azr, tt, altt, ts, azs = obs.next_pass(satellite)
+            except ValueError:
+                break
+            if tr is None or ts is None or tr > fin:
+                break
+            max_el = math.degrees(altt) if altt is not None else 0.0
+            if max_el >= elevacion_minima and max_el <= limites[3]:
+                pasadas.extend(_vueltasDePasada(satellite, obs, tr, ts, limites, {
+                    'norad_cat_id': norad_cat_id,
+                    'nombre': nombre,
+                    'peso': peso,
+                    'max_el': max_el,
+                }))
+            obs.date = ephem.Date(ts + ephem.minute)
+    return pasadas
+
+def _vueltasDePasada(satellite, obs, tr, ts, limites, pasada):
+    """One candidate per turn of the azimuth from which the rotor can follow a pass, none if it can not."""
+    fecha = obs.date
+    muestras = []
+    instante = tr
+    while True:
+        obs.date = instante
+        satellite.compute(obs)
+        muestras.append((instante, math.degrees(satellite.az), math.degrees(satellite.alt)))
+        if instante >= ts:
+            break
+        instante = ephem.Date(min(instante + PASO_RECORRIDO * ephem.second, ts))
+    obs.date = fecha
+
+    # next_pass no considera obs.horizon, la pasada se recorta a la elevación mínima del rotor.
+    visibles = [muestra for muestra in muestras if muestra[2] >= limites[2]] if limites[2] > 0 else muestras
+    if not visibles:
+        return []
+    instantes, azimuts, elevaciones = zip(*visibles)
+    recorrido = desenrollarAzimut(azimuts) - azimuts[0]
+    candidatas = []
+    for rotor_az_aos in vueltasPosibles(azimuts[0], recorrido.min(), recorrido.max(), limites):
+        candidata = dict(pasada)
+        candidata.update({
+            'aos': ephemAEpoch(instantes[0]),
+            'los': ephemAEpoch(instantes[-1]),
+            'az_aos': azimuts[0],
+            'az_los': azimuts[-1],
+            'el_aos': elevaciones[0],
+            'el_los': elevaciones[-1],
+            'rotor_az_aos': rotor_az_aos,
+            'rotor_az_los': rotor_az_aos + recorrido[-1],
+        })
+        candidatas.append(candidata)
+    return candidatas
+
+def planificar(pasadas, velocidad_az=VELOCIDAD_AZ, velocidad_el=VELOCIDAD_EL):
+    """Chooses the subset of passes with the highest total weight that the antenna can follow.
+
+    Two consecutive passes are compatible when the LOS of the first plus the slew time to the
+    AOS position of the second, with the azimuths of the rotor, is not later than that AOS. The
+    turns of the same pass overlap in time, so at most one of them is chosen. Passes are processed in order of AOS,
+    and the best schedule ending at every pass is kept. Predecessors whose LOS is earlier than
+    the longest possible slew are always compatible, so they are answered with a prefix-maximum
+    tree over the LOS order, and only the passes inside that window are checked one by one.
+
+    Returns:
+    The chosen passes in chronological order, each with "Giro_previo_s", the slew time from the previous pass.
+    """
+    if not pasadas:
+        return []
+
+    por_aos = sorted(range(len(pasadas)), key=lambda i: pasadas[i]['aos'])
+    por_los = sorted(range(len(pasadas)), key=lambda i: pasadas[i]['los'])
+    los_ordenados = [pasadas[i]['los'] for i in por_los]
+    posicion_los = {indice: posicion for posicion, indice in enumerate(por_los)}
+    azimuts = [pasada[clave] for pasada in pasadas for clave in ('rotor_az_aos', 'rotor_az_los')]
+    elevaciones = [pasada[clave] for pasada in pasadas for clave in ('el_aos', 'el_los')]
+    giro_maximo = tiempoGiro(min(azimuts), min(elevaciones), max(azimuts), max(elevaciones), velocidad_az, velocidad_el)
+
+    n = len(pasadas)
+    mejor = [0.0] * n
+    anterior = [None] * n
+    # Árbol de Fenwick de máximos (valor, índice de la pasada) sobre el orden por LOS.
+    arbol = [(float('-inf'), None)] * (n + 1)
+
+    def actualizar(posicion, valor):
+        posicion += 1
+        while posicion <= n:
+            if valor[0] > arbol[posicion][0]:
+                arbol[posicion] = valor
+            posicion += posicion & -posicion
+
+    def maximoPrefijo(cantidad):
+        resultado = (float('-inf'), None)
+        while cantidad > 0:
+            if arbol[cantidad][0] > resultado[0]:
+                resultado = arbol[cantidad]
+            cantidad -= cantidad & -cantidad
+        return resultado
+
+    for j in por_aos:
+        pasada = pasadas[j]
+        aos = pasada['aos']
+        seguro = bisect.bisect_right(los_ordenados, aos - giro_maximo)
+        candidato = maximoPrefijo(seguro)
+        for posicion in range(seguro, bisect.bisect_right(los_ordenados, aos)):
+            i = por_los[posicion]
+            previa = pasadas[i]
+            if previa['aos'] >= aos or mejor[i] <= candidato[0]:
+                continue
+            giro = tiempoGiro(previa['rotor_az_los'], previa['el_los'], pasada['rotor_az_aos'], pasada['el_aos'], velocidad_az, velocidad_el)
+            if previa['los'] + giro <= aos:
+                candidato = (mejor[i], i)
+        if candidato[1] is None:
+            mejor[j] = pasada['peso']
+        else:
+            mejor[j] = pasada['peso'] + candidato[0]
+            anterior[j] = candidato[1]
+        actualizar(posicion_los[j], (mejor[j], j))
+
+    ultimo = max(range(n), key=lambda i: mejor[i])
+    elegidas = []
+    while ultimo is not None:
+        elegidas.append(ultimo)
+        ultimo = anterior[ultimo]
+    elegidas.reverse()
+
+    plan = []
+    for posicion, i in enumerate(elegidas):
+        pasada = dict(pasadas[i])
+        if posicion == 0:
+            pasada['Giro_previo_s'] = None
+        else:
+            previa = pasadas[elegidas[posicion - 1]]
+            pasada['Giro_previo_s'] = round(tiempoGiro(previa['rotor_az_los'], previa['el_los'], pasada['rotor_az_aos'], pasada['el_aos'], velocidad_az, velocidad_el), 1)
+        plan.append(pasada)
+    return plan
+
+def muestrearPasada(pasada, tles, lat, lon, elev, computeCycle=2):
+    """Samples the positions of a planned pass, with the same fields as "Pasadas_predecidas" of prediccionPasadaSatelite.
+
+    The azimuths follow the turn of the rotor chosen for the pass, from its "rotor_az_aos", so they
+    can go below 0 or past 360 as the rotor has to be commanded.
+
+    Returns:
+    PUNTO_PASADA array with the points of the pass.
+    """
+    tle = tles[pasada['norad_cat_id']]
+    satellite = ephem.readtle(pasada['nombre'], tle.tle1, tle.tle2)
+    obs = ephem.Observer()
+    obs.lat = lat
+    obs.long = lon
+    obs.elev = elev
+
+    puntos = []
+    tr = epochAEphem(pasada['aos'])
+    ts = epochAEphem(pasada['los'])
+    while tr < ts:
+        obs.date = tr
+        satellite.compute(obs)
+        puntos.append((ephemAEpoch(tr), math.degrees(satellite.az), math.degrees(satellite.alt),
+                       math.degrees(satellite.sublat), math.degrees(satellite.sublong), satellite.elevation))
+        tr = ephem.Date(tr + computeCycle * ephem.second)
+    puntos = np.array(puntos, dtype=PUNTO_PASADA)
+    if len(puntos) and 'rotor_az_aos' in pasada:
+        azimuts = desenrollarAzimut(puntos['az'])
+        puntos['az'] = azimuts + 360 * round((pasada['rotor_az_aos'] - azimuts[0]) / 360)
+    return puntos
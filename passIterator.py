@@ -0,0 +1,124 @@
+"""Lazy iteration of the passes of a satellite over a station.
+
+The AOS/LOS windows are searched one at a time with next_pass, each one from the LOS of the
+previous one, and the sampling of every window runs in a pool of worker processes (ephem holds the
+GIL, so threads would not sample in parallel). A caller that asks for many passes gets their
+windows searched ahead and their samplings running at the same time; a caller that only reads the
+first pass only pays for that one. Every pass gets its own array of points.
+
+The pool is created on first use with one process per CPU. On a single CPU the sampling runs in the
+calling thread, where the pool would only add the cost of sending the points between processes.
+"""
+import collections
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import ephem
+import numpy as np
+
+from groundStations import getStation, observador
+from metrics import PROPAGACION
+from predictionRecords import PUNTO_PASADA, PassRecord
+from requestTiming import span
+from timeUtils import ephemAEpoch, epochAEphem
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+def ejecutorMuestreo():
+    """Returns the pool of worker processes of the samplings, None on a single CPU."""
+    global _ejecutor
+    if (os.cpu_count() or 1) < 2:
+        return None
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            # spawn: los procesos no heredan los hilos ni los sockets del servicio.
+            _ejecutor = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+        return _ejecutor
+
+def muestrearVentana(nombre, tle1, tle2, lat, lon, elev, aos, los, computeCycle):
+    """Samples the position of the satellite and the direction of the antenna every *computeCycle* seconds between two UNIX epochs.
+
+    Only takes plain values, so it can run in a worker process.
+
+    Returns:
+    PUNTO_PASADA array with the points.
+    """
+    satellite = ephem.readtle(nombre, tle1, tle2)
+    obs = ephem.Observer()
+    obs.lat = lat
+    obs.long = lon
+    obs.elev = elev
+    puntos = []
+    tr = epochAEphem(aos)
+    ts = epochAEphem(los)
+    while tr < ts:
+        obs.date = tr
+        satellite.compute(obs)
+        puntos.append((ephemAEpoch(tr), math.degrees(satellite.az), math.degrees(satellite.alt),
+                       math.degrees(satellite.sublat), math.degrees(satellite.sublong), satellite.elevation))
+        # Tiempo para el siguiente calculo
+        tr = ephem.Date(tr + computeCycle * ephem.second)
+    return np.array(puntos, dtype=PUNTO_PASADA)
+
+def ventanasPasadas(nombre, tle, station_id=None):
+    """Generator of the (aos, los) UNIX epochs of the next passes over the station, searched only when they are asked for.
+
+    Ends at the first pass that can not be computed.
+    """
+    satellite = ephem.readtle(nombre, tle.tle1, tle.tle2)
+    obs = observador(station_id)
+    while True:
+        try:
+            with span('next_pass'), PROPAGACION.labels('next_pass').time():
+                tr, azr, tt, altt, ts, azs = obs.next_pass(satellite)
+        except ValueError as error:
+            print(f'Error en el computo: {error}')
+            return
+        if tr is None or ts is None:
+            return
+        yield ephemAEpoch(tr), ephemAEpoch(ts)
+        # La siguiente búsqueda empieza en el LOS, después de la pasada ya entregada.
+        obs.date = ts
+
+def iterarPasadas(nombre, tle, computeCycle=2, station_id=None, adelanto=1, limite=None):
+    """Generator of the next passes of the satellite as PassRecord, numbered from 1.
+
+    Parameters:
+    nombre (str): Name of the satellite.
+    tle (TLERecord): TLE of the satellite.
+    computeCycle (float, optional): Seconds between points.
+    station_id (str, optional): Station of the registry, the main station by default.
+    adelanto (int, optional): Windows searched and sampled ahead of the pass being read. Use the
+                              number of passes that will be read to sample all of them in parallel.
+    limite (int, optional): Passes to deliver at most. With it no window is searched nor sampled past the last
+                            pass, so adelanto=limite costs limite searches and samplings.
+    """
+    estacion = getStation(station_id)
+    ejecutor = ejecutorMuestreo()
+    ventanas = itertools.islice(ventanasPasadas(nombre, tle, station_id), limite)
+    pendientes = collections.deque()
+    numero = 0
+    try:
+        while True:
+            while len(pendientes) < max(1, adelanto):
+                ventana = next(ventanas, None)
+                if ventana is None:
+                    break
+                numero += 1
+                argumentos = (nombre, tle.tle1, tle.tle2, estacion['lat'], estacion['long'], estacion['elev'], ventana[0], ventana[1], computeCycle)
+                pendientes.append((numero, ventana, ejecutor.submit(muestrearVentana, *argumentos) if ejecutor is not None else argumentos))
+            if not pendientes:
+                return
+            numero_pasada, (aos, los), muestreo = pendientes.popleft()
+            with span('pasada'), PROPAGACION.labels('pasada').time():
+                puntos = muestreo.result() if ejecutor is not None else muestrearVentana(*muestreo)
+            yield PassRecord(numero_pasada, aos, los, computeCycle, puntos)
+    finally:
+        if ejecutor is not None:
+            for _, _, muestreo in pendientes:
+                muestreo.cancel()
@@ -0,0 +1,161 @@
+"""Level of detail for ground-track routes.
+
+The track is cut where it crosses the antimeridian, and every piece is simplified on its own, so the
+simplified line never jumps across the map. Each point gets a significance (Douglas-Peucker distance
+or Visvalingam area), so the same ranking answers both a tolerance and a maximum number of points.
+"""
+import heapq
+
+import numpy as np
+
+DOUGLAS_PEUCKER = 'douglas-peucker'
+VISVALINGAM = 'visvalingam'
+
+def segmentosAntimeridiano(lon):
+    """Returns the (inicio, fin) index ranges, fin exclusive, of the pieces of the track between antimeridian crossings."""
+    cortes = np.flatnonzero(np.abs(np.diff(lon)) > 180) + 1
+    limites = np.concatenate(([0], cortes, [len(lon)]))
+    return list(zip(limites[:-1], limites[1:]))
+
+def importanciaDouglasPeucker(x, y, tolerancia=None, max_puntos=None):
+    """Significance of every point of a polyline by Douglas-Peucker.
+
+    The significance of a point is the distance at which Douglas-Peucker adds it, limited by the one
+    of the point that split its parent segment, so keeping the points above a tolerance gives the
+    same result as running Douglas-Peucker with that tolerance. Segments are split in decreasing
+    order of significance, and the search stops as soon as the tolerance or the number of points
+    is reached; the points that were not reached keep a significance of 0.
+
+    Returns:
+    Array with the significance of each point, infinite for the endpoints.
+    """
+    n = len(x)
+    importancia = np.zeros(n)
+    if n == 0:
+        return importancia
+    importancia[0] = importancia[-1] = np.inf
+
+    def dividir(inicio, fin, limite):
+        if fin - inicio < 2:
+            return
+        dx = x[fin] - x[inicio]
+        dy = y[fin] - y[inicio]
+        px = x[inicio + 1:fin] - x[inicio]
+        py = y[inicio + 1:fin] - y[inicio]
+        largo = np.hypot(dx, dy)
+        if largo == 0:
+            distancias = np.hypot(px, py)
+        else:
+            distancias = np.abs(dx * py - dy * px) / largo
+        k = int(np.argmax(distancias))
+        distancia = min(float(distancias[k]), limite)
+        heapq.heappush(pendientes, (-distancia, inicio, fin, inicio + 1 + k))
+
+    pendientes = []
+    dividir(0, n - 1, np.inf)
+    agregados = 0
+    while pendientes:
+        distancia, inicio, fin, indice = heapq.heappop(pendientes)
+        distancia = -distancia
+        if tolerancia is not None and distancia <= tolerancia:
+            break
+        if max_puntos is not None and agregados >= max_puntos:
+            break
+        importancia[indice] = distancia
+        agregados += 1
+        dividir(inicio, indice, distancia)
+        dividir(indice, fin, distancia)
+    return importancia
+
+def _area(x, y, a, b, c):
+    return abs((x[b] - x[a]) * (y[c] - y[a]) - (x[c] - x[a]) * (y[b] - y[a])) / 2
+
+def importanciaVisvalingam(x, y):
+    """Significance of every point of a polyline by Visvalingam-Whyatt.
+
+    The significance is the effective area of the triangle the point forms with its neighbours when
+    it is removed, never lower than the one of the points removed before it.
+
+    Returns:
+    Array with the significance of each point, infinite for the endpoints.
+    """
+    n = len(x)
+    importancia = np.full(n, np.inf)
+    if n < 3:
+        return importancia
+    areas = np.abs((x[1:-1] - x[:-2]) * (y[2:] - y[:-2]) - (x[2:] - x[:-2]) * (y[1:-1] - y[:-2])) / 2
+    # El recorrido del heap es secuencial, con listas de Python es más rápido que indexar arreglos de NumPy.
+    x = x.tolist()
+    y = y.tolist()
+    anterior = list(range(-1, n - 1))
+    siguiente = list(range(1, n + 1))
+    actual = [float('inf')] + areas.tolist() + [float('inf')]
+    removido = [False] * n
+    heap = [(area, indice) for indice, area in enumerate(areas.tolist(), start=1)]
+    heapq.heapify(heap)
+    maximo = 0.0
+    while heap:
+        area, indice = heapq.heappop(heap)
+        if removido[indice] or area != actual[indice]:
+            continue
+        removido[indice] = True
+        maximo = max(maximo, area)
+        importancia[indice] = maximo
+        a = anterior[indice]
+        c = siguiente[indice]
+        siguiente[a] = c
+        anterior[c] = a
+        for vecino in (a, c):
+            if 0 < vecino < n - 1:
+                actual[vecino] = _area(x, y, anterior[vecino], vecino, siguiente[vecino])
+                heapq.heappush(heap, (actual[vecino], vecino))
+    return importancia
+
+def simplificarIndices(lat, lon, tolerancia=None, max_puntos=None, metodo=DOUGLAS_PEUCKER):
+    """Chooses the points of a ground track to keep.
+
+    Parameters:
+    lat, lon (array): Latitude and longitude of the points in degrees, longitude in [-180, 180].
+    tolerancia (float, optional): Distance in degrees (Douglas-Peucker) or area in square degrees (Visvalingam).
+    max_puntos (int, optional): Maximum number of points. The ends of every piece between antimeridian
+                                crossings are always kept.
+    metodo (str, optional): "douglas-peucker" or "visvalingam".
+
+    Returns:
+    Sorted array with the indices of the points to keep.
+
+    Raises:
+    ValueError: Unknown method.
+    """
+    if metodo not in (DOUGLAS_PEUCKER, VISVALINGAM):
+        raise ValueError(f'Metodo de simplificacion desconocido: {metodo}')
+
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    importancia = np.empty(len(lat))
+    for inicio, fin in segmentosAntimeridiano(lon):
+        if metodo == DOUGLAS_PEUCKER:
+            importancia[inicio:fin] = importanciaDouglasPeucker(lon[inicio:fin], lat[inicio:fin], tolerancia, max_puntos)
+        else:
+            importancia[inicio:fin] = importanciaVisvalingam(lon[inicio:fin], lat[inicio:fin])
+
+    conservar = np.ones(len(lat), dtype=bool)
+    if tolerancia is not None:
+        conservar &= importancia > tolerancia
+    if max_puntos is not None and np.count_nonzero(conservar) > max_puntos:
+        candidatos = np.flatnonzero(conservar)
+        mejores = candidatos[np.argsort(-importancia[candidatos], kind='stable')[:max(int(max_puntos), 0)]]
+        conservar = np.zeros(len(lat), dtype=bool)
+        conservar[mejores] = True
+        conservar |= np.isinf(importancia)
+    return np.flatnonzero(conservar)
+
+def simplificarRuta(puntos, tolerancia=None, max_puntos=None, metodo=DOUGLAS_PEUCKER):
+    """Simplifies a route, a structured array with "lat" and "long" fields, keeping the points as they are.
+
+    Returns:
+    The array with only the kept points.
+    """
+    if len(puntos) < 3 or (tolerancia is None and max_puntos is None):
+        return puntos
+    return puntos[simplificarIndices(puntos['lat'], puntos['long'], tolerancia, max_puntos, metodo)]
@@ -0,0 +1,341 @@
+"""Local archive of the pass predictions and of the passes tracked by the rotors.
+
+The archive is a SQLite database shared by the prediction and the rotor services of the host:
+
+    predicciones  One row per computed pass prediction: satellite, station, parameters, TLE used
+                  and the file with its points.
+    pasadas       One row per pass of a prediction: AOS, LOS, maximum elevation, TLE epoch and the
+                  rows of its points in the file of the prediction, indexed by satellite and time.
+    seguimientos  One row per tracking session of a rotor: task, prediction and satellite when they
+                  are known, start and end, indexed by time and satellite.
+
+The points of every prediction are written once as a .npy file of PUNTO_PASADA rows (all its passes
+one after the other) and read back memory-mapped, so a pass is served from its slice without
+loading the rest. A prediction is identified by the hash of its inputs (satellite, station,
+passes, cycle, Doppler and the TLE lines): while the TLE is the same and its first pass has not
+started, the archived prediction is the same one a new computation would give, and it is served
+from the archive instead.
+
+The predictions whose passes ended and the closed trackings older than "retencion_dias" of
+config.json (RETENCION_POR_DEFECTO days if missing) are deleted, with their files, when the archive
+is opened and then every PERIODO_PODA seconds while predictions are archived. With
+"retencion_dias": null nothing is deleted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from predictionRecords import PassRecord
+from timeUtils import formatearFecha
+from tleStore import epochsTLE
+
+DIRECTORIO_ARCHIVO = 'archivo'
+BASE_DE_DATOS = 'predicciones.sqlite'
+DIRECTORIO_MUESTRAS = 'muestras'
+# Segundos que espera una escritura si el otro servicio tiene la base bloqueada.
+ESPERA_BLOQUEO = 5.0
+LIMITE_CONSULTA = 1000
+# Segundos entre las podas del archivo, cuando tiene retención.
+PERIODO_PODA = 3600
+# Días que se conservan las predicciones si config.json no dice otra cosa.
+RETENCION_POR_DEFECTO = 30
+
+ESQUEMA = '''
+CREATE TABLE IF NOT EXISTS predicciones (
+    id TEXT PRIMARY KEY,
+    clave TEXT NOT NULL,
+    norad_cat_id INTEGER NOT NULL,
+    satelite TEXT,
+    station_id TEXT,
+    numero_pasadas INTEGER NOT NULL,
+    ciclo REAL NOT NULL,
+    doppler INTEGER NOT NULL,
+    tle1 TEXT,
+    tle2 TEXT,
+    tle_epoch REAL,
+    tle_actualizado REAL,
+    creada REAL NOT NULL,
+    muestras TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predicciones_clave ON predicciones (clave, creada);
+CREATE INDEX IF NOT EXISTS predicciones_norad ON predicciones (norad_cat_id, creada);
+
+CREATE TABLE IF NOT EXISTS pasadas (
+    id INTEGER PRIMARY KEY,
+    prediccion_id TEXT NOT NULL REFERENCES predicciones (id),
+    numero INTEGER,
+    norad_cat_id INTEGER NOT NULL,
+    station_id TEXT,
+    aos REAL NOT NULL,
+    los REAL NOT NULL,
+    elevacion_maxima REAL,
+    tle_epoch REAL,
+    desde INTEGER NOT NULL,
+    hasta INTEGER NOT NULL,
+    doppler TEXT
+);
+CREATE INDEX IF NOT EXISTS pasadas_norad_aos ON pasadas (norad_cat_id, aos);
+CREATE INDEX IF NOT EXISTS pasadas_aos ON pasadas (aos);
+CREATE INDEX IF NOT EXISTS pasadas_prediccion ON pasadas (prediccion_id, numero);
+
+CREATE TABLE IF NOT EXISTS seguimientos (
+    id INTEGER PRIMARY KEY,
+    sesion_id TEXT,
+    rotor_id TEXT NOT NULL,
+    tarea TEXT NOT NULL,
+    prediccion_id TEXT,
+    norad_cat_id INTEGER,
+    satelite TEXT,
+    aos REAL,
+    los REAL,
+    elevacion_maxima REAL,
+    inicio REAL NOT NULL,
+    fin REAL,
+    completado INTEGER
+);
+CREATE INDEX IF NOT EXISTS seguimientos_inicio ON seguimientos (inicio);
+CREATE INDEX IF NOT EXISTS seguimientos_norad ON seguimientos (norad_cat_id, inicio);
+'''
+
+def clavePrediccion(norad_cat_id, station_id, numero_pasadas, ciclo, doppler, tle):
+    """Hash of the inputs of a pass prediction, equal for the predictions that give the same passes."""
+    texto = '|'.join(str(valor) for valor in (norad_cat_id, station_id, numero_pasadas, float(ciclo), bool(doppler), tle.tle1, tle.tle2))
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+def archivoDeConfig(config):
+    """PredictionArchive of config.json, None if "archivo" is null.
+
+    It is in the "archivo" directory (archivo/ if missing) and keeps "retencion_dias" days
+    (RETENCION_POR_DEFECTO if missing, forever if null).
+    """
+    if 'archivo' in config and config['archivo'] is None:
+        return None
+    return PredictionArchive(config.get('archivo') or DIRECTORIO_ARCHIVO, config.get('retencion_dias', RETENCION_POR_DEFECTO))
+
+def _filaPasada(fila):
+    return {
+        'Prediccion_ID': fila['prediccion_id'],
+        'Numero_Pasada': fila['numero'],
+        'norad_cat_id': fila['norad_cat_id'],
+        'station_id': fila['station_id'],
+        'Tiempo_Inicio': formatearFecha(fila['aos']),
+        'Tiempo_Termino': formatearFecha(fila['los']),
+        'Epoch_Inicio': fila['aos'],
+        'Epoch_Termino': fila['los'],
+        'max_el': None if fila['elevacion_maxima'] is None else round(fila['elevacion_maxima'], 1),
+        'TLE_Epoch': fila['tle_epoch'],
+    }
+
+def _filaSeguimiento(fila):
+    return {
+        'id': fila['id'],
+        'sesion_id': fila['sesion_id'],
+        'rotorId': fila['rotor_id'],
+        'tarea': fila['tarea'],
+        'Prediccion_ID': fila['prediccion_id'],
+        'norad_cat_id': fila['norad_cat_id'],
+        'Satelite': fila['satelite'],
+        'Tiempo_Inicio': formatearFecha(fila['inicio']),
+        'Tiempo_Fin': None if fila['fin'] is None else formatearFecha(fila['fin']),
+        'Epoch_Inicio': fila['inicio'],
+        'Epoch_Fin': fila['fin'],
+        'max_el': None if fila['elevacion_maxima'] is None else round(fila['elevacion_maxima'], 1),
+        'completado': None if fila['completado'] is None else bool(fila['completado']),
+    }
+
+class PredictionArchive:
+    """Archive in *directorio*: the SQLite database and the directory of the points."""
+
+    def __init__(self, directorio=DIRECTORIO_ARCHIVO, retencion_dias=None):
+        """
+        Args:
+            directorio (str, optional): Directory of the archive.
+            retencion_dias (float, optional): Days that predictions and trackings are kept, forever by default.
+        """
+        self.directorio = directorio
+        self.ruta = os.path.join(directorio, BASE_DE_DATOS)
+        self.retencion_dias = retencion_dias
+        self._local = threading.local()
+        self._ultima_poda = 0.0
+        os.makedirs(os.path.join(directorio, DIRECTORIO_MUESTRAS), exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.executescript(ESQUEMA)
+        self._podarSiToca()
+
+    def _conexion(self):
+        # Una conexión por hilo, sqlite3 no permite compartirlas.
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO)
+            conexion.row_factory = sqlite3.Row
+            # WAL: los dos servicios leen mientras el otro escribe.
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def guardarPrediccion(self, clave, norad_cat_id, satelite, station_id, numero_pasadas, ciclo, doppler, tle, pasadas):
+        """Archives a pass prediction.
+
+        Args:
+            clave (str): clavePrediccion of its inputs.
+            norad_cat_id (int), satelite (str), station_id (str): Satellite and station.
+            numero_pasadas (int), ciclo (float), doppler (bool): Parameters of the prediction.
+            tle (TLERecord): TLE used.
+            pasadas (list): PassRecord of every pass, None for the passes that could not be computed.
+
+        Returns:
+            Id of the prediction.
+        """
+        prediccion_id = uuid.uuid4().hex
+        calculadas = [pasada for pasada in pasadas if pasada is not None]
+        puntos = np.concatenate([pasada.puntos for pasada in calculadas]) if calculadas else np.empty(0)
+        muestras = os.path.join(DIRECTORIO_MUESTRAS, f'{prediccion_id}.npy')
+        np.save(os.path.join(self.directorio, muestras), puntos)
+
+        tle_epoch = float(epochsTLE([tle.tle1])[0])
+        filas = []
+        desde = 0
+        for pasada in calculadas:
+            hasta = desde + len(pasada.puntos)
+            filas.append((prediccion_id, pasada.numero, norad_cat_id, station_id, pasada.inicio, pasada.fin,
+                          float(pasada.puntos['el'].max()) if len(pasada.puntos) else None, tle_epoch, desde, hasta,
+                          None if pasada.doppler is None else json.dumps(pasada.doppler)))
+            desde = hasta
+
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute(
+                'INSERT INTO predicciones (id, clave, norad_cat_id, satelite, station_id, numero_pasadas, ciclo, doppler,'
+                ' tle1, tle2, tle_epoch, tle_actualizado, creada, muestras) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (prediccion_id, clave, norad_cat_id, satelite, station_id, numero_pasadas, float(ciclo), int(bool(doppler)),
+                 tle.tle1, tle.tle2, tle_epoch, tle.actualizado, time.time(), muestras))
+            conexion.executemany(
+                'INSERT INTO pasadas (prediccion_id, numero, norad_cat_id, station_id, aos, los, elevacion_maxima, tle_epoch,'
+                ' desde, hasta, doppler) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', filas)
+        self._podarSiToca()
+        return prediccion_id
+
+    def podar(self, ahora=None):
+        """Deletes the predictions whose passes all ended, and the closed trackings, from before the retention.
+
+        Returns:
+            (predicciones, seguimientos) deleted, (0, 0) if the archive has no retention.
+        """
+        if self.retencion_dias is None:
+            return 0, 0
+        limite = (time.time() if ahora is None else ahora) - float(self.retencion_dias) * 86400
+        conexion = self._conexion()
+        with conexion:
+            viejas = conexion.execute(
+                'SELECT id, muestras FROM predicciones p WHERE creada < ?'
+                ' AND NOT EXISTS (SELECT 1 FROM pasadas s WHERE s.prediccion_id = p.id AND s.los >= ?)',
+                (limite, limite)).fetchall()
+            ids = [(fila['id'],) for fila in viejas]
+            conexion.executemany('DELETE FROM pasadas WHERE prediccion_id = ?', ids)
+            conexion.executemany('DELETE FROM predicciones WHERE id = ?', ids)
+            seguimientos = conexion.execute('DELETE FROM seguimientos WHERE fin IS NOT NULL AND fin < ?', (limite,)).rowcount
+        # Los archivos se borran después de las filas: un lector que ya tiene la fila sigue con el archivo mapeado.
+        for fila in viejas:
+            try:
+                os.remove(os.path.join(self.directorio, fila['muestras']))
+            except FileNotFoundError:
+                pass
+        return len(viejas), seguimientos
+
+    def _podarSiToca(self):
+        ahora = time.time()
+        if self.retencion_dias is None or ahora - self._ultima_poda < PERIODO_PODA:
+            return
+        self._ultima_poda = ahora
+        podadas, seguimientos = self.podar(ahora)
+        if podadas or seguimientos:
+            print(f'Archivo podado: {podadas} predicciones y {seguimientos} seguimientos de hace mas de {self.retencion_dias} dias')
+
+    def buscarVigente(self, clave, ahora):
+        """Id of the latest archived prediction with the given inputs whose first pass starts after *ahora*, or None."""
+        fila = self._conexion().execute(
+            'SELECT p.id FROM predicciones p JOIN pasadas s ON s.prediccion_id = p.id'
+            ' WHERE p.clave = ? GROUP BY p.id HAVING MIN(s.aos) > ? ORDER BY p.creada DESC LIMIT 1',
+            (clave, ahora)).fetchone()
+        return None if fila is None else fila['id']
+
+    def leerPrediccion(self, prediccion_id):
+        """Reads an archived prediction.
+
+        Returns:
+            (prediccion, pasadas): the row of the prediction as a dict, and the PassRecord of every
+            pass with its points read from the memory-mapped file, None for the passes that could not
+            be computed. None if there is no prediction with that id.
+        """
+        conexion = self._conexion()
+        prediccion = conexion.execute('SELECT * FROM predicciones WHERE id = ?', (prediccion_id,)).fetchone()
+        if prediccion is None:
+            return None
+        filas = conexion.execute('SELECT * FROM pasadas WHERE prediccion_id = ? ORDER BY numero', (prediccion_id,)).fetchall()
+        puntos = np.load(os.path.join(self.directorio, prediccion['muestras']), mmap_mode='r') if filas else None
+        pasadas = [
+            PassRecord(fila['numero'], fila['aos'], fila['los'], prediccion['ciclo'], puntos[fila['desde']:fila['hasta']],
+                       None if fila['doppler'] is None else json.loads(fila['doppler']))
+            for fila in filas
+        ]
+        pasadas += [None] * (prediccion['numero_pasadas'] - len(pasadas))
+        return dict(prediccion), pasadas
+
+    def pasadas(self, norad_cat_id=None, station_id=None, desde=None, hasta=None, limite=LIMITE_CONSULTA):
+        """Archived passes with AOS between two UNIX epochs, the latest prediction of each pass, by AOS.
+
+        Passes predicted several times (another number of passes, another cycle, a newer TLE) are
+        returned once, with the prediction made last.
+        """
+        condiciones = []
+        parametros = []
+        for condicion, valor in (('norad_cat_id = ?', norad_cat_id), ('station_id = ?', station_id), ('aos >= ?', desde), ('aos < ?', hasta)):
+            if valor is not None:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        donde = f'WHERE {" AND ".join(condiciones)}' if condiciones else ''
+        # La misma pasada predicha varias veces tiene el AOS a pocos segundos, se agrupan por minuto.
+        filas = self._conexion().execute(
+            f'SELECT *, MAX(id) FROM pasadas {donde} GROUP BY norad_cat_id, station_id, CAST(aos / 60 AS INTEGER)'
+            f' ORDER BY aos LIMIT ?', (*parametros, limite)).fetchall()
+        return [_filaPasada(fila) for fila in filas]
+
+    def iniciarSeguimiento(self, rotor_id, tarea, sesion_id=None, prediccion_id=None, norad_cat_id=None, satelite=None,
+                           aos=None, los=None, elevacion_maxima=None):
+        """Archives the start of a tracking session of a rotor.
+
+        Returns:
+            Id of the tracking, to be closed with terminarSeguimiento.
+        """
+        conexion = self._conexion()
+        with conexion:
+            cursor = conexion.execute(
+                'INSERT INTO seguimientos (sesion_id, rotor_id, tarea, prediccion_id, norad_cat_id, satelite, aos, los,'
+                ' elevacion_maxima, inicio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (sesion_id, rotor_id, tarea, prediccion_id, norad_cat_id, satelite, aos, los, elevacion_maxima, time.time()))
+        return cursor.lastrowid
+
+    def terminarSeguimiento(self, seguimiento_id, completado):
+        """Archives the end of a tracking session, *completado* False if it was stopped or failed."""
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute('UPDATE seguimientos SET fin = ?, completado = ? WHERE id = ?',
+                             (time.time(), int(bool(completado)), seguimiento_id))
+
+    def seguimientos(self, desde=None, hasta=None, norad_cat_id=None, limite=LIMITE_CONSULTA):
+        """Trackings started between two UNIX epochs, by start."""
+        condiciones = []
+        parametros = []
+        for condicion, valor in (('norad_cat_id = ?', norad_cat_id), ('inicio >= ?', desde), ('inicio < ?', hasta)):
+            if valor is not None:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        donde = f'WHERE {" AND ".join(condiciones)}' if condiciones else ''
+        filas = self._conexion().execute(f'SELECT * FROM seguimientos {donde} ORDER BY inicio LIMIT ?', (*parametros, limite)).fetchall()
+        return [_filaSeguimiento(fila) for fila in filas]
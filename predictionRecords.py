@@ -0,0 +1,112 @@
+"""Compact records for the TLEs, passes and track series of the predictions.
+
+TLEs and passes are __slots__ classes, and the points of a pass, a route or a tracking series are
+NumPy structured arrays with one row per instant and the time as a UNIX epoch. The JSON shapes of
+the APIs are only built from them when a response is serialised, or read into them when a request
+arrives. See timeUtils for the handling of the times.
+"""
+import numpy as np
+
+from timeUtils import fechaAEpoch, fechaSatNogsAEpoch, formatearFecha, formatearFechas
+
+# Puntos de una pasada: dirección de la antena y posición del satelite.
+PUNTO_PASADA = np.dtype([('t', 'f8'), ('az', 'f4'), ('el', 'f4'), ('lat', 'f8'), ('long', 'f8'), ('elev', 'f8')])
+# Puntos de la ruta del satelite sobre el mapa.
+PUNTO_RUTA = np.dtype([('t', 'f8'), ('lat', 'f8'), ('long', 'f8'), ('elev', 'f8')])
+# Puntos que sigue la antena, de una pasada o de un cuerpo celeste.
+PUNTO_SEGUIMIENTO = np.dtype([('t', 'f8'), ('az', 'f4'), ('el', 'f4')])
+
+# Decimales con los que se entrega cada campo en la API.
+DECIMALES = {'az': 1, 'el': 1, 'lat': 6, 'long': 6, 'elev': 2}
+
+class TLERecord:
+    """TLE of one satellite, with the fields of SatNogs used for the predictions."""
+
+    __slots__ = ('norad_cat_id', 'tle0', 'tle1', 'tle2', 'actualizado')
+
+    def __init__(self, norad_cat_id, tle0, tle1, tle2, actualizado):
+        """
+        Args:
+            norad_cat_id (int): NORAD id of the satellite.
+            tle0, tle1, tle2 (str): Lines of the TLE, tle0 with the name.
+            actualizado (float): UNIX epoch of the last update of the TLE in SatNogs.
+        """
+        self.norad_cat_id = norad_cat_id
+        self.tle0 = tle0
+        self.tle1 = tle1
+        self.tle2 = tle2
+        self.actualizado = actualizado
+
+    @classmethod
+    def fromSatNogs(cls, item):
+        """Builds the record from a TLE as returned by the SatNogs API."""
+        return cls(item.get('norad_cat_id'), item['tle0'], item['tle1'], item['tle2'], fechaSatNogsAEpoch(item['updated']))
+
+    @property
+    def nombre(self):
+        """Name of the satellite, tle0 without the "0 " prefix."""
+        return self.tle0[2:] if self.tle0.startswith('0 ') else self.tle0
+
+class PassRecord:
+    """One pass of a satellite over a station, with its points as a PUNTO_PASADA array."""
+
+    __slots__ = ('numero', 'inicio', 'fin', 'ciclo', 'puntos', 'doppler')
+
+    def __init__(self, numero, inicio, fin, ciclo, puntos, doppler=None):
+        """
+        Args:
+            numero (int): Number of the pass, None if it is not part of a series of passes.
+            inicio, fin (float): UNIX epochs of the AOS and the LOS.
+            ciclo (float): Seconds between points.
+            puntos (ndarray): Points of the pass.
+            doppler (dict, optional): Doppler data of the pass, see dopplerSeries.dopplerPasada.
+        """
+        self.numero = numero
+        self.inicio = inicio
+        self.fin = fin
+        self.ciclo = ciclo
+        self.puntos = puntos
+        self.doppler = doppler
+
+    def toJson(self):
+        """Returns the pass with the fields of a pass of prediccionPasadaSatelite."""
+        pasada = {} if self.numero is None else {"Numero_Pasada" : self.numero}
+        pasada["Tiempo_Inicio"] = formatearFecha(self.inicio)
+        pasada["Tiempo_Termino"] = formatearFecha(self.fin)
+        pasada["Ciclo_computo"] = self.ciclo
+        pasada["Pasadas_predecidas"] = puntosAJson(self.puntos)
+        if self.doppler is not None:
+            pasada["Doppler"] = self.doppler
+        return pasada
+
+def puntosAJson(puntos, con_epoch=True):
+    """Converts a series of points to the list of dicts of the API.
+
+    Every point gets "Tiempo_Cordenada", its Chile/Continental date, and "Epoch", its UNIX epoch in
+    seconds unless *con_epoch* is False, and the rest of the fields rounded as in DECIMALES.
+    """
+    nombres = ['Tiempo_Cordenada']
+    columnas = [formatearFechas(puntos['t'])]
+    if con_epoch:
+        nombres.append('Epoch')
+        columnas.append(np.round(puntos['t'], 3).tolist())
+    for campo in puntos.dtype.names:
+        if campo == 't':
+            continue
+        nombres.append(campo)
+        columnas.append(np.round(puntos[campo].astype(float), DECIMALES[campo]).tolist())
+    return [dict(zip(nombres, fila)) for fila in zip(*columnas)]
+
+def seguimientoDesdeJson(puntos):
+    """Reads the points of a prediction sent to the rotor ("Epoch" or "Tiempo_Cordenada", "az", "el") into a PUNTO_SEGUIMIENTO array sorted by time.
+
+    "Epoch" is used when the point has it; otherwise the Chile/Continental date is read, with one
+    second of resolution.
+    """
+    seguimiento = np.empty(len(puntos), dtype=PUNTO_SEGUIMIENTO)
+    for indice, punto in enumerate(puntos):
+        epoch = punto.get('Epoch')
+        if epoch is None:
+            epoch = fechaAEpoch(punto['Tiempo_Cordenada'])
+        seguimiento[indice] = (epoch, punto['az'], punto['el'])
+    return seguimiento[np.argsort(seguimiento['t'], kind='stable')]
@@ -0,0 +1,212 @@
+"""Per-request timing breakdown and on-demand sampling profiles.
+
+The stages of a request (SatNogs fetch, next_pass, sampling, encoding...) are wrapped in span, and
+their durations are returned in the Server-Timing header of the response, so the browser devtools
+or curl -I show where a slow request spent its time. Spans are kept in a contextvar, one dict per
+request, and cost a single lookup when no request is being measured.
+
+The sampling profiler records the Python stack of the thread that serves a request every few
+milliseconds, for the next N requests after it is armed through /admin/perfil, and serves them as
+collapsed stacks ("a;b;c 12") for flamegraph.pl or speedscope. It needs "admin_token" in
+config.json; without it the admin routes answer 404. gevent is not monkey-patched in the
+prediction service, so the sampler is a real thread and sees the stack of the request while it
+computes.
+"""
+import collections
+import contextvars
+import hmac
+import os
+import sys
+import threading
+import time
+
+from flask import Response, g, jsonify, request
+
+# Duración acumulada y cantidad de veces de cada etapa de la petición en curso.
+_TIEMPOS = contextvars.ContextVar('tiempos_peticion', default=None)
+
+# Intervalo entre muestras del perfilador, en segundos.
+INTERVALO_MUESTREO = 0.005
+# Cantidad máxima de peticiones que se pueden perfilar de una vez.
+MAX_PETICIONES_PERFIL = 100
+
+class span:
+    """Context manager that adds the seconds spent inside it to the stage *nombre* of the current request.
+
+    Stages with the same name are added together, so a span inside a loop reports the total.
+    """
+
+    __slots__ = ('nombre', 'tiempos', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.tiempos = _TIEMPOS.get()
+        if self.tiempos is not None:
+            self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, error, traza):
+        if self.tiempos is not None:
+            total, veces = self.tiempos.get(self.nombre, (0.0, 0))
+            self.tiempos[self.nombre] = (total + time.perf_counter() - self.inicio, veces + 1)
+        return False
+
+def serverTiming(tiempos, total=None):
+    """Builds the value of the Server-Timing header from the stages of a request.
+
+    Parameters:
+    tiempos (dict): Stage name to (seconds, times).
+    total (float, optional): Seconds of the whole request, added as the "total" stage.
+
+    Returns:
+    String such as 'satnogs_tle;dur=120.4, pasada;dur=5.2;desc="x3", total;dur=131.0', durations in ms.
+    """
+    metricas = []
+    for nombre, (segundos, veces) in tiempos.items():
+        metrica = f'{nombre};dur={segundos * 1000:.1f}'
+        if veces > 1:
+            metrica += f';desc="x{veces}"'
+        metricas.append(metrica)
+    if total is not None:
+        metricas.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metricas)
+
+def _pila(frame):
+    marcos = []
+    while frame is not None:
+        codigo = frame.f_code
+        marcos.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(marcos))
+
+class _Muestreo:
+    """Thread that samples the stack of one thread until it is stopped."""
+
+    def __init__(self, ident, intervalo):
+        self.ident = ident
+        self.intervalo = intervalo
+        self.pilas = collections.Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilador', daemon=True)
+        self._hilo.start()
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.ident)
+            if frame is not None:
+                self.pilas[_pila(frame)] += 1
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+        return self.pilas
+
+class SamplingProfiler:
+    """Samples the stacks of the next requests after it is armed and keeps them as collapsed stacks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pilas = collections.Counter()
+        self._restantes = 0
+        self._perfiladas = 0
+        self._intervalo = INTERVALO_MUESTREO
+
+    def armar(self, peticiones, intervalo=INTERVALO_MUESTREO):
+        """Discards the previous profile and profiles the next *peticiones* requests."""
+        with self._lock:
+            self._pilas = collections.Counter()
+            self._restantes = peticiones
+            self._perfiladas = 0
+            self._intervalo = intervalo
+
+    def iniciar(self):
+        """Starts sampling the current thread if the profiler is armed.
+
+        Returns:
+        The sampling to give to terminar, or None if this request is not profiled.
+        """
+        with self._lock:
+            if self._restantes <= 0:
+                return None
+            self._restantes -= 1
+            intervalo = self._intervalo
+        return _Muestreo(threading.get_ident(), intervalo)
+
+    def terminar(self, muestreo):
+        """Stops a sampling and adds its stacks to the profile."""
+        pilas = muestreo.detener()
+        with self._lock:
+            self._pilas.update(pilas)
+            self._perfiladas += 1
+
+    def estado(self):
+        with self._lock:
+            return {'restantes': self._restantes, 'perfiladas': self._perfiladas,
+                    'muestras': sum(self._pilas.values()), 'intervalo_ms': self._intervalo * 1000}
+
+    def colapsadas(self):
+        """Returns the profile in the collapsed stacks format, one "stack count" line per stack."""
+        with self._lock:
+            pilas = list(self._pilas.items())
+        return ''.join(f'{pila} {cantidad}\n' for pila, cantidad in sorted(pilas))
+
+def instrumentarTiempos(app, admin_token=None, perfilador=None):
+    """Adds the Server-Timing header to every response of a Flask app and the admin routes of the profiler.
+
+    Parameters:
+    app (Flask): Application to instrument.
+    admin_token (str, optional): Token expected in the X-Admin-Token header of /admin/perfil. Without it
+                                 the profiler can not be armed.
+    perfilador (SamplingProfiler, optional): Profiler of the app, a new one by default.
+
+    Returns:
+    The SamplingProfiler of the app.
+    """
+    perfilador = perfilador if perfilador is not None else SamplingProfiler()
+
+    @app.before_request
+    def iniciarTiempos():
+        g.tiempos_inicio = time.perf_counter()
+        _TIEMPOS.set({})
+        if request.endpoint != 'perfil':
+            g.muestreo = perfilador.iniciar()
+
+    @app.after_request
+    def agregarServerTiming(response):
+        tiempos = _TIEMPOS.get()
+        inicio = g.get('tiempos_inicio')
+        if tiempos is not None and inicio is not None:
+            response.headers['Server-Timing'] = serverTiming(tiempos, time.perf_counter() - inicio)
+        return response
+
+    @app.teardown_request
+    def terminarTiempos(error=None):
+        _TIEMPOS.set(None)
+        muestreo = g.pop('muestreo', None)
+        if muestreo is not None:
+            perfilador.terminar(muestreo)
+
+    def perfil():
+        """GET returns the collapsed stacks of the profile; POST {"peticiones": N, "intervalo_ms": 5} arms the profiler."""
+        if not admin_token:
+            return jsonify({'Error': 'Perfilador deshabilitado'}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+            return jsonify({'Error': 'Token invalido'}), 403
+        if request.method == 'GET':
+            return Response(perfilador.colapsadas(), content_type='text/plain; charset=utf-8')
+
+        post_data = request.get_json(silent=True) or {}
+        try:
+            peticiones = int(post_data.get('peticiones', 1))
+            intervalo = float(post_data.get('intervalo_ms', INTERVALO_MUESTREO * 1000)) / 1000
+            if not 0 < peticiones <= MAX_PETICIONES_PERFIL or intervalo <= 0:
+                raise ValueError(f'peticiones debe estar entre 1 y {MAX_PETICIONES_PERFIL} e intervalo_ms ser positivo')
+        except (TypeError, ValueError) as error:
+            return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+        perfilador.armar(peticiones, intervalo)
+        return jsonify({'Perfil': perfilador.estado()}), 202
+
+    app.add_url_rule('/admin/perfil', 'perfil', perfil, methods=['GET', 'POST'])
+    return perfilador
@@ -0,0 +1,135 @@
+"""Pre-encoded and conditional HTTP responses for the Flask APIs.
+
+The payload is serialised and compressed once, and the same bytes are served to every client
+that asks for them. Clients that already have the current version receive a 304 without a body.
+"""
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class EncodedResponse:
+    """JSON payload serialised once and stored in every encoding the API can serve."""
+
+    __slots__ = ('etag', 'identity', 'gzip', 'br')
+
+    def __init__(self, etag, identity, gzip_body, br_body):
+        self.etag = etag
+        self.identity = identity
+        self.gzip = gzip_body
+        self.br = br_body
+
+def encodeResponse(payload, version=None):
+    """Serialises the payload with the app JSON provider and pre-compresses it.
+
+    Parameters:
+    payload (dict): Data returned by the endpoint, with the same shape that jsonify would receive.
+    version (str, optional): Version of the source data (catalog version, TLE epoch). The ETag is derived from it
+                             when given, otherwise from the hash of the serialised bytes.
+
+    Returns:
+    EncodedResponse with the strong ETag and the identity, gzip and brotli bodies.
+    """
+    body = (current_app.json.dumps(payload) + '\n').encode('utf-8')
+    if version is None:
+        version = hashlib.sha1(body).hexdigest()[:20]
+    gzip_body = gzip.compress(body, compresslevel=6)
+    br_body = brotli.compress(body, quality=5) if brotli is not None else None
+    return EncodedResponse(str(version), body, gzip_body, br_body)
+
+def conditionalResponse(encoded, status=200):
+    """Builds the response for the current request from a pre-encoded payload.
+
+    Answers 304 when the If-None-Match header contains the ETag of any of the encodings,
+    otherwise chooses brotli, gzip or identity according to Accept-Encoding.
+
+    Returns:
+    Flask Response.
+    """
+    response = notModifiedResponse(encoded.etag)
+    if response is not None:
+        return response
+
+    encoding = _chooseEncoding(encoded.br is not None)
+    if encoding == 'br':
+        body = encoded.br
+    elif encoding == 'gzip':
+        body = encoded.gzip
+    else:
+        body = encoded.identity
+
+    response = Response(body, status=status, mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(_etagFor(encoded.etag, encoding))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def notModifiedResponse(version):
+    """Answers 304 when the If-None-Match header contains the ETag of any encoding of a version.
+
+    Lets an endpoint that knows the version of its data before building the payload skip the
+    serialisation and the compression for clients that already have it.
+
+    Returns:
+    Flask Response with status 304, or None if the client does not have that version.
+    """
+    version = str(version)
+    etags = (version, version + '-br', version + '-gzip')
+    if not any(request.if_none_match.contains(etag) for etag in etags):
+        return None
+    response = Response(status=304)
+    response.set_etag(_etagFor(version, _chooseEncoding(brotli is not None)))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _chooseEncoding(con_br):
+    accept = request.accept_encodings
+    if con_br and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return 'identity'
+
+def _etagFor(etag, encoding):
+    # Cada representación lleva su propio ETag fuerte, como exige HTTP para contenido comprimido.
+    if encoding == 'identity':
+        return etag
+    return f'{etag}-{encoding}'
+
+class EncodedResponseCache:
+    """Small cache of pre-encoded responses with expiration time, keyed by request parameters."""
+
+    def __init__(self, ttl, max_entries=128):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached EncodedResponse for the key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, encoded = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return encoded
+
+    def put(self, key, encoded, ttl=None):
+        """Stores the EncodedResponse for the key, dropping the oldest entry when the cache is full."""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self._max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + (self._ttl if ttl is None else ttl), encoded)
@@ -0,0 +1,174 @@
+"""Manual control of the rotors over Socket.IO, with press and release semantics.
+
+The operator console emits "jog_presionar" with the direction when a button is pressed and keeps
+emitting it every JOG_REPETICION_SEGUNDOS while the button is held, and "jog_soltar" when it is
+released. The first press sends the motor command of the direction; the repetitions only keep the
+jog alive, without any serial traffic, so holding a button costs one command. The release sends
+stop_movement_motor.
+
+If the release never arrives (the connection dropped, the browser tab froze), the dead-man timer
+stops the motor HOMBRE_MUERTO_SEGUNDOS after the last press. Jog commands go before the status
+readings queued in the controller, so the time from the event to the motor only depends on the
+command being sent at that moment.
+
+Only one client jogs a rotor at a time, the last one that pressed a direction. Pressing a
+direction stops the tracking session of the rotor.
+"""
+import threading
+import time
+
+from metrics import REGISTRO
+
+# Comando de ROT2Prog de cada dirección.
+DIRECCIONES = {
+    'left': 'move_left_motor_1',
+    'right': 'move_right_motor_1',
+    'up': 'move_up_motor_2',
+    'down': 'move_down_motor_2',
+    'left_up': 'move_left_up_motor',
+    'right_up': 'move_right_up_motor',
+    'left_down': 'move_left_down_motor',
+    'right_down': 'move_right_down_motor',
+}
+DETENER = 'stop_movement_motor'
+
+# Segundos sin "jog_presionar" tras los que se detiene el motor.
+HOMBRE_MUERTO_SEGUNDOS = 0.5
+# Intervalo con el que el cliente repite "jog_presionar" mientras mantiene el botón.
+JOG_REPETICION_SEGUNDOS = 0.15
+
+COMANDOS = REGISTRO.counter('rotor_jog_commands_total', 'Motor commands sent by the jog channel, by rotor and command.', ('rotor', 'comando'))
+REPETICIONES = REGISTRO.counter('rotor_jog_coalesced_total', 'Presses of the direction already moving, that did not send a command.', ('rotor',))
+PARADAS = REGISTRO.counter('rotor_jog_stops_total', 'Stops of the jog by reason (soltar, hombre_muerto, desconexion, detener, error).', ('rotor', 'motivo'))
+
+class _JogRotor:
+    """Jog of one rotor: the direction moving, the client that moves it and its deadline."""
+
+    __slots__ = ('lock', 'direccion', 'sid', 'vence', 'vigilando')
+
+    def __init__(self):
+        # Ordena los comandos del rotor: un soltar nunca se envía antes que el presionar anterior.
+        self.lock = threading.Lock()
+        self.direccion = None
+        self.sid = None
+        self.vence = 0.0
+        self.vigilando = False
+
+class JogChannel:
+    """Jogs of the rotors of the host."""
+
+    def __init__(self, rotores, hombre_muerto=HOMBRE_MUERTO_SEGUNDOS):
+        """
+        Args:
+            rotores (RotorRegistry): Controllers of the host.
+            hombre_muerto (float, optional): Seconds without a press after which the motor is stopped.
+        """
+        self._rotores = rotores
+        self.hombre_muerto = hombre_muerto
+        self._lock = threading.Lock()
+        self._jogs = {}
+
+    def _jog(self, rotor_id):
+        with self._lock:
+            return self._jogs.setdefault(rotor_id, _JogRotor())
+
+    def presionar(self, sid, direccion, rotor_id=None):
+        """Moves a rotor in a direction, or keeps it moving if it already is.
+
+        Args:
+            sid (str): Socket.IO session of the client.
+            direccion (str): One of DIRECCIONES.
+            rotor_id (str, optional): Id of the rotor, defaults to the main rotor.
+
+        Returns:
+            The rotor_id of the rotor.
+
+        Raises:
+            KeyError: There is no rotor with that id.
+            ValueError: Unknown direction.
+            RotorNoConectado, PacketError, ReadTimeout: The command could not be sent.
+        """
+        if direccion not in DIRECCIONES:
+            raise ValueError(f'Direccion desconocida: {direccion}')
+        rotor = self._rotores.get(rotor_id)
+        jog = self._jog(rotor.rotor_id)
+        with jog.lock:
+            jog.vence = time.monotonic() + self.hombre_muerto
+            jog.sid = sid
+            if jog.direccion == direccion:
+                REPETICIONES.labels(rotor.rotor_id).inc()
+                return rotor.rotor_id
+            if rotor.siguiendo:
+                rotor.stopTracking()
+            try:
+                rotor.ejecutar(DIRECCIONES[direccion], urgente=True)
+            except Exception:
+                # El motor puede seguir en la dirección anterior.
+                if jog.direccion is not None:
+                    self._detener(rotor, jog, 'error')
+                raise
+            COMANDOS.labels(rotor.rotor_id, DIRECCIONES[direccion]).inc()
+            jog.direccion = direccion
+            if not jog.vigilando:
+                jog.vigilando = True
+                threading.Thread(target=self._vigilar, args=(rotor, jog), name=f'jog-{rotor.rotor_id}', daemon=True).start()
+        return rotor.rotor_id
+
+    def soltar(self, sid, rotor_id=None):
+        """Stops the jog of a rotor, if it is being moved by this client.
+
+        Returns:
+            True if the motor was stopped.
+        """
+        rotor = self._rotores.get(rotor_id)
+        jog = self._jog(rotor.rotor_id)
+        with jog.lock:
+            if jog.direccion is None or jog.sid != sid:
+                return False
+            self._detener(rotor, jog, 'soltar')
+        return True
+
+    def detener(self, rotor_id=None):
+        """Stops the motor of a rotor whoever is moving it, also when it is not being jogged."""
+        rotor = self._rotores.get(rotor_id)
+        jog = self._jog(rotor.rotor_id)
+        with jog.lock:
+            jog.direccion = None
+            jog.sid = None
+            PARADAS.labels(rotor.rotor_id, 'detener').inc()
+            rotor.ejecutar(DETENER, urgente=True)
+            COMANDOS.labels(rotor.rotor_id, DETENER).inc()
+
+    def soltarCliente(self, sid):
+        """Stops every rotor moved by a client that disconnected."""
+        with self._lock:
+            jogs = list(self._jogs.items())
+        for rotor_id, jog in jogs:
+            with jog.lock:
+                if jog.direccion is not None and jog.sid == sid:
+                    self._detener(self._rotores.get(rotor_id), jog, 'desconexion')
+
+    def _detener(self, rotor, jog, motivo):
+        # Se llama con jog.lock tomado.
+        jog.direccion = None
+        jog.sid = None
+        PARADAS.labels(rotor.rotor_id, motivo).inc()
+        try:
+            rotor.ejecutar(DETENER, urgente=True)
+            COMANDOS.labels(rotor.rotor_id, DETENER).inc()
+        except Exception as error:
+            print(f'No se pudo detener el motor del rotor {rotor.rotor_id}: {error}')
+
+    def _vigilar(self, rotor, jog):
+        while True:
+            with jog.lock:
+                if jog.direccion is None:
+                    jog.vigilando = False
+                    return
+                restante = jog.vence - time.monotonic()
+                if restante <= 0:
+                    print(f'Jog del rotor {rotor.rotor_id} sin confirmar en {self.hombre_muerto} s, deteniendo el motor')
+                    self._detener(rotor, jog, 'hombre_muerto')
+                    jog.vigilando = False
+                    return
+            time.sleep(restante)
@@ -1,7 +1,4 @@
-from datetime import datetime
-import threading
 import time
-import rot2ProgInteractor
 
 from gevent import monkey
 monkey.patch_all()
@@ -9,30 +6,51 @@ monkey.patch_all()
 from gevent.pywsgi import WSGIServer
 from geventwebsocket.handler import WebSocketHandler
 
-from flask import Flask, jsonify, request
+from flask import Flask, abort, jsonify, make_response, request
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 
+import numpy as np
+
+from metrics import instrumentarApp
+from predictionRecords import seguimientoDesdeJson
+from rotorRegistry import RotorNoConectado, cargarRegistro
+from rotorJog import JOG_REPETICION_SEGUNDOS, JogChannel
+from rotorTelemetry import TelemetryHub
+from sessionRecorder import MAX_PUNTOS_SERIE, errorApuntamiento, resumenSesion, serieSesion
+from timeUtils import formatearFecha
+from trackHandoff import adjuntarPasada, rutaSocket
+
 app = Flask(__name__)
 CORS(app)
+instrumentarApp(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-rotConnectionStatus = False
+# Cada rotor se conecta en su propio hilo de I/O, ver rotorRegistry.py
+rotores = cargarRegistro()
+# Posición de los rotores para los clientes de Socket.IO, cada uno a su tasa.
+telemetria = TelemetryHub(rotores, socketio.emit)
+# Control manual de los motores, ver rotorJog.py
+jog = JogChannel(rotores)
 
-
-# Loop que revisa la conexión a través del Serial.
-while rotConnectionStatus is False: 
+def rotorDe(rotor_id):
+    """Returns the controller of the registry, answering 404 if it does not exist."""
     try:
-        rot = rot2ProgInteractor.ROT2Prog('/dev/ttyUSB0', baudrate=9600,timeout=10)
-        estado_actual = rot.status()
-        rotConnectionStatus = True
-    except:
-        print("No se pudo conectar con el rotor, intentando de nuevo")
-        time.sleep(5)
-        rotConnectionStatus = False
-
-stop_event = threading.Event()
-status_stop_event = threading.Event()
+        return rotores.get(rotor_id)
+    except (KeyError, StopIteration):
+        abort(make_response(jsonify({'Error': f'No existe el rotor {rotor_id}'}), 404))
+
+def rutaRotor(ruta, methods):
+    """Registers a route both for the main rotor (/ruta) and for any rotor of the registry (/rotor/<rotor_id>/ruta)."""
+    def decorador(funcion):
+        app.add_url_rule(ruta, view_func=funcion, methods=methods, defaults={'rotor_id': None})
+        app.add_url_rule(f'/rotor/<rotor_id>{ruta}', view_func=funcion, methods=methods)
+        return funcion
+    return decorador
+
+@app.errorhandler(RotorNoConectado)
+def handleRotorNoConectado(error):
+    return jsonify({'Error': str(error)}), 503
 
 # Manejo conexión de clientes
 @socketio.on('connect')
@@ -45,86 +63,150 @@ def handle_connection_status():
     print('Cliente conectado')
     emit('connection_status', {'status': 'connected'})
 
-def send_status():
-    """Method that obtains the status of the rotor and sends it to the client every time there is a change.
+@socketio.on('suscribir_estado')
+def handle_suscribir_estado(data=None):
+    """SocketIO Event that subscribes the client to the position of a rotor, see rotorTelemetry.py.
 
+    Parameters:
+    data (dict, optional): {"rotorId", "hz" (defaults to 1), "deadband" in degrees (defaults to 0),
+                           "formato": "json" (event estado_actual, by default) or "binario" (event estado_binario)}.
     Returns:
-    Status of the rotor - The position.
-    """
-    prevAzimuth = None
-    prevElevation = None
-    while not status_stop_event.is_set():
-        estado_actual = rot.status()
-        azimuth = estado_actual[0]
-        elevation = estado_actual[1]
-        if azimuth != prevAzimuth and elevation != prevElevation:
-            print(azimuth, elevation)
-            prevAzimuth = azimuth
-            prevElevation = elevation
-            socketio.emit('estado_actual', {'azimuth': azimuth, 'elevation': elevation})
-            time.sleep(1)
-        else:
-            time.sleep(1)
+    Acknowledgement with the channel of the binary frames and the rate, or the error.
+    """
+    data = data or {}
+    try:
+        suscripcion = telemetria.suscribir(request.sid, data.get('rotorId'), data.get('hz', 1.0),
+                                           data.get('deadband', 0.0), data.get('formato', 'json'))
+    except (KeyError, StopIteration):
+        return {'Error': f'No existe el rotor {data.get("rotorId")}'}
+    except (TypeError, ValueError) as error:
+        return {'Error': f'Parametro invalido: {error}'}
+    return {'rotorId': suscripcion.rotor_id, 'canal': suscripcion.canal, 'hz': 1 / suscripcion.periodo,
+            'deadband': suscripcion.deadband, 'formato': suscripcion.formato}
+
+@socketio.on('cancelar_estado')
+def handle_cancelar_estado(data=None):
+    """SocketIO Event that cancels the subscription of the client to a rotor, or to every rotor without "rotorId"."""
+    try:
+        telemetria.cancelar(request.sid, (data or {}).get('rotorId'))
+    except (KeyError, StopIteration):
+        pass
 
 @socketio.on('get_status')
-def handle_get_status():
-    """SocketIO Event that obtains the status of the rotor and sends it to the client.
+def handle_get_status(data=None):
+    """SocketIO Event that sends the status of the rotor to the client every time it changes, at most once per second.
 
+    Parameters:
+    data (dict, optional): {"rotorId": id of the rotor}, defaults to the main rotor.
     Returns:
     Status of the rotor.
     """
-    status_stop_event.clear()
-    send_status()
+    return handle_suscribir_estado({'rotorId': (data or {}).get('rotorId')})
 
 @socketio.on('stop_status')
-def handle_stop_status():
+def handle_stop_status(data=None):
     """SocketIO Event that stops the continuous status updates."""
-    status_stop_event.set()
+    handle_cancelar_estado(data)
+
+@socketio.on('jog_presionar')
+def handle_jog_presionar(data=None):
+    """SocketIO Event that moves the motors of a rotor while a direction button is pressed, see rotorJog.py.
+
+    The client emits it when the button is pressed and repeats it every JOG_REPETICION_SEGUNDOS while
+    it is held; the motor stops with jog_soltar or HOMBRE_MUERTO_SEGUNDOS after the last one.
+
+    Parameters:
+    data (dict): {"direccion": left, right, up, down, left_up, right_up, left_down or right_down, "rotorId" (optional)}.
+    Returns:
+    Acknowledgement with the rotor, the direction and the dead-man timeout in ms, or the error.
+    """
+    data = data or {}
+    try:
+        rotor_id = jog.presionar(request.sid, data.get('direccion'), data.get('rotorId'))
+    except (KeyError, StopIteration):
+        return {'Error': f'No existe el rotor {data.get("rotorId")}'}
+    except ValueError as error:
+        return {'Error': str(error)}
+    except Exception as error:
+        return {'Error': f'No se pudo mover el rotor: {error}'}
+    return {'rotorId': rotor_id, 'direccion': data.get('direccion'), 'hombre_muerto_ms': round(jog.hombre_muerto * 1000),
+            'repeticion_ms': round(JOG_REPETICION_SEGUNDOS * 1000)}
+
+@socketio.on('jog_soltar')
+def handle_jog_soltar(data=None):
+    """SocketIO Event that stops the motors of a rotor when the direction button is released.
+
+    Parameters:
+    data (dict, optional): {"rotorId"}, defaults to the main rotor.
+    Returns:
+    Acknowledgement with "detenido", False if the rotor was not being moved by this client.
+    """
+    try:
+        return {'detenido': jog.soltar(request.sid, (data or {}).get('rotorId'))}
+    except (KeyError, StopIteration):
+        return {'Error': f'No existe el rotor {(data or {}).get("rotorId")}'}
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    jog.soltarCliente(request.sid)
+    telemetria.cancelar(request.sid)
+
+@app.route('/rotores', methods=['GET'])
+def getRotores():
+    """API Call that lists the rotors of the registry.
+
+    Returns:
+    JSON with the id, serial port and connection status of every rotor.
+    """
+    return jsonify({'rotores': [
+        {'id': rotor.rotor_id, 'port': rotor.port, 'conectado': rotor.conectado, 'siguiendo': rotor.tracking_thread is not None and rotor.tracking_thread.is_alive()}
+        for rotor in rotores
+    ]})
    
-@app.route('/limits', methods=['GET'])
-def getLimits():
+@rutaRotor('/limits', methods=['GET'])
+def getLimits(rotor_id):
     """API Call that obtains the limits of the rotor.
 
     Returns:
         JSON with the limits of the rotor.
     """
-    limits_rot = rot.get_limits()
+    limits_rot = rotorDe(rotor_id).ejecutar('get_limits')
     return jsonify({'limite': limits_rot})
 
-@app.route('/pulses', methods=['GET'])
-def getPulsesPerDegree():
+@rutaRotor('/pulses', methods=['GET'])
+def getPulsesPerDegree(rotor_id):
     """API Call that obtains the pulses per degree of the rotor.
     
     Returns:
     JSON with the pulses per degree of the rotor.
     """
-    pulses_per_degree = rot.get_pulses_per_degree()
+    pulses_per_degree = rotorDe(rotor_id).ejecutar('get_pulses_per_degree')
     return jsonify({'pulsos_por_grado': pulses_per_degree})
 
-@app.route('/status', methods=['GET'])
-def getStatus():
+@rutaRotor('/status', methods=['GET'])
+def getStatus(rotor_id):
     """API Call that obtains the status of the rotor.
 
     Returns:
     JSON with the status of the rotor.
     """
-    estado_actual = rot.status()
+    estado_actual = rotorDe(rotor_id).ejecutar('status')
     azimuth = estado_actual[0]
     elevation = estado_actual[1]
     return jsonify({'azimuth': azimuth, 'elevation': elevation})
 
-@app.route('/stop', methods=['GET'])
-def getStop():
+@rutaRotor('/stop', methods=['GET'])
+def getStop(rotor_id):
     """API call that stops the rotor.
 
     Returns:
     JSON with the status of the rotor.
     """
-    rot.stop()
+    rotorDe(rotor_id).ejecutar('stop')
     return jsonify({'status': 'stop'})
 
-@app.route('/moveToPosition', methods=['POST'])
-def setPosition():
+@rutaRotor('/moveToPosition', methods=['POST'])
+def setPosition(rotor_id):
     """API call that sets the position of the rotor.
     
     Parameters:
@@ -135,101 +217,26 @@ def setPosition():
     """
     post_position_data = request.get_json()
     print(post_position_data)
-    rot.set(post_position_data['data']['azimuth'], post_position_data['data']['elevation'])
+    rotorDe(rotor_id).ejecutar('set', post_position_data['data']['azimuth'], post_position_data['data']['elevation'])
     return jsonify({'azimuth': post_position_data['data']['azimuth'], 'elevation': post_position_data['data']['azimuth']})
 
-@app.route('/moveLeft', methods=['GET'])
-def moveRotorLeft():
-    """API call that moves the rotor left.
-
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_left_motor_1()
-    return jsonify({'status': 'Moving Left'})
-
-@app.route('/moveRight', methods=['GET'])
-def moveRotorRight():
-    """API call that moves the rotor right.
-
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_right_motor_1()
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveUp', methods=['GET'])
-def moveRotorUp():
-    """API call that moves the rotor up.
-
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_up_motor_2
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveDown', methods=['GET'])
-def moveRotorDown():
-    """API call that moves the rotor down.
-
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_down_motor_2()
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveLeftUp', methods=['GET'])
-def moveRotorLeftUp():
-    """API call that moves the rotor left and up.
-    
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_left_up_motor()
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveRightUp', methods=['GET'])
-def moveRotorRightUp():
-    """API call that moves the rotor right and up.
-    
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_right_up_motor()
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveLeftDown', methods=['GET'])
-def moveRotorLeftDown():
-    """API call that moves the rotor left and down.
-    
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_left_down_motor()
-    return jsonify({'status': 'Moving '})
-
-@app.route('/moveRightDown', methods=['GET'])
-def moveRotorRightDown():
-    """API call that moves the rotor right and down.
-    
-    Returns:
-    JSON with the status of the rotor.
-    """
-    rot.move_right_down_motor()
-    return jsonify({'status': 'Moving '})
+@rutaRotor('/stopMovementRotor', methods=['GET'])
+def stopMovementRotor(rotor_id):
+    """API call that stops the rotor motor movement, also the jog of any client.
 
-@app.route('/stopMovementRotor', methods=['GET'])
-def stopMovementRotor():
-    """API call that stops the rotor motor movement.
+    The manual movement of the motors is made through the jog channel of Socket.IO, see handle_jog_presionar.
     
     Returns:
     JSON with the status of the rotor.
     """
-    rot.stop_Movement_motor()
+    try:
+        jog.detener(rotor_id)
+    except (KeyError, StopIteration):
+        abort(make_response(jsonify({'Error': f'No existe el rotor {rotor_id}'}), 404))
     return jsonify({'status': 'Stoping Movement of Rotor '})
 
-@app.route('/setPowerMotor', methods=['POST'])
-def setPowerMotor():
+@rutaRotor('/setPowerMotor', methods=['POST'])
+def setPowerMotor(rotor_id):
     """API call that sets the power of the motor in percetage.
     
     Returns:
@@ -237,57 +244,94 @@ def setPowerMotor():
     """
     powerInput = request.get_json()
     print(f'{powerInput}')
-    rot.set_power_motor(powerInput)
+    rotorDe(rotor_id).ejecutar('set_power_motor', powerInput)
     return jsonify({'status': 'Setting Power of Motor'})
 
-@app.route('/cleanSettings', methods=['GET'])
-def getCleanAllSettings():
+@rutaRotor('/cleanSettings', methods=['GET'])
+def getCleanAllSettings(rotor_id):
     """API Call that clean all settings of the rotor.
 
     Returns:
     JSON with the status of the rotor.
     """
-    rot.clean_all_settings()
+    rotorDe(rotor_id).ejecutar('clean_all_settings')
     return jsonify({'status': 'Cleaning all settings'})
 
-def track_prediction_task(prediction_data):
+def seguirPuntos(rotor, puntos):
+    """
+    Method that moves the Antena through a series of points as their time comes.
+
+    Parameters:
+    rotor: Controller of the antenna.
+    puntos: PUNTO_SEGUIMIENTO array sorted by time, see predictionRecords.
+    Returns:
+    True if the series was completed, False if the tracking was stopped.
+    """
+    stop_event = rotor.stop_event
+    tiempos = puntos['t']
+    siguiente = 0
+    while siguiente < len(puntos):
+        # Solo se envía el último punto cuyo tiempo ya llegó, los anteriores quedaron atrás.
+        vencidos = int(np.searchsorted(tiempos, time.time(), side='right'))
+        if vencidos > siguiente:
+            az = round(float(puntos['az'][vencidos - 1]), 1)
+            el = round(float(puntos['el'][vencidos - 1]), 1)
+            print(f"Ejecutando rot.set() en {rotor.rotor_id} con az={az} y el={el}")
+            rotor.ejecutar('set', az, el)
+            siguiente = vencidos
+        if siguiente < len(puntos):
+            # Se espera hasta el tiempo del siguiente punto, revisando la detención al menos cada segundo.
+            stop_event.wait(min(1.0, max(0.0, tiempos[siguiente] - time.time())))
+        if stop_event.is_set():
+            print('Se detuvo el seguimiento')
+            return False
+    return True
+
+def track_prediction_task(rotor, prediction_data, descripcion=None, tarea='track_prediction_task'):
     """
     Method that moves the Antena to the position given in the prediction.
     
-    Parameters(Given via request.get_json): 
-    jsonFile: JSON file with the prediction. 
+    Parameters: 
+    rotor: Controller of the antenna that follows the prediction.
+    prediction_data: PUNTO_SEGUIMIENTO array with the points of the pass.
+    descripcion: prediccion_id, norad_cat_id and satelite of the pass for the archive, when they are known.
+    tarea: Name of the task in the archive.
     Returns:
     None: Moves the Antena to the position given the time.
     """
     print('Empezando Tracking')
-    rot.set(prediction_data[0]['az'], prediction_data[0]['el'])
-    while prediction_data:
-        current_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
-        
-        for data in prediction_data[:]:  
-            prediction_time = data['Tiempo_Cordenada']
-            if current_time >= prediction_time:
-                az = data['az']
-                el = data['el']
-                print(f"Ejecutando rot.set() con az={az} y el={el}")
-                rot.set(az, el)
-
-                # Eliminar el dato procesado
-                prediction_data.remove(data)
-            if stop_event.is_set():
-                print('Se detuvo el seguimiento')
-                return
-        time.sleep(1)
-    
-    print('Se concluyo el seguimiento')
+    if len(prediction_data) == 0:
+        return
+    with rotor.archivarSeguimiento(tarea, prediction_data, **(descripcion or {})):
+        rotor.ejecutar('set', round(float(prediction_data['az'][0]), 1), round(float(prediction_data['el'][0]), 1))
+        if seguirPuntos(rotor, prediction_data):
+            print('Se concluyo el seguimiento')
+
+def track_shared_prediction_task(rotor, pasada):
+    """
+    Method that moves the Antena through a pass attached from the prediction service, see trackHandoff.py.
+
+    Parameters:
+    rotor: Controller of the antenna that follows the prediction.
+    pasada: PasadaCompartida with the points of the pass, detached when the tracking ends.
+    """
+    try:
+        descripcion = {campo: pasada.descripcion[campo] for campo in ('prediccion_id', 'norad_cat_id', 'satelite')}
+        track_prediction_task(rotor, pasada.puntos, descripcion, tarea='track_shared_prediction_task')
+    finally:
+        pasada.cerrar()
 
-@app.route('/trackPrediction', methods=['POST'])
-def trackPrediction():
+@rutaRotor('/trackPrediction', methods=['POST'])
+def trackPrediction(rotor_id):
     """
     API call that start the tracking process using the given prediction.
     
     Parameters(Given via request.get_json): 
     jsonFile: JSON file with the prediction. 
+    prediccionId, noradCatId, satelite (optional): Prediction of /pasadaSatelite and satellite of the pass, for the archive.
+                                                   Also read from "Prediccion_ID", "Satelite_Norad_Cat_ID" and "Satelite" of the prediction.
+    Without "postDataPred", the pass "numeroPasada" (1 by default) of the prediction "prediccionId" is attached
+    from the prediction service of the host through shared memory, without sending the points.
     Returns:
     JSON with the status of the rotor.
     """
@@ -295,44 +339,66 @@ def trackPrediction():
     post_prediction_sat_data = request.get_json()
 
     prediction_sat_data = post_prediction_sat_data.get('postDataPred')
+    if prediction_sat_data is None:
+        return trackPasadaCompartida(rotor_id, post_prediction_sat_data)
     
-    prediction_data = prediction_sat_data.get('Pasadas_predecidas')
+    prediction_data = seguimientoDesdeJson(prediction_sat_data.get('Pasadas_predecidas'))
+    descripcion = {
+        'prediccion_id': post_prediction_sat_data.get('prediccionId', prediction_sat_data.get('Prediccion_ID')),
+        'norad_cat_id': post_prediction_sat_data.get('noradCatId', prediction_sat_data.get('Satelite_Norad_Cat_ID')),
+        'satelite': post_prediction_sat_data.get('satelite', prediction_sat_data.get('Satelite')),
+    }
 
-    stop_event.clear()
-    tracking_thread = threading.Thread(target=track_prediction_task, args=(prediction_data,))
-    tracking_thread.start()
+    rotorDe(rotor_id).startTracking(track_prediction_task, prediction_data, descripcion)
 
     return jsonify({'status': 'Tracking started'})
 
-def track_celestial_object_task(prediction_cel_obj_data):
+def trackPasadaCompartida(rotor_id, post_data):
+    """Starts the tracking of a pass attached from the prediction service, see trackPrediction."""
+    rotor = rotorDe(rotor_id)
+    prediccion_id = post_data.get('prediccionId')
+    if not prediccion_id:
+        return jsonify({'Error': 'Se necesita postDataPred o prediccionId'}), 400
+    if rotores.archivo is None:
+        return jsonify({'Error': 'El archivo de predicciones esta desactivado'}), 503
+    try:
+        numero_pasada = int(post_data.get('numeroPasada', 1))
+        pasada = adjuntarPasada(rutaSocket(rotores.archivo), prediccion_id, numero_pasada)
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+    except KeyError as error:
+        return jsonify({'Error': error.args[0]}), 404
+    except OSError as error:
+        return jsonify({'Error': f'No se pudo conectar con el servicio de predicciones: {error}'}), 503
+
+    # La tarea cierra la pasada al terminar, puede ser antes de responder.
+    respuesta = {'status': 'Tracking started', 'puntos': len(pasada.puntos), 'Tiempo_Inicio': formatearFecha(pasada.descripcion['aos'])}
+    try:
+        rotor.startTracking(track_shared_prediction_task, pasada)
+    except Exception:
+        # Sin tarea no hay quien cierre la pasada.
+        pasada.cerrar()
+        raise
+
+    return jsonify(respuesta)
+
+def track_celestial_object_task(rotor, prediction_cel_obj_data):
     """
     Method that moves the Antena to the position given in the prediction.
     
-    Parameters(Given via request.get_json): 
-    jsonFile: JSON file with the prediction. 
+    Parameters: 
+    rotor: Controller of the antenna that follows the prediction.
+    prediction_cel_obj_data: PUNTO_SEGUIMIENTO array with the points of the celestial object.
     Returns:
     None: Moves the Antena to the position given the time.
     """
     print('Empezando Tracking')
-    print(prediction_cel_obj_data)
-    while prediction_cel_obj_data:
-        current_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
-        for data in prediction_cel_obj_data[:]:
-            prediction_time = data['Tiempo_Cordenada']
-            if current_time >= prediction_time:
-                az = data['az']
-                el = data['el']
-                print(f"Ejecutando rot.set() con az={az} y el={el}")
-                rot.set(az, el)
-                prediction_cel_obj_data.remove(data)
-            if stop_event.is_set():
-                print('Se detuvo el seguimiento')
-                return
-        time.sleep(1)
-    print('Se concluyo el seguimiento')
-
-@app.route('/trackCelestialObject', methods=['POST'])
-def trackCelestialObject():
+    with rotor.archivarSeguimiento('track_celestial_object_task', prediction_cel_obj_data):
+        if seguirPuntos(rotor, prediction_cel_obj_data):
+            print('Se concluyo el seguimiento')
+
+@rutaRotor('/trackCelestialObject', methods=['POST'])
+def trackCelestialObject(rotor_id):
     """
     API call that starts the tracking process using the given prediction.
     
@@ -341,26 +407,107 @@ def trackCelestialObject():
     Returns:
     JSON with the status of the rotor.
     """
-    global stop_event
     print('Empezando Tracking')
     post_prediction_sat_data = request.get_json()
 
     print(post_prediction_sat_data)
 
-    prediction_cel_obj_data = post_prediction_sat_data.get('trackPredictionCelestial')
+    prediction_cel_obj_data = seguimientoDesdeJson(post_prediction_sat_data.get('trackPredictionCelestial'))
 
-    print(prediction_cel_obj_data)
+    print(f'Recibidos {len(prediction_cel_obj_data)} puntos para el seguimiento')
 
-    stop_event.clear()
-    tracking_thread = threading.Thread(target=track_celestial_object_task, args=(prediction_cel_obj_data,))
-    tracking_thread.start()
+    rotorDe(rotor_id).startTracking(track_celestial_object_task, prediction_cel_obj_data)
     return jsonify({'status': 'Tracking started'})
 
-@app.route('/stopTracking', methods=['get'])
-def stopTracking():
-    stop_event.set()
+def track_schedule_task(rotor, plan):
+    """
+    Method that tracks the passes of an observation plan one after the other.
+
+    Parameters:
+    rotor: Controller of the antenna that follows the plan.
+    plan: List of (nombre, norad_cat_id, Tiempo_Inicio, PUNTO_SEGUIMIENTO array) of the passes made by /planificarObservaciones.
+    Returns:
+    None: Moves the Antena to each pass, pointing to its first position as soon as the previous one ends.
+    """
+    for nombre, norad_cat_id, inicio, puntos in plan:
+        if rotor.stop_event.is_set():
+            break
+        print(f"Siguiente pasada del plan: {nombre} a las {inicio}")
+        track_prediction_task(rotor, puntos, {'norad_cat_id': norad_cat_id, 'satelite': nombre}, 'track_schedule_task')
+    print('Se concluyo el plan de observaciones')
+
+@rutaRotor('/trackSchedule', methods=['POST'])
+def trackSchedule(rotor_id):
+    """
+    API call that starts tracking an observation plan.
+
+    Parameters(Given via request.get_json):
+    plan: List of passes made by /planificarObservaciones, including "Pasadas_predecidas".
+    Returns:
+    JSON with the status of the rotor.
+    """
+    post_data = request.get_json(silent=True)
+    plan = post_data.get('plan') if isinstance(post_data, dict) else None
+    if not isinstance(plan, list) or not all(isinstance(pasada, dict) for pasada in plan):
+        return jsonify({'Error': 'Se necesita plan, una lista de pasadas'}), 400
+    try:
+        plan = [(pasada.get('nombre'), pasada.get('norad_cat_id'), pasada.get('Tiempo_Inicio'), seguimientoDesdeJson(pasada['Pasadas_predecidas']))
+                for pasada in plan if pasada.get('Pasadas_predecidas')]
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+
+    rotorDe(rotor_id).startTracking(track_schedule_task, plan)
+    return jsonify({'status': 'Tracking started', 'pasadas': len(plan)})
+
+@rutaRotor('/stopTracking', methods=['GET'])
+def stopTracking(rotor_id):
+    rotorDe(rotor_id).stopTracking()
     return jsonify({'status': 'Tracking stopped'})
 
+def sesionDe(sesion_id):
+    """Returns (cabecera, registros, activa) of a recorded session, answering 404 if it does not exist."""
+    try:
+        return rotores.grabadora.leer(sesion_id)
+    except KeyError:
+        abort(make_response(jsonify({'Error': f'No existe la sesion {sesion_id}'}), 404))
+
+@app.route('/sesiones', methods=['GET'])
+def getSesiones():
+    """API Call that lists the recorded tracking sessions, the most recent first.
+
+    Query parameters:
+    rotor: Only the sessions of this rotor.
+    Returns:
+    JSON with the id, rotor, task, start and number of records of every session.
+    """
+    return jsonify({'Sesiones': rotores.grabadora.listar(request.args.get('rotor'))})
+
+@app.route('/sesiones/<sesion_id>', methods=['GET'])
+def getSesion(sesion_id):
+    """API Call that returns the setpoints and readings of a session.
+
+    Query parameters:
+    max_puntos: Maximum points of each series, defaults to 1000.
+    Returns:
+    JSON with the summary of the session and the "Consignas" and "Lecturas" series as Epoch, az and el columns.
+    """
+    try:
+        max_puntos = max(2, int(request.args.get('max_puntos', MAX_PUNTOS_SERIE)))
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+    cabecera, registros, activa = sesionDe(sesion_id)
+    return jsonify({'Sesion': resumenSesion(cabecera, len(registros), activa), **serieSesion(cabecera, registros, max_puntos)})
+
+@app.route('/sesiones/<sesion_id>/error', methods=['GET'])
+def getErrorSesion(sesion_id):
+    """API Call that computes the pointing error of a session, each reading against the last setpoint before it.
+
+    Returns:
+    JSON with the mean, rms, p50, p95 and max of the az, el and total errors in degrees.
+    """
+    cabecera, registros, activa = sesionDe(sesion_id)
+    return jsonify({'Sesion': resumenSesion(cabecera, len(registros), activa), 'Error_apuntamiento': errorApuntamiento(registros)})
+
 if __name__ == '__main__':
     http_server = WSGIServer(('192.168.1.18', 5019), app, handler_class=WebSocketHandler)
     http_server.serve_forever()
@@ -0,0 +1,261 @@
+"""Registry of the ROT2Prog controllers connected to this host.
+
+Every controller has its own I/O thread that owns the serial port, so the commands of one antenna
+never wait behind the serial traffic of another one. The tracking session and its stop event are
+also kept per controller.
+
+The controllers are configured in config.json under "rotores"; without it a single controller
+"principal" is used on /dev/ttyUSB0:
+
+    "rotores": {
+        "principal": {"port": "/dev/ttyUSB0", "baudrate": 9600, "timeout": 10}
+    }
+
+Every tracking session is recorded in the directory "sesiones" of config.json (sesiones/ by
+default), see sessionRecorder.py, and the passes tracked are listed in the archive of the
+predictions, in the directory "archivo" of config.json (archivo/ by default, none if it is null),
+see predictionArchive.py.
+"""
+import contextlib
+import itertools
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+import rot2ProgInteractor
+from metrics import BUCKETS_GRADOS, REGISTRO
+from predictionArchive import archivoDeConfig
+from sessionRecorder import CONSIGNA, DIRECTORIO_SESIONES, LECTURA, SessionRecorder
+
+ROTOR_PRINCIPAL = 'principal'
+# Segundos entre intentos de conexión con el controlador.
+ESPERA_RECONEXION = 5
+# Prioridad de los comandos en la cola del hilo de I/O, los urgentes pasan antes que los normales ya encolados.
+PRIORIDAD_URGENTE = 0
+PRIORIDAD_NORMAL = 1
+
+SERIAL_LATENCIA = REGISTRO.histogram('rotor_serial_roundtrip_seconds', 'Round-trip time of the commands sent to the controller through the serial port.', ('rotor', 'comando'))
+SERIAL_ERRORES = REGISTRO.counter('rotor_serial_errors_total', 'Commands of the controller that failed, by exception (PacketError, ReadTimeout...).', ('rotor', 'comando', 'error'))
+ERROR_APUNTAMIENTO = REGISTRO.gauge('rotor_pointing_error_degrees', 'Difference between the last position commanded by the tracking and the last position read, by axis.', ('rotor', 'eje'))
+ERROR_APUNTAMIENTO_HISTOGRAMA = REGISTRO.histogram('rotor_pointing_error_total_degrees', 'Largest axis error of every position read while tracking.', ('rotor',), BUCKETS_GRADOS)
+
+class RotorNoConectado(Exception):
+
+    """The controller has not been connected through the serial port yet.
+    """
+
+    pass
+
+class RotorController:
+    """One ROT2Prog controller with its I/O thread, tracking session and stop event."""
+
+    def __init__(self, rotor_id, port, baudrate=9600, timeout=10, grabadora=None, archivo=None):
+        """Creates the controller and starts the thread that connects to it.
+
+        Args:
+            rotor_id (str): Id of the controller in the registry.
+            port (str): Serial port of the controller.
+            baudrate (int, optional): Baudrate of the serial port.
+            timeout (int, optional): Maximum response time from the controller.
+            grabadora (SessionRecorder, optional): Where the tracking sessions are recorded, none by default.
+            archivo (PredictionArchive, optional): Where the tracked passes are listed, none by default.
+        """
+        self.rotor_id = rotor_id
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.grabadora = grabadora
+        self.archivo = archivo
+        # Sesión que se está grabando, solo mientras corre un seguimiento.
+        self.grabacion = None
+        self.rot = None
+        self.stop_event = threading.Event()
+        self.tracking_thread = None
+        # Última posición enviada con set, para medir el error de apuntamiento.
+        self.objetivo = None
+        self._comandos = queue.PriorityQueue()
+        self._secuencia = itertools.count()
+        self._conectado = threading.Event()
+        self._io_thread = threading.Thread(target=self._ioLoop, name=f'rotor-{rotor_id}', daemon=True)
+        self._io_thread.start()
+
+    @property
+    def conectado(self):
+        return self._conectado.is_set()
+
+    def _conectar(self):
+        # Loop que revisa la conexión a través del Serial.
+        while self.rot is None:
+            try:
+                self.rot = rot2ProgInteractor.ROT2Prog(self.port, baudrate=self.baudrate, timeout=self.timeout)
+                self.rot.status()
+            except Exception:
+                print(f"No se pudo conectar con el rotor {self.rotor_id}, intentando de nuevo")
+                self.rot = None
+                time.sleep(ESPERA_RECONEXION)
+        self._conectado.set()
+
+    @property
+    def siguiendo(self):
+        return self.tracking_thread is not None and self.tracking_thread.is_alive() and not self.stop_event.is_set()
+
+    def _ioLoop(self):
+        self._conectar()
+        while True:
+            _, _, metodo, args, resultado = self._comandos.get()
+            inicio = time.perf_counter()
+            try:
+                resultado['valor'] = getattr(self.rot, metodo)(*args)
+            except Exception as error:
+                SERIAL_ERRORES.labels(self.rotor_id, metodo, type(error).__name__).inc()
+                resultado['error'] = error
+            else:
+                SERIAL_LATENCIA.labels(self.rotor_id, metodo).observe(time.perf_counter() - inicio)
+                grabacion = self.grabacion
+                if metodo == 'set':
+                    self.objetivo = args
+                    if grabacion is not None:
+                        grabacion.registrar(CONSIGNA, args[0], args[1])
+                elif metodo == 'status':
+                    if grabacion is not None:
+                        grabacion.registrar(LECTURA, resultado['valor'][0], resultado['valor'][1])
+                    self._medirApuntamiento(resultado['valor'])
+            resultado['listo'].set()
+
+    def _medirApuntamiento(self, posicion):
+        if self.objetivo is None or not self.siguiendo:
+            return
+        error_az = abs(posicion[0] - self.objetivo[0])
+        error_el = abs(posicion[1] - self.objetivo[1])
+        ERROR_APUNTAMIENTO.labels(self.rotor_id, 'az').set(error_az)
+        ERROR_APUNTAMIENTO.labels(self.rotor_id, 'el').set(error_el)
+        ERROR_APUNTAMIENTO_HISTOGRAMA.labels(self.rotor_id).observe(max(error_az, error_el))
+
+    def ejecutar(self, metodo, *args, urgente=False):
+        """Runs a method of ROT2Prog in the I/O thread of the controller and waits for its result.
+
+        Args:
+            metodo (str): Name of the ROT2Prog method.
+            *args: Arguments of the method.
+            urgente (bool, optional): Runs before the commands already queued that are not urgent,
+                                      such as the status readings of the telemetry.
+
+        Returns:
+            The value returned by the method.
+
+        Raises:
+            RotorNoConectado: The controller is not connected yet.
+            Any exception raised by the method, such as PacketError, ReadTimeout or ValueError.
+        """
+        if not self._conectado.is_set():
+            raise RotorNoConectado(f'El rotor {self.rotor_id} no esta conectado')
+        resultado = {'listo': threading.Event()}
+        prioridad = PRIORIDAD_URGENTE if urgente else PRIORIDAD_NORMAL
+        self._comandos.put((prioridad, next(self._secuencia), metodo, args, resultado))
+        resultado['listo'].wait()
+        if 'error' in resultado:
+            raise resultado['error']
+        return resultado.get('valor')
+
+    def startTracking(self, target, *args):
+        """Stops the current tracking session of the controller and starts a new one.
+
+        Args:
+            target (callable): Tracking task, called with this controller followed by *args.
+        """
+        self.stopTracking()
+        if self.tracking_thread is not None:
+            self.tracking_thread.join()
+        self.stop_event.clear()
+        self.objetivo = None
+        self.tracking_thread = threading.Thread(target=self._seguir, args=(target, args))
+        self.tracking_thread.start()
+
+    def _seguir(self, target, args):
+        grabacion = self.grabadora.iniciar(self.rotor_id, target.__name__) if self.grabadora is not None else None
+        self.grabacion = grabacion
+        try:
+            target(self, *args)
+        finally:
+            self.grabacion = None
+            if grabacion is not None:
+                self.grabadora.terminar(grabacion)
+
+    def stopTracking(self):
+        """Signals the tracking session of the controller to stop."""
+        self.stop_event.set()
+
+    @contextlib.contextmanager
+    def archivarSeguimiento(self, tarea, puntos, **descripcion):
+        """Lists in the archive the pass tracked while the block runs, if the controller has an archive.
+
+        Args:
+            tarea (str): Name of the tracking task.
+            puntos (ndarray): PUNTO_SEGUIMIENTO array being tracked, for its AOS, LOS and maximum elevation.
+            **descripcion: prediccion_id, norad_cat_id and satelite, when they are known.
+        """
+        seguimiento_id = None
+        if self.archivo is not None:
+            if len(puntos):
+                descripcion.update(aos=float(puntos['t'][0]), los=float(puntos['t'][-1]), elevacion_maxima=float(puntos['el'].max()))
+            grabacion = self.grabacion
+            try:
+                seguimiento_id = self.archivo.iniciarSeguimiento(self.rotor_id, tarea, grabacion.cabecera['sesion_id'] if grabacion is not None else None,
+                                                                 **descripcion)
+            except sqlite3.Error as error:
+                print(f'No se pudo archivar el seguimiento de {self.rotor_id}: {error}')
+        completado = False
+        try:
+            yield
+            completado = not self.stop_event.is_set()
+        finally:
+            if seguimiento_id is not None:
+                try:
+                    self.archivo.terminarSeguimiento(seguimiento_id, completado)
+                except sqlite3.Error as error:
+                    print(f'No se pudo archivar el fin del seguimiento de {self.rotor_id}: {error}')
+
+class RotorRegistry:
+    """Controllers of the host by id, the SessionRecorder of their tracking sessions and the PredictionArchive of their tracked passes."""
+
+    def __init__(self, grabadora=None, archivo=None):
+        self._rotores = {}
+        self.grabadora = grabadora
+        self.archivo = archivo
+
+    def registrar(self, controller):
+        """Adds a controller to the registry, replacing the one with the same id."""
+        self._rotores[controller.rotor_id] = controller
+
+    def get(self, rotor_id=None):
+        """Returns the controller with the given id, or the main controller when the id is None.
+
+        Raises:
+            KeyError: There is no controller with that id.
+        """
+        if rotor_id is None:
+            rotor_id = ROTOR_PRINCIPAL if ROTOR_PRINCIPAL in self._rotores else next(iter(self._rotores))
+        return self._rotores[rotor_id]
+
+    def ids(self):
+        return list(self._rotores)
+
+    def __iter__(self):
+        return iter(self._rotores.values())
+
+def cargarRegistro(config_path='config.json'):
+    """Creates the registry with the controllers of config.json and starts connecting to them."""
+    try:
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+    except FileNotFoundError:
+        config = {}
+
+    rotores = config.get('rotores') or {ROTOR_PRINCIPAL: {'port': '/dev/ttyUSB0', 'baudrate': 9600, 'timeout': 10}}
+    registro = RotorRegistry(SessionRecorder(config.get('sesiones') or DIRECTORIO_SESIONES), archivoDeConfig(config))
+    for rotor_id, rotor in rotores.items():
+        registro.registrar(RotorController(rotor_id, rotor['port'], rotor.get('baudrate', 9600), rotor.get('timeout', 10),
+                                           registro.grabadora, registro.archivo))
+    return registro
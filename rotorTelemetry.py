@@ -0,0 +1,197 @@
+"""Telemetry of the rotor positions over Socket.IO, at the rate each client asks for.
+
+Every client subscribes to a rotor with its own rate (10 Hz for the operator console, 0.2 Hz for a
+wall display...), deadband and format. One poller per rotor reads the status at the fastest rate
+among its subscribers, and stops when the last one leaves, so the serial traffic and the server
+CPU follow what the clients need instead of the number of clients.
+
+A frame is sent to a subscriber when its period has passed and either axis moved more than its
+deadband since the last frame it received, or after KEEPALIVE_SEGUNDOS without frames.
+
+Formats:
+    json     Event "estado_actual" with {"azimuth", "elevation", "rotorId"}, as before.
+    binario  Event "estado_binario" with one frame of bytes, little endian:
+             clave  (14 bytes): tipo 0 (B), canal (B), epoch (d), az y el en décimas de grado (h, h)
+             delta  (6 bytes):  tipo 1 (B), canal (B), ms desde el cuadro anterior (H), variación de az y el en décimas (b, b)
+             The channel is returned when subscribing. A key frame is sent first, when the change
+             does not fit in a delta frame, and every CADA_CUADRO_CLAVE frames.
+"""
+import struct
+import threading
+import time
+
+from metrics import REGISTRO
+
+JSON = 'json'
+BINARIO = 'binario'
+FORMATOS = (JSON, BINARIO)
+
+MAX_HZ = 10.0
+MIN_HZ = 0.01
+# Segundos sin cuadros tras los que se envía la posición aunque no haya cambiado.
+KEEPALIVE_SEGUNDOS = 10.0
+CADA_CUADRO_CLAVE = 100
+# Segundos de espera tras un error al leer el estado del rotor.
+ESPERA_ERROR = 1.0
+
+TIPO_CLAVE = 0
+TIPO_DELTA = 1
+CUADRO_CLAVE = struct.Struct('<BBdhh')
+CUADRO_DELTA = struct.Struct('<BBHbb')
+
+CUADROS = REGISTRO.counter('rotor_telemetry_frames_total', 'Telemetry frames sent to the clients by format.', ('formato',))
+LECTURAS = REGISTRO.counter('rotor_telemetry_polls_total', 'Status readings made for the telemetry by rotor.', ('rotor',))
+
+class Suscripcion:
+    """Subscription of one client to the telemetry of one rotor, with the state of the last frame sent to it."""
+
+    __slots__ = ('sid', 'rotor_id', 'canal', 'periodo', 'deadband', 'formato', 'proximo', 'ultimo', 'desde_clave')
+
+    def __init__(self, sid, rotor_id, canal, periodo, deadband, formato):
+        self.sid = sid
+        self.rotor_id = rotor_id
+        self.canal = canal
+        self.periodo = periodo
+        self.deadband = deadband
+        self.formato = formato
+        self.proximo = 0.0
+        # (monotónico, az en décimas, el en décimas) del último cuadro enviado.
+        self.ultimo = None
+        self.desde_clave = 0
+
+    def cuadro(self, ahora, epoch, az, el):
+        """Returns the frame to send for a reading, or None if this subscriber does not get one now.
+
+        Args:
+            ahora (float): time.monotonic of the reading.
+            epoch (float): UNIX epoch of the reading.
+            az, el (float): Position read.
+        """
+        # Se acepta hasta medio periodo antes: la lectura del estado varía y el sondeo no llega justo a tiempo.
+        if ahora < self.proximo - self.periodo / 2:
+            return None
+        az10 = round(az * 10)
+        el10 = round(el * 10)
+        ultimo = self.ultimo
+        if ultimo is not None:
+            cambio = max(abs(az10 - ultimo[1]), abs(el10 - ultimo[2])) / 10
+            if cambio <= self.deadband and ahora - ultimo[0] < KEEPALIVE_SEGUNDOS:
+                return None
+        # El siguiente cuadro se programa desde el anterior, sin acumular el retraso de cada lectura,
+        # salvo tras una pausa (deadband, primer cuadro), que se programa desde este.
+        if ahora - self.proximo < self.periodo:
+            self.proximo += self.periodo
+        else:
+            self.proximo = ahora + self.periodo
+        self.ultimo = (ahora, az10, el10)
+        if self.formato == JSON:
+            return {'azimuth': az, 'elevation': el, 'rotorId': self.rotor_id}
+
+        if ultimo is not None and self.desde_clave < CADA_CUADRO_CLAVE:
+            ms = round((ahora - ultimo[0]) * 1000)
+            daz = az10 - ultimo[1]
+            de = el10 - ultimo[2]
+            if ms <= 0xFFFF and -128 <= daz <= 127 and -128 <= de <= 127:
+                self.desde_clave += 1
+                return CUADRO_DELTA.pack(TIPO_DELTA, self.canal, ms, daz, de)
+        self.desde_clave = 0
+        return CUADRO_CLAVE.pack(TIPO_CLAVE, self.canal, epoch, az10, el10)
+
+class TelemetryHub:
+    """Subscriptions of the Socket.IO clients and the pollers of the rotors they follow."""
+
+    def __init__(self, rotores, emitir):
+        """
+        Args:
+            rotores (RotorRegistry): Controllers of the host.
+            emitir (callable): Called as emitir(evento, datos, to=sid), such as socketio.emit.
+        """
+        self._rotores = rotores
+        self._emitir = emitir
+        self._lock = threading.Lock()
+        # rotor_id -> {sid: Suscripcion}
+        self._suscripciones = {}
+        self._canales = {}
+        # rotor_id -> Event que despierta al sondeo cuando cambian sus suscripciones.
+        self._sondeos = {}
+
+    def suscribir(self, sid, rotor_id=None, hz=1.0, deadband=0.0, formato=JSON):
+        """Subscribes a client to a rotor, replacing its previous subscription to the same rotor.
+
+        Args:
+            sid (str): Socket.IO session of the client.
+            rotor_id (str, optional): Id of the rotor, defaults to the main rotor.
+            hz (float, optional): Maximum frames per second, between MIN_HZ and MAX_HZ.
+            deadband (float, optional): Degrees that an axis must move for a new frame.
+            formato (str, optional): "json" or "binario".
+
+        Returns:
+            The Suscripcion.
+
+        Raises:
+            KeyError: There is no rotor with that id.
+            ValueError: Invalid rate, deadband or format.
+        """
+        rotor_id = self._rotores.get(rotor_id).rotor_id
+        hz = float(hz)
+        deadband = float(deadband)
+        if not MIN_HZ <= hz <= MAX_HZ:
+            raise ValueError(f'hz debe estar entre {MIN_HZ} y {MAX_HZ}')
+        if deadband < 0:
+            raise ValueError('deadband no puede ser negativo')
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato desconocido: {formato}')
+
+        with self._lock:
+            canales = self._canales.setdefault(sid, {})
+            if rotor_id not in canales:
+                canales[rotor_id] = len(canales) % 256
+            suscripcion = Suscripcion(sid, rotor_id, canales[rotor_id], 1 / hz, deadband, formato)
+            self._suscripciones.setdefault(rotor_id, {})[sid] = suscripcion
+            despertar = self._sondeos.get(rotor_id)
+            if despertar is None:
+                despertar = self._sondeos[rotor_id] = threading.Event()
+                threading.Thread(target=self._sondear, args=(rotor_id, despertar), name=f'telemetria-{rotor_id}', daemon=True).start()
+        despertar.set()
+        return suscripcion
+
+    def cancelar(self, sid, rotor_id=None):
+        """Cancels the subscription of a client to a rotor, or to every rotor when rotor_id is None."""
+        with self._lock:
+            if rotor_id is None:
+                rotor_ids = list(self._canales.pop(sid, {}))
+            else:
+                rotor_ids = [self._rotores.get(rotor_id).rotor_id]
+            for rotor_id in rotor_ids:
+                self._suscripciones.get(rotor_id, {}).pop(sid, None)
+                if rotor_id in self._sondeos:
+                    self._sondeos[rotor_id].set()
+
+    def _sondear(self, rotor_id, despertar):
+        rotor = self._rotores.get(rotor_id)
+        lecturas = LECTURAS.labels(rotor_id)
+        while True:
+            with self._lock:
+                suscripciones = list(self._suscripciones.get(rotor_id, {}).values())
+                if not suscripciones:
+                    del self._sondeos[rotor_id]
+                    return
+            despertar.clear()
+            periodo = min(suscripcion.periodo for suscripcion in suscripciones)
+            inicio = time.monotonic()
+            try:
+                az, el = rotor.ejecutar('status')
+            except Exception as error:
+                print(f'No se pudo leer el estado del rotor {rotor_id}: {error}')
+                despertar.wait(ESPERA_ERROR)
+                continue
+            lecturas.inc()
+            ahora = time.monotonic()
+            epoch = time.time()
+            for suscripcion in suscripciones:
+                cuadro = suscripcion.cuadro(ahora, epoch, az, el)
+                if cuadro is None:
+                    continue
+                CUADROS.labels(suscripcion.formato).inc()
+                self._emitir('estado_actual' if suscripcion.formato == JSON else 'estado_binario', cuadro, to=suscripcion.sid)
+            despertar.wait(max(0.0, periodo - (time.monotonic() - inicio)))
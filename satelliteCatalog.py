@@ -0,0 +1,219 @@
+"""In-memory indexes over the catalog of alive satellites.
+
+The indexes are built once every time the catalog is loaded from SatNogs, so the queries of the
+dashboard (name prefix, NORAD id, status, transmitter band and mode, upcoming passes) are answered
+without scanning the whole list.
+"""
+import bisect
+import time
+from timeUtils import fechaAEpoch
+from transmitterIndex import TransmitterIndex
+
+# Bandas de frecuencia en Hz, [inicio, fin).
+BANDAS_FRECUENCIA = (
+    ('HF', 3e6, 30e6),
+    ('VHF', 30e6, 300e6),
+    ('UHF', 300e6, 1e9),
+    ('L', 1e9, 2e9),
+    ('S', 2e9, 4e9),
+    ('C', 4e9, 8e9),
+    ('X', 8e9, 12e9),
+    ('Ku', 12e9, 18e9),
+    ('K', 18e9, 27e9),
+    ('Ka', 27e9, 40e9),
+)
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+def bandaFrecuencia(frecuencia):
+    """Returns the name of the band of a frequency in Hz, or None if it is outside the known bands."""
+    if frecuencia is None:
+        return None
+    for nombre, inicio, fin in BANDAS_FRECUENCIA:
+        if inicio <= frecuencia < fin:
+            return nombre
+    return None
+
+def _epochTiempoLocal(tiempo):
+    # Los tiempos de pasada se guardan como texto en hora de Chile; los que no son fechas son mensajes de error.
+    try:
+        return fechaAEpoch(tiempo)
+    except (TypeError, ValueError):
+        return None
+
+class SatelliteCatalog:
+    """Catalog of satellites with the indexes used to filter, paginate and project it."""
+
+    def __init__(self, satellites):
+        """Builds the indexes of the catalog.
+
+        Parameters:
+        satellites (list): Satellites as returned by getSatellitesData, with their transmitters attached.
+        """
+        self.satellites = {}
+        self.por_estado = {}
+        self.por_banda = {}
+        self.por_modo = {}
+        self.pasada_por_norad = {}
+        nombres = []
+        pasadas = []
+        transmitters_todos = []
+
+        for satellite in satellites:
+            norad_cat_id = satellite.get('norad_cat_id')
+            if norad_cat_id is None:
+                continue
+            self.satellites[norad_cat_id] = satellite
+            nombres.append(((satellite.get('name') or '').lower(), norad_cat_id))
+            self.por_estado.setdefault(satellite.get('status'), set()).add(norad_cat_id)
+
+            for transmitter in satellite.get('transmitters') or []:
+                transmitters_todos.append(transmitter)
+                banda = bandaFrecuencia(transmitter.get('downlink_low'))
+                if banda is not None:
+                    self.por_banda.setdefault(banda.lower(), set()).add(norad_cat_id)
+                for modo in (transmitter.get('mode'), transmitter.get('uplink_mode')):
+                    if modo:
+                        self.por_modo.setdefault(modo.lower(), set()).add(norad_cat_id)
+
+            inicio = _epochTiempoLocal(satellite.get('Tiempo_Inicio'))
+            fin = _epochTiempoLocal(satellite.get('Tiempo_Fin'))
+            if inicio is not None and fin is not None:
+                pasadas.append((inicio, fin, norad_cat_id))
+                self.pasada_por_norad[norad_cat_id] = (inicio, fin)
+
+        nombres.sort()
+        self._nombres = [nombre for nombre, _ in nombres]
+        self._nombres_norad = [norad_cat_id for _, norad_cat_id in nombres]
+        pasadas.sort()
+        self._pasadas_inicio = [inicio for inicio, _, _ in pasadas]
+        self._pasadas = pasadas
+        self._orden = sorted(self.satellites)
+        self.transmisores = TransmitterIndex(transmitters_todos)
+
+    def porPrefijoNombre(self, prefijo):
+        """Returns the NORAD ids of the satellites whose name starts with the prefix (case-insensitive)."""
+        prefijo = prefijo.lower()
+        inicio = bisect.bisect_left(self._nombres, prefijo)
+        fin = bisect.bisect_left(self._nombres, prefijo + '\uffff')
+        return set(self._nombres_norad[inicio:fin])
+
+    def conPasadaEntre(self, desde, hasta):
+        """Returns the NORAD ids of the satellites with a pass that overlaps [desde, hasta] (epoch seconds)."""
+        fin = bisect.bisect_right(self._pasadas_inicio, hasta)
+        return {norad_cat_id for _, los, norad_cat_id in self._pasadas[:fin] if los >= desde}
+
+    def query(self, nombre=None, norad_ids=None, estado=None, banda=None, modo=None, pasa_en=None,
+              ahora=None, cursor=None, limite=LIMITE_POR_DEFECTO, campos=None):
+        """Filters, paginates and projects the catalog.
+
+        Parameters:
+        nombre (str, optional): Prefix of the satellite name.
+        norad_ids (iterable of int, optional): NORAD ids to return.
+        estado (str, optional): Status of the satellite.
+        banda (str, optional): Band of the downlink of any of its transmitters (VHF, UHF, S...).
+        modo (str, optional): Mode of any of its transmitters (FM, BPSK...).
+        pasa_en (float, optional): Only satellites with a pass within the next *pasa_en* minutes.
+        ahora (float, optional): Epoch used as the current time for *pasa_en*.
+        cursor (int, optional): NORAD id of the last satellite of the previous page.
+        limite (int, optional): Maximum number of satellites of the page.
+        campos (list of str, optional): Fields to return, "transmitters.<campo>" projects the transmitters.
+
+        Returns:
+        The list of satellites of the page, the cursor of the next page (None on the last page) and the
+        total number of satellites that match the filters.
+        """
+        candidatos = None
+
+        def intersecar(conjunto):
+            nonlocal candidatos
+            candidatos = set(conjunto) if candidatos is None else candidatos & conjunto
+
+        if norad_ids is not None:
+            intersecar({norad_cat_id for norad_cat_id in norad_ids if norad_cat_id in self.satellites})
+        if nombre:
+            intersecar(self.porPrefijoNombre(nombre))
+        if estado:
+            intersecar(self.por_estado.get(estado, set()))
+        if banda:
+            intersecar(self.por_banda.get(banda.lower(), set()))
+        if modo:
+            intersecar(self.por_modo.get(modo.lower(), set()))
+        if pasa_en is not None:
+            ahora = time.time() if ahora is None else ahora
+            intersecar(self.conPasadaEntre(ahora, ahora + pasa_en * 60))
+
+        orden = self._orden if candidatos is None else sorted(candidatos)
+        inicio = 0 if cursor is None else bisect.bisect_right(orden, cursor)
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        pagina = orden[inicio:inicio + limite]
+        siguiente = pagina[-1] if inicio + limite < len(orden) else None
+
+        satellites = [self.satellites[norad_cat_id] for norad_cat_id in pagina]
+        if campos:
+            satellites = [proyectar(satellite, campos) for satellite in satellites]
+        return satellites, siguiente, len(orden)
+
+    def buscarTransmisores(self, direccion, desde, hasta, solo_vivos=True, pasa_desde=None, pasa_hasta=None):
+        """Finds the transmitters in a frequency window, joined with the next pass of their satellite.
+
+        Parameters:
+        direccion (str): "downlink" or "uplink".
+        desde (float): Lower frequency of the window in Hz.
+        hasta (float): Upper frequency of the window in Hz.
+        solo_vivos (bool, optional): Only transmitters marked as alive by SatNogs.
+        pasa_desde (float, optional): Epoch from which the pass of the satellite must overlap.
+        pasa_hasta (float, optional): Epoch until which the pass of the satellite must overlap.
+                                      If one of the two limits is given, satellites without pass are left out.
+
+        Returns:
+        List of dicts with the satellite name, NORAD id, pass times and the transmitter, ordered by the start of the pass.
+        """
+        filtrar_pasada = pasa_desde is not None or pasa_hasta is not None
+        pasa_desde = float('-inf') if pasa_desde is None else pasa_desde
+        pasa_hasta = float('inf') if pasa_hasta is None else pasa_hasta
+
+        resultados = []
+        for transmitter in self.transmisores.search(direccion, desde, hasta, solo_vivos):
+            norad_cat_id = transmitter.get('norad_cat_id')
+            satellite = self.satellites.get(norad_cat_id)
+            if satellite is None:
+                continue
+            pasada = self.pasada_por_norad.get(norad_cat_id)
+            if filtrar_pasada and (pasada is None or pasada[0] > pasa_hasta or pasada[1] < pasa_desde):
+                continue
+            resultados.append({
+                'norad_cat_id': norad_cat_id,
+                'name': satellite.get('name'),
+                'Tiempo_Inicio': satellite.get('Tiempo_Inicio'),
+                'Tiempo_Fin': satellite.get('Tiempo_Fin'),
+                'transmitter': transmitter,
+            })
+        # Los satelites sin pasada calculada quedan al final.
+        resultados.sort(key=lambda resultado: self.pasada_por_norad.get(resultado['norad_cat_id'], (float('inf'),))[0])
+        return resultados
+
+def proyectar(satellite, campos):
+    """Returns a copy of the satellite with only the requested fields.
+
+    Parameters:
+    satellite (dict): Satellite of the catalog.
+    campos (list of str): Fields to keep, "transmitters.<campo>" keeps only that field of each transmitter.
+
+    Returns:
+    The projected satellite.
+    """
+    resultado = {}
+    campos_transmisor = []
+    for campo in campos:
+        if campo.startswith('transmitters.'):
+            campos_transmisor.append(campo[len('transmitters.'):])
+        elif campo in satellite:
+            resultado[campo] = satellite[campo]
+    if campos_transmisor and 'transmitters' not in resultado:
+        resultado['transmitters'] = [
+            {campo: transmitter.get(campo) for campo in campos_transmisor}
+            for transmitter in satellite.get('transmitters') or []
+        ]
+    return resultado
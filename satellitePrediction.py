@@ -1,9 +1,20 @@
 import json
 import requests
 import math
+import time
 import ephem
-from datetime import datetime, timedelta
-import pytz
+import numpy as np
+from batchPropagation import BatchPropagator, topocentrico
+from dopplerSeries import dopplerPasada, ecefAGeodetic
+from groundStations import ESTACION_PRINCIPAL, getStation, observador
+from polylineSimplification import DOUGLAS_PEUCKER, simplificarRuta
+from metrics import PROPAGACION, errorSatNogs, medirSatNogs
+from passIterator import iterarPasadas
+from predictionArchive import archivoDeConfig, clavePrediccion
+from requestTiming import span
+from predictionRecords import PUNTO_PASADA, PUNTO_RUTA, PUNTO_SEGUIMIENTO, PassRecord, TLERecord, puntosAJson
+from timeUtils import epochAEphem, formatearFecha
+from tleStore import VIGENCIA_TLE_SEGUNDOS
 
 with open('config.json') as config_file:
     config = json.load(config_file)
@@ -15,15 +26,98 @@ elevation = config.get('elev')
 
 if api_key is None:
     raise ValueError("No API key found in config file.")
+
 # else:
 #     print(f"API Key: {api_key}")
 #     print(f"Longitude: {longitude}")
 #     print(f"Latitude: {latitude}")
 #     print(f"Elevation: {elevation}")
 
-def prediccionPasadaSatelite(norad_cat_id, numero_de_pasadas = 1, computeCycle = 2):
+# Archivo de las predicciones de pasadas, compartido con rotorMovementAPI.py. None con "archivo": null en config.json.
+archivo = archivoDeConfig(config)
+
+def getTransmittersSatelite(norad_cat_id):
+    """Gets the transmitters of one satellite from the SatNogs Database using their API
+
+    Returns:
+    The list of transmitters of the satellite, empty if the request fails.
+    """
+    url = f'https://db.satnogs.org/api/transmitters/?satellite__norad_cat_id={norad_cat_id}'
+    headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
+    with span('satnogs_transmitters'), medirSatNogs('transmitters_satellite'):
+        response = requests.get(url, headers)
+        if response.status_code == 200:
+            return response.json()
+    errorSatNogs('transmitters_satellite', response.status_code)
+    print(f'Error en la solicitud de transmisores: {response.status_code}')
+    return []
+
+def obtenerTLE(norad_cat_id):
+    """Gets the latest TLE of one satellite from the SatNogs Database using their API
+
+    Returns:
+    The TLERecord of the satellite, None if SatNogs has no TLE for it.
+
+    Raises:
+    ConnectionError: The request to SatNogs failed.
+    """
+    url = f'https://db.satnogs.org/api/tle/?norad_cat_id={norad_cat_id}&tle_source=&sat_id='
+    headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
+    with span('satnogs_tle'), medirSatNogs('tle_satellite'):
+        response = requests.get(url, headers)
+        json_data = response.json() if response.status_code == 200 else None
+    if json_data is None:
+        errorSatNogs('tle_satellite', response.status_code)
+        raise ConnectionError(f'Error en la solicitud: {response.status_code}')
+
+    print(f'Conexion con la API exitosa: {response.status_code}\nEmpezando con el computo de la orbita de:')
+    if not json_data:
+        return None
+    return TLERecord.fromSatNogs(json_data[0])
+
+def nombreSatelite(tle):
+    """Name of the satellite as shown in the predictions."""
+    return tle.nombre.replace("/","-")
+
+def calcularPasadas(tle, numero_de_pasadas = 1, computeCycle = 2, doppler = False, station_id = None):
+    """Computes the next passes of the satellite over the station *station_id*.
+
+    The windows of all the passes are searched first and sampled in parallel, see passIterator.
+
+    Returns:
+    List with a PassRecord for every pass, None for the passes that could not be computed.
+    """
+    estacion = getStation(station_id)
+
+    pasadas = []
+    transmitters = None
+    propagador = None
+
+    # Se piden todas las pasadas por adelantado para que sus muestreos corran a la vez.
+    for pasada in iterarPasadas(nombreSatelite(tle), tle, computeCycle, station_id, adelanto=numero_de_pasadas,
+                                limite=numero_de_pasadas):
+        puntos = pasada.puntos
+        print(f'Registradas {len(puntos)} inputs para cada {computeCycle} segundos.')
+        if doppler:
+            if transmitters is None:
+                transmitters = getTransmittersSatelite(tle.norad_cat_id)
+                propagador = BatchPropagator([(tle.norad_cat_id, nombreSatelite(tle), tle.tle1, tle.tle2)])
+            with span('doppler'):
+                pasada.doppler = dopplerPasada(propagador, puntos['t'], estacion['lat'], estacion['long'], estacion['elev'], transmitters)
+        pasadas.append(pasada)
+        if len(pasadas) == numero_de_pasadas:
+            break
+
+    # Las pasadas que no se pudieron calcular quedan como None, como antes.
+    return pasadas + [None] * (numero_de_pasadas - len(pasadas))
+
+def prediccionPasadaSatelite(norad_cat_id, numero_de_pasadas = 1, computeCycle = 2, doppler = False, station_id = None):
     """Computes the route and position of the choseen satellite, and the direction in azimuth and elevation 
-    that the antenna has to aim to obtain data from the satellite.
+    that the antenna has to aim to obtain data from the satellite, as seen from the station *station_id*
+    of the registry (the main station by default).
+
+    If *doppler* is True every pass also includes the slant range, range-rate and the Doppler-corrected
+    frequencies of each transmitter of the satellite, computed in batch over the points of the pass.
 
     Returns:
     JSON object with the following data:
@@ -35,158 +129,121 @@ def prediccionPasadaSatelite(norad_cat_id, numero_de_pasadas = 1, computeCycle =
                     "Ciclo_computo" : Tiempo de cada posición,  
                     "Pasadas_predecidas" : {
                                             "Tiempo_Cordenada": "Tiempo de la cordenada en una instancia de tiempo",
+                                            "Epoch": Tiempo de la cordenada en segundos UNIX,
                                             "az": Posicicón Azimuth que debe estar la antena en una instancia de tiempo,
                                             "el": Posicicón Elevación que debe estar la antena en una instancia de tiempo,
                                             "lat": Posicicón Latitud del satelite en una instancia de tiempo,
                                             "long": Posicicón Longitud del satelite en una instancia de tiempo,
                                             "elev": Elevación del satelite en una instancia de tiempo
                                             },
+                    "Doppler" : Solo si *doppler* es True, ver dopplerPasada,
+                    "Prediccion_ID" : Id de la predicción en el archivo, ver predictionArchive,
     """
-
-    # URL
-    url = f'https://db.satnogs.org/api/tle/?norad_cat_id={norad_cat_id}&tle_source=&sat_id='
-
-    headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
-
-    response = requests.get(url, headers)
-
-    if response.status_code == 200:
-        print(f'Conexion con la API exitosa: {response.status_code}\nEmpezando con el computo de la orbita de:')
-        telescope_data = response.json()
-        json_data = telescope_data;
-
-        tle_data = [{'tle0': item['tle0'], 'tle1': item['tle1'], 'tle2': item['tle2'], 'Updated': item['updated']} for item in json_data]
-        
-        if not tle_data:
-            print(f'No hay datos del satelite disponibles')
-            predictionPasada = {
-                "Error" : "No existen datos del satelite",
-            }
-            return predictionPasada
-
-        nombre_satellite = f"{tle_data[0]['tle0']}"
-        if '0' in nombre_satellite: nombre_satellite = nombre_satellite.replace('0 ', '')
-        print(nombre_satellite)
-
-        nombre_satellite = nombre_satellite.replace("/","-")
-
-        tle1 = f"{tle_data[0]['tle1']}"
-        tle2 = f"{tle_data[0]['tle2']}"
-        Updated = f"{tle_data[0]['Updated']}"
-        Updated = Updated[:-5]
-
-        ultimoActualizado = datetime.strptime(Updated, '%Y-%m-%dT%H:%M:%S.%f').replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Chile/Continental'))
-        fechaUltimoActualizado= ultimoActualizado.strftime('%Y-%m-%dT%H:%M:%S')
-
-        now_time = datetime.now(pytz.timezone('Chile/Continental'))
-
-        time_difference = (now_time - ultimoActualizado)
-
-        # Condición que ocurre si la TLE esta muy desactualizada, puede significar un error con el satelite.
-        if time_difference > timedelta(days=3):
-            predictionData = {
-                "Satelite" : nombre_satellite,
-                "Satelite_Norad_Cat_ID" : norad_cat_id,
-                "Ultima_Actulizacion" : fechaUltimoActualizado,
-                "Predicción" : {
-                    "Error" : "La tle no se encuentra actualizada, por lo que no se puede realizar la predicción."
-                },
-            }
-            
-            return predictionData
-
-        satellite = ephem.readtle(nombre_satellite, tle1, tle2)
-
-        obs = ephem.Observer()
-        obs.lat = latitude
-        obs.long = longitude
-        obs.elev = elevation
-
-        tempPredictionPasada = []
-        predictionData = []
-        tempPred = []
-
-        # seleccion = click.prompt('Iniciando Computo.\nIngrese el los segundos en ciclo que quiere que se computen para la predicción',type=float)
-        # computeCycle = seleccion
-
-        # Este *for* realiza un predicción para los futuros pasos del satelite, si el range es 1 hara para la primera pasada, 
-        # si es 2 para la primera y segunda pasada y así sucesivamente.
-        for p in range(numero_de_pasadas):
-            
-            try:
-                tr, azr, tt, altt, ts, azs = obs.next_pass(satellite)
-        
-                if tr is None or ts is None:
-                    predictionData = {
-                        "Error" : "Error de Computo, objeto nunca pasa por el area"
-                    }
-                    tempPredictionPasada.append(predictionData)
-
-                localTimeStart = ephem.localtime(tr).strftime('%Y-%m-%dT%H:%M:%S')
-                localTimeEnd = ephem.localtime(ts).strftime('%Y-%m-%dT%H:%M:%S')
-
-                while tr < ts:
-                    obs.date = tr
-                    satellite.compute(obs)
-
-                    pasadas_predecidas = {
-                        "Tiempo_Cordenada" : ephem.localtime(tr).strftime('%Y-%m-%dT%H:%M:%S'),
-                        "az" : round(math.degrees(satellite.az), 1),
-                        "el" : round(math.degrees(satellite.alt), 1),
-                        "lat" : round(math.degrees(satellite.sublat), 6),
-                        "long" : round(math.degrees(satellite.sublong), 6),
-                        "elev" : round(satellite.elevation, 2),
-                    }
-
-                    tempPred.append(pasadas_predecidas)
-                    
-                    # Tiempo para el siguiente calculo
-                    tr = ephem.Date(tr + computeCycle * ephem.second)
-                
-                print(f'Registradas {len(tempPred)} inputs para cada {computeCycle} segundos.')
-
-                predictionData = {
-                    "Numero_Pasada" : p+1, 
-                    "Tiempo_Inicio" : localTimeStart, 
-                    "Tiempo_Termino" : localTimeEnd,
-                    "Ciclo_computo" : computeCycle,  
-                    "Pasadas_predecidas" : tempPred,
-                }
-
-                tempPredictionPasada.append(predictionData)
-
-            except ValueError:
-                print(f'Error en el computo: {ValueError}')
-                
-                predictionData = {
-                    "Error" : "Error de Computo, objeto nunca pasa por el area"
-                }
-                tempPredictionPasada.append(predictionData)
-
-        predictionPasada = {
+    try:
+        tle = obtenerTLE(norad_cat_id)
+    except ConnectionError as error:
+        print(error)
+        return None
+
+    if tle is None:
+        print(f'No hay datos del satelite disponibles')
+        return {"Error" : "No existen datos del satelite"}
+
+    nombre_satellite = nombreSatelite(tle)
+    print(nombre_satellite)
+    fechaUltimoActualizado = formatearFecha(tle.actualizado)
+
+    # Condición que ocurre si la TLE esta muy desactualizada, puede significar un error con el satelite.
+    if time.time() - tle.actualizado > VIGENCIA_TLE_SEGUNDOS:
+        predictionData = {
             "Satelite" : nombre_satellite,
             "Satelite_Norad_Cat_ID" : norad_cat_id,
             "Ultima_Actulizacion" : fechaUltimoActualizado,
-            "Predicción" : tempPredictionPasada
-            }
-
-        """Escribe los datos a un archivo"""
-        # dir = os.path.dirname(__file__)
-        # newDir = os.path.join(dir, 'resources', nombre_tle)
-        # os.makedirs(os.path.dirname(newDir), exist_ok=True)
-
-        # with open(newDir, 'w', encoding="utf-8") as file:
-        #     json.dump(predictionPasada, file, ensure_ascii=False, indent=4)
-        # print(f"Datos guardados en {newDir}")
-        
-        return predictionPasada
+            "Predicción" : {
+                "Error" : "La tle no se encuentra actualizada, por lo que no se puede realizar la predicción."
+            },
+        }
+        return predictionData
 
-    else:
-        print(f'Error en la solicitud: {response.status_code}')
+    # seleccion = click.prompt('Iniciando Computo.\nIngrese el los segundos en ciclo que quiere que se computen para la predicción',type=float)
+    # computeCycle = seleccion
+
+    # Mientras la TLE sea la misma y la primera pasada no haya empezado, la predicción archivada es la que se calcularía de nuevo.
+    estacion = station_id or ESTACION_PRINCIPAL
+    prediccion_id = None
+    if archivo is not None:
+        clave = clavePrediccion(norad_cat_id, estacion, numero_de_pasadas, computeCycle, doppler, tle)
+        with span('archivo'):
+            prediccion_id = archivo.buscarVigente(clave, time.time())
+            pasadas = archivo.leerPrediccion(prediccion_id)[1] if prediccion_id is not None else None
+    if prediccion_id is None:
+        pasadas = calcularPasadas(tle, numero_de_pasadas, computeCycle, doppler, station_id)
+        if archivo is not None:
+            with span('archivo'):
+                prediccion_id = archivo.guardarPrediccion(clave, norad_cat_id, nombre_satellite, estacion, numero_de_pasadas,
+                                                          computeCycle, doppler, tle, pasadas)
+
+    with span('serializacion'):
+        return jsonPrediccionPasada(nombre_satellite, norad_cat_id, tle.actualizado, pasadas, prediccion_id)
+
+def jsonPrediccionPasada(nombre_satellite, norad_cat_id, actualizado, pasadas, prediccion_id=None):
+    """Builds the JSON of prediccionPasadaSatelite from its PassRecord, None for the passes that could not be computed."""
+    predictionPasada = {
+        "Satelite" : nombre_satellite,
+        "Satelite_Norad_Cat_ID" : norad_cat_id,
+        "Ultima_Actulizacion" : formatearFecha(actualizado),
+        "Predicción" : [
+            pasada.toJson() if pasada is not None else {"Error" : "Error de Computo, objeto nunca pasa por el area"}
+            for pasada in pasadas
+        ]
+        }
+    if prediccion_id is not None:
+        predictionPasada["Prediccion_ID"] = prediccion_id
+    return predictionPasada
+
+def prediccionArchivada(prediccion_id):
+    """Returns an archived pass prediction as it was returned by prediccionPasadaSatelite, None if it is not in the archive."""
+    if archivo is None:
+        return None
+    leida = archivo.leerPrediccion(prediccion_id)
+    if leida is None:
+        return None
+    prediccion, pasadas = leida
+    return jsonPrediccionPasada(prediccion['satelite'], prediccion['norad_cat_id'], prediccion['tle_actualizado'], pasadas, prediccion_id)
+
+def calcularRuta(tle, desde, hasta, step_seconds = 1, station_id = None):
+    """Computes the sub-satellite point every *step_seconds* seconds between two UNIX epochs, both included.
 
-def prediccionRutaSatelite(norad_cat_id):
+    Returns:
+    PUNTO_RUTA array with the points of the route.
+    """
+    satellite = ephem.readtle(nombreSatelite(tle), tle.tle1, tle.tle2)
+    obs = observador(station_id)
+
+    tiempos = desde + np.arange(int((hasta - desde) // step_seconds) + 1) * step_seconds
+    sub_lat = []
+    sub_long = []
+    sub_elev = []
+    for epoch in tiempos.tolist():
+        obs.date = epochAEphem(epoch)
+        satellite.compute(obs)
+        sub_lat.append(math.degrees(satellite.sublat))
+        sub_long.append(math.degrees(satellite.sublong))
+        sub_elev.append(satellite.elevation)
+
+    ruta = np.empty(len(tiempos), dtype=PUNTO_RUTA)
+    ruta['t'] = tiempos
+    ruta['lat'] = sub_lat
+    ruta['long'] = sub_long
+    ruta['elev'] = sub_elev
+    return ruta
+
+def prediccionRutaSatelite(norad_cat_id, station_id = None, tolerancia = None, max_puntos = None, metodo = DOUGLAS_PEUCKER):
     """Computes the route and position of the choseen satellite.
 
+    The route can be simplified for drawing it on a map with *tolerancia* (degrees for Douglas-Peucker,
+    square degrees for Visvalingam) and/or *max_puntos*, see polylineSimplification.simplificarIndices.
+
     Returns:
     JSON object with the following data:
                     "Satelite" : Nombre del Satellite,
@@ -198,119 +255,33 @@ def prediccionRutaSatelite(norad_cat_id):
                                             "elev": Elevación del satelite en una instancia de tiempo
                                             },
     """
+    try:
+        tle = obtenerTLE(norad_cat_id)
+    except ConnectionError as error:
+        print(error)
+        return None
 
-    # URL
-    url = f'https://db.satnogs.org/api/tle/?norad_cat_id={norad_cat_id}&tle_source=&sat_id='
-
-    headers = {'Authorization': f'Token {api_key}','Content-Type': 'application/json',}
-
-    response = requests.get(url, headers)
-
-    if response.status_code == 200:
-        print(f'Conexion con la API exitosa: {response.status_code}\nEmpezando con el computo de la orbita de:')
-        telescope_data = response.json()
-
-        json_data = telescope_data;
-
-        tle_data = [{'tle0': item['tle0'], 'tle1': item['tle1'], 'tle2': item['tle2'], 'Updated': item['updated']} for item in json_data]
-        
-        if not tle_data:
-            print(f'No hay datos del satelite disponibles')
-            predictionPasada = {
-                "Error" : "No existen datos del satelite",
-            }
-            return predictionPasada
-
-        nombre_satellite = f"{tle_data[0]['tle0']}"
-        if '0' in nombre_satellite: nombre_satellite = nombre_satellite.replace('0 ', '')
-        print(nombre_satellite)
-
-        nombre_satellite = nombre_satellite.replace("/","-")
-
-        tle1 = f"{tle_data[0]['tle1']}"
-        tle2 = f"{tle_data[0]['tle2']}"
-        Updated = f"{tle_data[0]['Updated']}"
-        Updated = Updated[:-5]
-
-        ultimoActualizado = datetime.strptime(Updated, '%Y-%m-%dT%H:%M:%S.%f').replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Chile/Continental'))
-        fechaUltimoActualizado= ultimoActualizado.strftime('%Y-%m-%dT%H:%M:%S')
-
-        now_time = datetime.now(pytz.timezone('Chile/Continental'))
-
-        time_difference = (now_time - ultimoActualizado)
-
-        # Condición que ocurre si la TLE esta muy desactualizada, puede significar un error con el satelite.
-        if time_difference > timedelta(days=3):
-            predictionData = {
-                "Satelite" : nombre_satellite,
-                "Satelite_Norad_Cat_ID" : norad_cat_id,
-                "Ultima_Actulizacion" : fechaUltimoActualizado,
-                "Ruta_predecida" : {
-                    "Error" : "La tle no se encuentra actualizada, por lo que no se puede realizar la predicción."
-                },
-            }
-            
-            """Escribe los datos a un archivo"""
-            # dir = os.path.dirname(__file__)
-            # newDir = os.path.join(dir, 'resources', nombre_tle)
-            # os.makedirs(os.path.dirname(newDir), exist_ok=True)
-
-            # with open(newDir, 'w', encoding="utf-8") as file:
-            #     json.dump(predictionData, file, ensure_ascii=False, indent=4)
-            # print(f"Datos guardados en {newDir}")
-            
-            return predictionData
-
-        
-        satellite = ephem.readtle(nombre_satellite, tle1, tle2)
-
-        start_time = now_time - timedelta(minutes=1)
-        end_time = now_time + timedelta(hours=5)
-        step_seconds = 1
+    if tle is None:
+        print(f'No hay datos del satelite disponibles')
+        return {"Error" : "No existen datos del satelite"}
 
-        current_time = start_time
+    nombre_satellite = nombreSatelite(tle)
+    print(nombre_satellite)
+    fechaUltimoActualizado = formatearFecha(tle.actualizado)
 
-        obs = ephem.Observer()
-        obs.lat = latitude
-        obs.long = longitude
-        obs.elev = elevation
-
-        tempPred = []
-        predictionData = []
-
-        """Este *while* realiza un predicción de la ruta por la que pasara el satelite entre *start_time* y *end_time*, con step_seconds como
-            paso de tiempo entre cada predicción.
-        """
-        while current_time <= end_time:
-
-            try:
-                obs.date = current_time
-                satellite.compute(obs)
-
-                posición_predecida = {
-                    "Tiempo_Cordenada" : current_time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    "lat" : round(math.degrees(satellite.sublat), 6),
-                    "long" : round(math.degrees(satellite.sublong), 6),
-                    "elev" : round(satellite.elevation, 2),
-                }
-
-                tempPred.append(posición_predecida)
-
-                current_time += timedelta(seconds=step_seconds)
-            
-            except ValueError:
-                print(f'Error en el computo: {ValueError}')
-                posición_predecida = {
-                    "Error" : ValueError
-                }
+    now_time = time.time()
 
+    # Condición que ocurre si la TLE esta muy desactualizada, puede significar un error con el satelite.
+    if now_time - tle.actualizado > VIGENCIA_TLE_SEGUNDOS:
         predictionData = {
             "Satelite" : nombre_satellite,
             "Satelite_Norad_Cat_ID" : norad_cat_id,
             "Ultima_Actulizacion" : fechaUltimoActualizado,
-            "Ruta_predecida" : tempPred,
-            }
-            
+            "Ruta_predecida" : {
+                "Error" : "La tle no se encuentra actualizada, por lo que no se puede realizar la predicción."
+            },
+        }
+        
         """Escribe los datos a un archivo"""
         # dir = os.path.dirname(__file__)
         # newDir = os.path.join(dir, 'resources', nombre_tle)
@@ -322,25 +293,45 @@ def prediccionRutaSatelite(norad_cat_id):
         
         return predictionData
 
-    else:
-        print(f'Error en la solicitud: {response.status_code}')
+    """La ruta se predice entre un minuto antes de ahora y cinco horas después, con un punto por segundo."""
+    with span('ruta'), PROPAGACION.labels('ruta').time():
+        ruta = calcularRuta(tle, now_time - 60, now_time + 5 * 3600, 1, station_id)
 
-def predictionCelestialBody(CelestialBodyOption):
-    """Computes the route and position of the choseen satellite.
+    with span('simplificacion'):
+        ruta = simplificarRuta(ruta, tolerancia, max_puntos, metodo)
+    with span('serializacion'):
+        predictionData = {
+            "Satelite" : nombre_satellite,
+            "Satelite_Norad_Cat_ID" : norad_cat_id,
+            "Ultima_Actulizacion" : fechaUltimoActualizado,
+            "Ruta_predecida" : puntosAJson(ruta, con_epoch=False),
+            }
+        
+    """Escribe los datos a un archivo"""
+    # dir = os.path.dirname(__file__)
+    # newDir = os.path.join(dir, 'resources', nombre_tle)
+    # os.makedirs(os.path.dirname(newDir), exist_ok=True)
+
+    # with open(newDir, 'w', encoding="utf-8") as file:
+    #     json.dump(predictionData, file, ensure_ascii=False, indent=4)
+    # print(f"Datos guardados en {newDir}")
+    
+    return predictionData
+
+def predictionCelestialBody(CelestialBodyOption, station_id = None):
+    """Computes the route and position of the choseen celestial body, as seen from the station *station_id*.
     
     Returns:
     JSON object with the following data:
         "Cuerpo Celeste": El nombre del cuerpo celeste a predecir,
         "Pasadas_predecidas": [{
             "Tiempo_Cordenada": "Tiempo de la cordenada en una instancia de tiempo",
+            "Epoch": Tiempo de la cordenada en segundos UNIX,
             "az": Posicicón Azimuth que debe estar la antena en una instancia de tiempo,
             "el": Posicicón Elevación que debe estar la antena en una instancia de tiempo,
     """
     # Configuración de la ubicación
-    observador = ephem.Observer()
-    observador.lat = latitude
-    observador.long = longitude
-    observador.elev = elevation
+    obs = observador(station_id)
 
     # Lista de cuerpos celestes disponibles
     cuerpos_celestes = {
@@ -364,46 +355,39 @@ def predictionCelestialBody(CelestialBodyOption):
     cuerpo_celeste = cuerpos_celestes[nombre_cuerpo_celeste]
 
     # Rango de fechas y horas
-    start_time = datetime.now(pytz.timezone('Chile/Continental'))
-    end_time = start_time + timedelta(hours=6)
+    start_time = time.time()
+    end_time = start_time + 6 * 3600
     step_seconds = 1
 
-    current_time = start_time
-
-    # Crear listas para almacenar los resultados
-    tempPred = []
-    predictionData = []
+    # Posiciones en las que cambia la dirección de la antena
+    seguimiento = []
 
     # Variables para almacenar los valores previos de azimuth y elevación
     prev_az = None
     prev_el = None
 
     # Calcular las posiciones del cuerpo celeste
-    while current_time < end_time:
-        observador.date = current_time
-        cuerpo_celeste.compute(observador)
-
-        az = round(math.degrees(cuerpo_celeste.az), 1)
-        el = round(math.degrees(cuerpo_celeste.alt), 1)
-
-        # Comprobar si hay un cambio en el azimuth o la elevación
-        if el >= 0.0:
-            if az != prev_az or el != prev_el:
-                posición_predecida = {
-                    "Tiempo_Cordenada": current_time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    "az": az,
-                    "el": el,
-                }
-                tempPred.append(posición_predecida)
-                prev_az = az
-                prev_el = el
-            
-        current_time += timedelta(seconds=step_seconds)
-
-    predictionData = {
-        "Cuerpo Celeste": nombre_cuerpo_celeste,
-        "Pasadas_predecidas": tempPred
-        }
+    with span('cuerpo_celeste'), PROPAGACION.labels('cuerpo_celeste').time():
+        for paso in range(math.ceil((end_time - start_time) / step_seconds)):
+            current_time = start_time + paso * step_seconds
+            obs.date = epochAEphem(current_time)
+            cuerpo_celeste.compute(obs)
+
+            az = round(math.degrees(cuerpo_celeste.az), 1)
+            el = round(math.degrees(cuerpo_celeste.alt), 1)
+
+            # Comprobar si hay un cambio en el azimuth o la elevación
+            if el >= 0.0:
+                if az != prev_az or el != prev_el:
+                    seguimiento.append((current_time, az, el))
+                    prev_az = az
+                    prev_el = el
+
+    with span('serializacion'):
+        predictionData = {
+            "Cuerpo Celeste": nombre_cuerpo_celeste,
+            "Pasadas_predecidas": puntosAJson(np.array(seguimiento, dtype=PUNTO_SEGUIMIENTO))
+            }
 
     """Escribe los datos a un archivo"""
     # dir = os.path.dirname(__file__)
@@ -416,6 +400,86 @@ def predictionCelestialBody(CelestialBodyOption):
 
     return predictionData
                 
+def prediccionPasadaEstaciones(norad_cat_id, station_ids, horizonte_horas = 24, computeCycle = 2):
+    """Computes the next pass of the choseen satellite over several stations of the registry.
+
+    The satellite is propagated once over the horizon with SGP4, and only the conversion to azimuth
+    and elevation is made for each station, so adding stations costs little more than one.
+
+    Returns:
+    JSON object with the following data:
+                    "Satelite" : Nombre del Satellite,
+                    "Satelite_Norad_Cat_ID" : NORAD del satelite,
+                    "Ultima_Actulizacion" : Ultimo perido de tiempo en el que fue Actualizado de la tle,
+                    "Estaciones" : {
+                                    "<id estacion>": {
+                                            "Tiempo_Inicio", "Tiempo_Termino", "Ciclo_computo",
+                                            "Pasadas_predecidas": Mismos campos que prediccionPasadaSatelite,
+                                            },
+                                    },
+    """
+    try:
+        tle = obtenerTLE(norad_cat_id)
+    except ConnectionError as error:
+        print(error)
+        return None
+
+    if tle is None:
+        print(f'No hay datos del satelite disponibles')
+        return {"Error" : "No existen datos del satelite"}
+
+    nombre_satellite = nombreSatelite(tle)
+
+    predictionData = {
+        "Satelite" : nombre_satellite,
+        "Satelite_Norad_Cat_ID" : norad_cat_id,
+        "Ultima_Actulizacion" : formatearFecha(tle.actualizado),
+    }
+
+    now_time = time.time()
+    if now_time - tle.actualizado > VIGENCIA_TLE_SEGUNDOS:
+        predictionData["Estaciones"] = {
+            "Error" : "La tle no se encuentra actualizada, por lo que no se puede realizar la predicción."
+        }
+        return predictionData
+
+    # Propagación común a todas las estaciones
+    with span('estaciones'), PROPAGACION.labels('estaciones').time():
+        propagador = BatchPropagator([(norad_cat_id, nombre_satellite, tle.tle1, tle.tle2)])
+        epochs = now_time + np.arange(0, horizonte_horas * 3600, computeCycle, dtype=float)
+        r_ecef, v_ecef, valido = propagador.propagate(epochs)
+        r_ecef = r_ecef[0]
+        v_ecef = v_ecef[0]
+        valido = valido[0]
+        sub_lat, sub_long, sub_elev = ecefAGeodetic(r_ecef * 1000.0)
+
+    estaciones = {}
+    for station_id in station_ids:
+        estacion = getStation(station_id)
+        az, el, _, _ = topocentrico(r_ecef, v_ecef, estacion['lat'], estacion['long'], estacion['elev'])
+        arriba = valido & (el >= 0)
+
+        # La siguiente pasada empieza en la primera subida sobre el horizonte después de ahora.
+        subidas = np.flatnonzero(arriba[1:] & ~arriba[:-1]) + 1
+        if len(subidas) == 0:
+            estaciones[station_id] = {"Error" : "Error de Computo, objeto nunca pasa por el area"}
+            continue
+        inicio = subidas[0]
+        bajadas = np.flatnonzero(~arriba[inicio:])
+        fin = inicio + bajadas[0] if len(bajadas) else len(arriba)
+
+        puntos = np.empty(fin - inicio, dtype=PUNTO_PASADA)
+        puntos['t'] = epochs[inicio:fin]
+        puntos['az'] = az[inicio:fin]
+        puntos['el'] = el[inicio:fin]
+        puntos['lat'] = sub_lat[inicio:fin]
+        puntos['long'] = sub_long[inicio:fin]
+        puntos['elev'] = sub_elev[inicio:fin]
+        estaciones[station_id] = PassRecord(None, puntos['t'][0], puntos['t'][-1], computeCycle, puntos).toJson()
+
+    predictionData["Estaciones"] = estaciones
+    return predictionData
+
 if __name__ == '__main__':
     # prediccionRutaSatelite(24278)
     # prediccionPasadaSatelite(24278, 1, 1)
@@ -1,24 +1,471 @@
-from apiSatNogsAllSatelliteNORADId import getSatellitesData
-from satellitePrediction import prediccionPasadaSatelite, prediccionRutaSatelite, predictionCelestialBody
+import collections
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+import gevent
+import requests
+from apiSatNogsAllSatelliteNORADId import config, getCatalogData, latitude, longitude, elevation
+from satellitePrediction import archivo, prediccionArchivada, prediccionPasadaSatelite, prediccionPasadaEstaciones, prediccionRutaSatelite, predictionCelestialBody
+from groundStations import getStation, listStations
+from polylineSimplification import DOUGLAS_PEUCKER, VISVALINGAM
+from batchPropagation import BatchPropagator
+from observationScheduler import LIMITES_POR_DEFECTO, VELOCIDAD_AZ, VELOCIDAD_EL, muestrearPasada, pasadasCandidatas, planificar
+from satelliteCatalog import SatelliteCatalog, LIMITE_POR_DEFECTO
+from predictionRecords import puntosAJson
+from timeUtils import fechaAEpoch, formatearFecha, formatearFechas
+from responseEncoding import EncodedResponseCache, conditionalResponse, encodeResponse, notModifiedResponse
+from metrics import PROPAGACION, instrumentarApp
+from requestTiming import instrumentarTiempos, span
 from flask import Flask, jsonify, request
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 from gevent.pywsgi import WSGIServer
+from geventwebsocket.handler import WebSocketHandler
+from trackHandoff import TrackHandoffServer
 
 app = Flask(__name__)
 CORS(app)
+instrumentarApp(app)
+# Server-Timing de cada respuesta y perfilador de /admin/perfil, habilitado con "admin_token" en config.json.
+instrumentarTiempos(app, config.get('admin_token'))
 
 socketio = SocketIO(app)
+
+# Tiempo que se reutiliza el catalogo de satelites antes de volver a consultarlo en SatNogs.
+CATALOGO_TTL_SEGUNDOS = 10 * 60
+# Dirección de rotorMovementAPI.py, a la que se envia el plan de observaciones cuando se pide seguirlo.
+ROTOR_API_URL = 'http://192.168.1.18:5019'
+
+# Tiempo que se reutilizan las predicciones ya codificadas para una misma petición.
+PREDICCION_TTL_SEGUNDOS = 60
+# Diffs del catalogo que se conservan para que los clientes atrasados se pongan al día sin descargarlo entero.
+HISTORIAL_DIFFS = 50
+
+# catalogo_lock protege el estado del catalogo, que el refresco reemplaza desde un hilo del pool de gevent.
+catalogo_lock = threading.Lock()
+# Greenlet del refresco en curso, None si no hay ninguno.
+refresco = None
+catalogo = {
+    'version': 0,
+    'cargado': None,
+    'datos': None,
+    'indice': None,
+    'propagador': None,
+    'tle': None,
+    'respuesta': None,
+    # (version, diff) de las últimas actualizaciones, la más reciente al final.
+    'diffs': collections.deque(maxlen=HISTORIAL_DIFFS),
+}
+
+# Las versiones del catalogo vuelven a empezar con el proceso, el ETag lleva también el arranque.
+ARRANQUE = uuid.uuid4().hex[:8]
+
+predicciones_cache = EncodedResponseCache(PREDICCION_TTL_SEGUNDOS)
+consultas_cache = EncodedResponseCache(PREDICCION_TTL_SEGUNDOS, max_entries=512)
+
+def obtenerCatalogo():
+    """Returns the cached catalog of alive satellites, refreshing it from SatNogs when it has expired.
+
+    Returns:
+    The catalog state with the satellite list, its indexes, the batch propagator of its TLEs, its version and the pre-encoded response, or None
+    if SatNogs could not be reached and there is no previous catalog.
+
+    When a refresh changes the catalog, its diff against the previous one is kept in the history and
+    pushed to the Socket.IO clients as "catalogo_diff", with the new version as sequence number.
+
+    gevent is not monkey-patched in this service, so the SatNogs requests and the propagation of a
+    refresh would freeze every client for its whole duration if they ran on the hub. One refresh at
+    a time runs in the thread pool of the hub instead (see refrescarFueraDelHub): the requests are
+    served the previous catalog meanwhile, and only wait for it, cooperatively, when there is none
+    yet. The new catalog replaces the previous one at once, so every caller gets a consistent snapshot.
+    """
+    global refresco
+    if catalogoVencido() and refresco is None:
+        refresco = gevent.spawn(refrescarFueraDelHub)
+    if catalogo['datos'] is None and refresco is not None:
+        refresco.join()
+    with catalogo_lock:
+        if catalogo['datos'] is None:
+            return None
+        return dict(catalogo)
+
+def catalogoVencido():
+    cargado = catalogo['cargado']
+    return cargado is None or time.monotonic() - cargado > CATALOGO_TTL_SEGUNDOS
+
+def refrescarFueraDelHub():
+    """Greenlet of a refresh: runs refrescarDesdeSatNogs in a thread of the hub pool and pushes its diff from the hub."""
+    global refresco
+    try:
+        actualizacion = gevent.get_hub().threadpool.apply(refrescarDesdeSatNogs)
+    except Exception as error:
+        print(f'No se pudo refrescar el catalogo: {error}')
+        actualizacion = None
+    finally:
+        refresco = None
+    # Socket.IO solo se usa desde el hub.
+    if actualizacion is not None:
+        socketio.emit('catalogo_diff', actualizacion)
+
+def refrescarDesdeSatNogs():
+    """Downloads the catalog from SatNogs and replaces the current one, in a thread of the hub pool.
+
+    Returns:
+    The {"secuencia", "diff"} to push to the clients, None if the catalog did not change or could not be downloaded.
+    """
+    # Solo el refresco en curso cambia los datos y la versión, se pueden leer sin catalogo_lock.
+    anterior = catalogo['datos']
+    catalog_data = getCatalogData(anterior)
+    if catalog_data is None:
+        return None
+    satelite_data = catalog_data['satelites']
+    nuevo = {
+        'datos': satelite_data,
+        'indice': SatelliteCatalog(satelite_data),
+        'propagador': crearPropagador(satelite_data, catalog_data['tle_store']),
+        'tle': catalog_data['tle'],
+    }
+    actualizacion = None
+    # La versión solo cambia si cambió el contenido, así los clientes conservan su copia.
+    if catalogo['respuesta'] is None or anterior != satelite_data:
+        nuevo['version'] = catalogo['version'] + 1
+        with app.app_context():
+            nuevo['respuesta'] = encodeResponse({'Satellite Data': satelite_data}, version=etagCatalogo(nuevo['version']))
+        if catalog_data['diff'] is not None:
+            actualizacion = {'secuencia': nuevo['version'], 'diff': catalog_data['diff']}
+    with catalogo_lock:
+        catalogo.update(nuevo)
+        catalogo['cargado'] = time.monotonic()
+        if actualizacion is not None:
+            catalogo['diffs'].append((actualizacion['secuencia'], actualizacion['diff']))
+    return actualizacion
+
+def etagCatalogo(version, consulta=None):
+    """ETag of a version of the catalog, or of a query on it given as its sorted (parametro, valor) pairs."""
+    etag = f'catalogo-{ARRANQUE}-{version}'
+    if consulta is None:
+        return etag
+    return f'{etag}-{hashlib.sha1(repr(consulta).encode("utf-8")).hexdigest()[:12]}'
+
+def diffsDesde(secuencia):
+    """Diffs of the catalog after a version that a client already has.
+
+    Returns:
+    Dict with "secuencia", the current version, and "diffs", the list of {"secuencia", "diff"} to
+    apply in order; "diffs" is None when the history no longer reaches that version and the whole
+    catalog must be downloaded again from /satelliteData.
+    """
+    with catalogo_lock:
+        actual = catalogo['version']
+        diffs = list(catalogo['diffs'])
+    if secuencia > actual or (secuencia < actual and (not diffs or diffs[0][0] > secuencia + 1)):
+        return {'secuencia': actual, 'diffs': None}
+    return {'secuencia': actual, 'diffs': [{'secuencia': version, 'diff': diff} for version, diff in diffs if version > secuencia]}
+
+def refrescarCatalogo():
+    """Background task that refreshes the catalog when it expires, so its diffs reach the clients without waiting for a request."""
+    while True:
+        socketio.sleep(CATALOGO_TTL_SEGUNDOS)
+        try:
+            obtenerCatalogo()
+        except Exception as error:
+            print(f'No se pudo refrescar el catalogo: {error}')
+
+def crearPropagador(satelite_data, tle_store):
+    """Builds the batch propagator with the TLE of every satellite of the catalog."""
+    if tle_store is None:
+        return BatchPropagator([])
+    nombres = {sat['norad_cat_id']: sat.get('name') for sat in satelite_data}
+    return tle_store.propagador(tle_store.deNorad(nombres), nombres)
+
+def respuestaPrediccion(clave, calcular, version=None):
+    """Serves a prediction from the cache of encoded responses, computing it only when it is missing.
+
+    Parameters:
+    clave (tuple): Route and parameters that identify the prediction.
+    calcular (callable): Function that computes the payload of the response, a dict with one prediction.
+    version (callable, optional): Returns the version of a computed prediction, for its ETag, or None
+                                  to derive the ETag from the bytes.
+
+    Returns:
+    Flask Response, 304 if the client already has the same prediction.
+
+    Predictions that failed (None or with "Error") are not cached, so a SatNogs outage is not
+    served for the whole PREDICCION_TTL_SEGUNDOS.
+    """
+    encoded = predicciones_cache.get(clave)
+    if encoded is None:
+        payload = calcular()
+        prediccion = next(iter(payload.values()))
+        etag = version(prediccion) if version is not None and prediccion is not None else None
+        if etag is not None:
+            response = notModifiedResponse(etag)
+            if response is not None:
+                return response
+        with span('codificacion'):
+            encoded = encodeResponse(payload, version=etag)
+        if prediccion is not None and 'Error' not in prediccion:
+            predicciones_cache.put(clave, encoded)
+    return conditionalResponse(encoded)
    
 @app.route('/satelliteData', methods=['GET'])
 def getSatelliteData():
     """ API Call that obtains he list of Satellites from the database of Satnogs through an API request.
+        The response is cached and pre-compressed, and answers 304 when the client sends the current ETag.
+
+        Query parameters (all optional, without them the whole catalog is returned):
+        name: Prefix of the satellite name.
+        norad_cat_id: NORAD id, or several separated by commas.
+        status: Status of the satellite.
+        band: Band of the downlink of any transmitter (VHF, UHF, L, S, X...).
+        mode: Mode of any transmitter (FM, BPSK, CW...).
+        pass_within: Only satellites with a pass within the next N minutes.
+        cursor: Value of "Siguiente" of the previous page.
+        limit: Number of satellites per page.
+        fields: Fields to return separated by commas, "transmitters.<campo>" projects the transmitters.
+
+        Returns:
+        JSON file with a list of all the satellites that are alive, or the requested page with
+        "Siguiente" (cursor of the next page) and "Total" (satellites that match the filters).
+        The X-Catalogo-Secuencia header has the version of the catalog, to follow its "catalogo_diff" events.
+    """
+    estado_catalogo = obtenerCatalogo()
+    if estado_catalogo is None:
+        return jsonify({'Satellite Data': None})
+    if not request.args:
+        response = conditionalResponse(estado_catalogo['respuesta'])
+        response.headers['X-Catalogo-Secuencia'] = str(estado_catalogo['version'])
+        return response
+
+    try:
+        filtros = filtrosCatalogo(request.args)
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+
+    consulta = tuple(sorted(request.args.items(multi=True)))
+    clave = (estado_catalogo['version'], consulta)
+    encoded = consultas_cache.get(clave)
+    if encoded is None:
+        # Las consultas por pasadas próximas cambian con la hora, su ETag sale del contenido.
+        etag = None if 'pasa_en' in filtros else etagCatalogo(estado_catalogo['version'], consulta)
+        if etag is not None:
+            response = notModifiedResponse(etag)
+            if response is not None:
+                return response
+        satellites, siguiente, total = estado_catalogo['indice'].query(**filtros)
+        encoded = encodeResponse({'Satellite Data': satellites, 'Siguiente': siguiente, 'Total': total}, version=etag)
+        # Las consultas por pasadas próximas dependen de la hora, las demás solo de la versión del catalogo.
+        consultas_cache.put(clave, encoded, ttl=None if 'pasa_en' in filtros else CATALOGO_TTL_SEGUNDOS)
+    return conditionalResponse(encoded)
+
+@app.route('/satelliteData/diff', methods=['GET'])
+def getSatelliteDataDiff():
+    """ API Call that returns the changes of the catalog since a version, for the clients that missed "catalogo_diff" events.
+
+        Query parameters:
+        desde: Version of the catalog the client has, its last "secuencia".
+
+        Returns:
+        JSON with "secuencia", the current version, and "diffs", the diffs to apply in order, or None
+        if the client must download /satelliteData again.
+    """
+    try:
+        desde = int(request.args['desde'])
+    except (KeyError, ValueError):
+        return jsonify({'Error': 'Se requiere desde, la secuencia del catalogo'}), 400
+    if obtenerCatalogo() is None:
+        return jsonify({'secuencia': None, 'diffs': None})
+    return jsonify(diffsDesde(desde))
+
+def filtrosCatalogo(args):
+    """Translates the query parameters of /satelliteData to the arguments of SatelliteCatalog.query.
+
+    Raises:
+    ValueError: A numeric parameter is not a number.
+    """
+    filtros = {
+        'nombre': args.get('name'),
+        'estado': args.get('status'),
+        'banda': args.get('band'),
+        'modo': args.get('mode'),
+        'limite': int(args.get('limit', LIMITE_POR_DEFECTO)),
+    }
+    if args.get('norad_cat_id'):
+        filtros['norad_ids'] = [int(norad_cat_id) for norad_cat_id in args.get('norad_cat_id').split(',')]
+    if args.get('pass_within'):
+        filtros['pasa_en'] = float(args.get('pass_within'))
+    if args.get('cursor'):
+        filtros['cursor'] = int(args.get('cursor'))
+    if args.get('fields'):
+        filtros['campos'] = [campo.strip() for campo in args.get('fields').split(',') if campo.strip()]
+    return filtros
+
+@app.route('/transmitterSearch', methods=['GET'])
+def getTransmitterSearch():
+    """ API Call that searches the transmitters of the alive satellites by frequency, using the interval index of the catalog.
+
+        Query parameters:
+        min_mhz: Lower frequency of the window in MHz.
+        max_mhz: Upper frequency of the window in MHz (defaults to min_mhz).
+        direction: "downlink" (default) or "uplink".
+        alive: "false" to include the transmitters that are not alive.
+        pass_from: Local time (%Y-%m-%dT%H:%M:%S) from which the satellite must pass over the station.
+        pass_to: Local time (%Y-%m-%dT%H:%M:%S) until which the satellite must pass over the station.
+        pass_within: Alternative to pass_from/pass_to, pass within the next N minutes.
 
         Returns:
-        JSON file with a list of all the satellites that are alive
+        JSON object with the transmitters found, each one with the satellite name, NORAD id and the times of its next pass.
+    """
+    estado_catalogo = obtenerCatalogo()
+    if estado_catalogo is None:
+        return jsonify({'Transmisores': None})
+
+    try:
+        desde = float(request.args['min_mhz']) * 1e6
+        hasta = float(request.args.get('max_mhz', request.args['min_mhz'])) * 1e6
+        pasa_desde = None
+        pasa_hasta = None
+        if request.args.get('pass_within'):
+            pasa_desde = time.time()
+            pasa_hasta = pasa_desde + float(request.args['pass_within']) * 60
+        if request.args.get('pass_from'):
+            pasa_desde = fechaAEpoch(request.args['pass_from'])
+        if request.args.get('pass_to'):
+            pasa_hasta = fechaAEpoch(request.args['pass_to'])
+        transmisores = estado_catalogo['indice'].buscarTransmisores(
+            request.args.get('direction', 'downlink'),
+            desde,
+            hasta,
+            solo_vivos=request.args.get('alive', 'true').lower() != 'false',
+            pasa_desde=pasa_desde,
+            pasa_hasta=pasa_hasta)
+    except (KeyError, ValueError) as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+
+    return jsonify({'Transmisores': transmisores})
+
+@app.route('/cieloVisible', methods=['GET'])
+def getCieloVisible():
+    """ API Call that propagates every satellite of the catalog at once and returns the ones above the station.
+
+        Query parameters:
+        time: Chile/Continental time (%Y-%m-%dT%H:%M:%S) of the snapshot, defaults to now.
+        steps: Number of instants of the series, defaults to 1 (maximum 120).
+        step_seconds: Seconds between instants, defaults to 1.
+        min_el: Minimum elevation in degrees, defaults to 0.
+        station: Id of the station of the registry, defaults to the main station.
+
+        Returns: JSON object with the following data:
+                        "Cielo_visible" : [{
+                                            "Tiempo_Cordenada": "Tiempo de la instancia",
+                                            "Epoch": Tiempo de la instancia en segundos UNIX,
+                                            "Satelites": [{"norad_cat_id", "name", "az", "el", "rango_km"}],
+                                            }]
     """
-    satelite_data = getSatellitesData()
-    return jsonify({'Satellite Data': satelite_data})
+    estado_catalogo = obtenerCatalogo()
+    if estado_catalogo is None:
+        return jsonify({'Cielo_visible': None})
+
+    try:
+        if request.args.get('time'):
+            inicio = fechaAEpoch(request.args['time'])
+        else:
+            inicio = time.time()
+        pasos = max(1, min(int(request.args.get('steps', 1)), 120))
+        paso_segundos = float(request.args.get('step_seconds', 1))
+        elevacion_minima = float(request.args.get('min_el', 0))
+        estacion = getStation(request.args.get('station'))
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+
+    epochs = [inicio + paso * paso_segundos for paso in range(pasos)]
+    with span('cielo_visible'), PROPAGACION.labels('cielo_visible').time():
+        visibles = estado_catalogo['propagador'].visibles(epochs, estacion['lat'], estacion['long'], estacion['elev'], elevacion_minima)
+    with span('codificacion'):
+        cielo = [
+            {
+                'Tiempo_Cordenada': tiempo,
+                'Epoch': epoch,
+                'Satelites': satelites,
+            }
+            for tiempo, epoch, satelites in zip(formatearFechas(epochs), epochs, visibles)
+        ]
+        return jsonify({'Cielo_visible': cielo})
+
+def limitesRotor():
+    """Returns the (min_az, max_az, min_el, max_el) limits of the rotor from rotorMovementAPI.py, or the ROT2Prog defaults if it does not answer."""
+    try:
+        return requests.get(f'{ROTOR_API_URL}/limits', timeout=2).json()['limite']
+    except (requests.RequestException, ValueError, KeyError, TypeError) as error:
+        print(f'No se pudieron leer los limites del rotor: {error}')
+        return LIMITES_POR_DEFECTO
+
+@app.route('/planificarObservaciones', methods=['POST'])
+def postPlanificarObservaciones():
+    """ API Call that plans a conflict-free timetable of passes for the antenna.
+
+        Parameters(Given via request.get_json):
+        prioridades: NORAD ids ordered from the highest to the lowest priority.
+        horizonteHoras: Hours to plan from now, defaults to 24.
+        elevacionMinima: Passes with a lower maximum elevation are discarded, defaults to 0.
+        limites: [min_az, max_az, min_el, max_el] of the rotor, defaults to /limits of rotorMovementAPI.py, or the ROT2Prog limits if it does not answer.
+        velocidadAz, velocidadEl: Slew speed of the rotor in degrees per second.
+        incluirPrediccion: Adds the "Pasadas_predecidas" of every planned pass.
+        seguir: Sends the plan to rotorMovementAPI.py to be tracked, implies incluirPrediccion.
+
+        Returns: JSON object with the following data:
+                        "Plan" : [{
+                                "norad_cat_id", "nombre", "Tiempo_Inicio", "Tiempo_Fin", "max_el", "az_aos", "az_los", "el_aos", "el_los",
+                                "rotor_az_aos", "rotor_az_los": Azimut del rotor al inicio y al fin, con la vuelta elegida,
+                                "Giro_previo_s": Segundos de giro desde la pasada anterior,
+                                "Pasadas_predecidas": Solo si incluirPrediccion es true,
+                                }],
+                        "Candidatas" : Numero de pasadas consideradas,
+    """
+    estado_catalogo = obtenerCatalogo()
+    if estado_catalogo is None:
+        return jsonify({'Plan': None})
+
+    post_data = request.get_json()
+    try:
+        prioridades = [int(norad_cat_id) for norad_cat_id in post_data['prioridades']]
+        horizonte = float(post_data.get('horizonteHoras', 24)) * 3600
+        elevacion_minima = float(post_data.get('elevacionMinima', 0))
+        limites = tuple(float(limite) for limite in post_data.get('limites') or limitesRotor())
+        velocidad_az = float(post_data.get('velocidadAz', VELOCIDAD_AZ))
+        velocidad_el = float(post_data.get('velocidadEl', VELOCIDAD_EL))
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+    seguir = bool(post_data.get('seguir', False))
+    incluir_prediccion = seguir or bool(post_data.get('incluirPrediccion', False))
+
+    desde = time.time()
+    with span('candidatas'), PROPAGACION.labels('planificacion').time():
+        candidatas = pasadasCandidatas(estado_catalogo['tle'], prioridades, desde, desde + horizonte,
+                                       latitude, longitude, elevation, elevacion_minima, limites)
+    with span('planificacion'):
+        plan = planificar(candidatas, velocidad_az, velocidad_el)
+
+    for pasada in plan:
+        if incluir_prediccion:
+            with span('pasada'):
+                puntos = muestrearPasada(pasada, estado_catalogo['tle'], latitude, longitude, elevation)
+            pasada['Pasadas_predecidas'] = puntosAJson(puntos)
+        pasada['Tiempo_Inicio'] = formatearFecha(pasada.pop('aos'))
+        pasada['Tiempo_Fin'] = formatearFecha(pasada.pop('los'))
+
+    respuesta = {'Plan': plan, 'Candidatas': len({(pasada['norad_cat_id'], pasada['aos']) for pasada in candidatas})}
+    if seguir:
+        try:
+            with span('rotor'):
+                seguimiento = requests.post(f'{ROTOR_API_URL}/trackSchedule', json={'plan': plan}, timeout=10)
+                respuesta['Seguimiento'] = seguimiento.json()
+        except (requests.RequestException, ValueError) as error:
+            print(f'No se pudo enviar el plan al rotor: {error}')
+            respuesta['Seguimiento'] = {'Error': 'No se pudo enviar el plan al rotor'}
+    return jsonify(respuesta)
 
 @app.route('/pasadaSatelite', methods=['POST'])
 def getPasadaSatelite():
@@ -33,20 +480,64 @@ def getPasadaSatelite():
                         "Ciclo_computo" : Tiempo de cada posición,
                         "Pasadas_predecidas" : {
                                                 "Tiempo_Cordenada": "Tiempo de la cordenada en una instancia de tiempo",
+                                                "Epoch": Tiempo de la cordenada en segundos UNIX,
                                                 "az": Posicicón Azimuth que debe estar la antena en una instancia de tiempo,
                                                 "el": Posicicón Elevación que debe estar la antena en una instancia de tiempo,
                                                 "lat": Posicicón Latitud del satelite en una instancia de tiempo,
                                                 "long": Posicicón Longitud del satelite en una instancia de tiempo,
                                                 "elev": Elevación del satelite en una instancia de tiempo },
-                                                }
+                                                },
+                        "Doppler" : Rango, tasa de rango y frecuencias corregidas de los transmisores, solo si se envia "doppler": true
     """
     post_data = request.get_json()
     print(post_data)
     satellite_id = post_data.get('satelliteNoradCatId')
     print(satellite_id)
-    pasada_satelite = prediccionPasadaSatelite(satellite_id)
-    print('Rocogida la ruta')
-    return jsonify({'Pasada Satelite': pasada_satelite})
+    doppler = bool(post_data.get('doppler', False))
+    station_id = post_data.get('stationId')
+    try:
+        getStation(station_id)
+    except ValueError as error:
+        return jsonify({'Error': str(error)}), 400
+    # Con el archivo, la misma Prediccion_ID es la misma predicción: misma TLE y la primera pasada sin empezar.
+    return respuestaPrediccion(('pasadaSatelite', satellite_id, doppler, station_id),
+                               lambda: {'Pasada Satelite': prediccionPasadaSatelite(satellite_id, doppler=doppler, station_id=station_id)},
+                               lambda prediccion: prediccion.get('Prediccion_ID'))
+
+@app.route('/pasadaSateliteEstaciones', methods=['POST'])
+def getPasadaSateliteEstaciones():
+    """ Computes the next pass of the choseen satellite over several stations, sharing one propagation of the satellite.
+
+        Parameters(Given via request.get_json):
+        satelliteNoradCatId: NORAD id of the satellite.
+        estaciones: Ids of the stations, see /estaciones. Defaults to every registered station.
+        horizonteHoras: Hours to search for the pass, defaults to 24.
+
+        Returns: JSON object with the following data:
+                        "Satelite" : Nombre del Satellite,
+                        "Ultima_Actulizacion" : Ultimo perido de tiempo en el que fue Actualizado de la tle,
+                        "Estaciones" : {"<id estacion>": {"Tiempo_Inicio", "Tiempo_Termino", "Ciclo_computo", "Pasadas_predecidas"}},
+    """
+    post_data = request.get_json()
+    satellite_id = post_data.get('satelliteNoradCatId')
+    station_ids = post_data.get('estaciones') or [estacion['id'] for estacion in listStations()]
+    try:
+        horizonte = float(post_data.get('horizonteHoras', 24))
+        for station_id in station_ids:
+            getStation(station_id)
+    except ValueError as error:
+        return jsonify({'Error': str(error)}), 400
+    return respuestaPrediccion(('pasadaSateliteEstaciones', satellite_id, tuple(station_ids), horizonte),
+                               lambda: {'Pasada Satelite': prediccionPasadaEstaciones(satellite_id, station_ids, horizonte)})
+
+@app.route('/estaciones', methods=['GET'])
+def getEstaciones():
+    """ API Call that lists the ground stations of the registry.
+
+        Returns:
+        JSON with the id, lat, long and elev of every station.
+    """
+    return jsonify({'Estaciones': listStations()})
 
 @app.route('/rutaSatelite', methods=['POST'])
 def getRutaSatelite():
@@ -61,14 +552,28 @@ def getRutaSatelite():
                                                 "long": Posicicón Longitud del satelite en una instancia de tiempo,
                                                 "elev": Elevación del satelite en una instancia de tiempo,
                                                 }
+
+        Optional level of detail (Given via request.get_json):
+                        "tolerancia" : Distancia en grados (douglas-peucker) o area en grados cuadrados (visvalingam),
+                        "maxPuntos" : Cantidad maxima de puntos de la ruta,
+                        "metodo" : "douglas-peucker" (por defecto) o "visvalingam",
     """
     post_data = request.get_json()
     print(post_data)
     satellite_id = post_data.get('satelliteNoradCatId')
     print(satellite_id)
-    ruta_satelite = prediccionRutaSatelite(satellite_id)
-    print('Rocogida la ruta')
-    return jsonify({'Ruta Satelite': ruta_satelite})
+    station_id = post_data.get('stationId')
+    metodo = post_data.get('metodo', DOUGLAS_PEUCKER)
+    try:
+        getStation(station_id)
+        tolerancia = float(post_data['tolerancia']) if post_data.get('tolerancia') is not None else None
+        max_puntos = int(post_data['maxPuntos']) if post_data.get('maxPuntos') is not None else None
+        if metodo not in (DOUGLAS_PEUCKER, VISVALINGAM):
+            raise ValueError(f'Metodo de simplificacion desconocido: {metodo}')
+    except ValueError as error:
+        return jsonify({'Error': str(error)}), 400
+    return respuestaPrediccion(('rutaSatelite', satellite_id, station_id, tolerancia, max_puntos, metodo),
+                               lambda: {'Ruta Satelite': prediccionRutaSatelite(satellite_id, station_id, tolerancia, max_puntos, metodo)})
 
 @app.route('/pasadaCuerpoCeleste', methods=['POST'])
 def getPasadaCuerpoCeleste():
@@ -78,6 +583,7 @@ def getPasadaCuerpoCeleste():
                         "Cuerpo Celeste" : Nombre del Satellite,
                         "Pasadas_predecidas" : {
                                                 "Tiempo_Cordenada": "Tiempo de la cordenada en una instancia de tiempo",
+                                                "Epoch": Tiempo de la cordenada en segundos UNIX,
                                                 "az": Posicicón Azimuth que debe estar la antena en una instancia de tiempo,
                                                 "el": Posicicón Elevación que debe estar la antena en una instancia de tiempo,
                                                 }
@@ -86,9 +592,93 @@ def getPasadaCuerpoCeleste():
     print(post_data)
     celestial_object = post_data.get('selectedObject')
     print(celestial_object)
-    ruta_satelite = predictionCelestialBody(celestial_object)
-    print('Rocogida la pasada del cuerpo escogida')
-    return jsonify({'Pasada_Cuerpo': ruta_satelite})
+    station_id = post_data.get('stationId')
+    try:
+        getStation(station_id)
+    except ValueError as error:
+        return jsonify({'Error': str(error)}), 400
+    return respuestaPrediccion(('pasadaCuerpoCeleste', celestial_object, station_id),
+                               lambda: {'Pasada_Cuerpo': predictionCelestialBody(celestial_object, station_id)})
+
+def intervaloConsulta(args):
+    """Reads the interval of the archive queries: "fecha" (a Chile/Continental day, %Y-%m-%d), or "desde" and/or
+    "hasta" (%Y-%m-%dT%H:%M:%S), or "dias" (the last N days).
+
+    Returns:
+    (desde, hasta) UNIX epochs, None where the interval is open.
+
+    Raises:
+    ValueError: Invalid date.
+    """
+    if args.get('fecha'):
+        dia = datetime.date.fromisoformat(args['fecha'])
+        return fechaAEpoch(f'{dia.isoformat()}T00:00:00'), fechaAEpoch(f'{(dia + datetime.timedelta(days=1)).isoformat()}T00:00:00')
+    desde = fechaAEpoch(args['desde']) if args.get('desde') else None
+    hasta = fechaAEpoch(args['hasta']) if args.get('hasta') else None
+    if args.get('dias'):
+        desde = time.time() - float(args['dias']) * 86400
+    return desde, hasta
+
+@app.route('/archivo/pasadas', methods=['GET'])
+def getPasadasArchivadas():
+    """ API Call that lists the archived pass predictions, such as every pass of a satellite of the last month.
+
+        Query parameters (all optional):
+        norad_cat_id: NORAD id of the satellite.
+        station: Id of the station of the registry.
+        fecha, desde, hasta, dias: Interval of the AOS, see intervaloConsulta.
+
+        Returns:
+        JSON with "Pasadas", each one with its "Prediccion_ID", "Numero_Pasada", "Tiempo_Inicio",
+        "Tiempo_Termino", "max_el" and "TLE_Epoch", ordered by AOS.
+    """
+    if archivo is None:
+        return jsonify({'Pasadas': None})
+    try:
+        desde, hasta = intervaloConsulta(request.args)
+        norad_cat_id = int(request.args['norad_cat_id']) if request.args.get('norad_cat_id') else None
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+    return jsonify({'Pasadas': archivo.pasadas(norad_cat_id, request.args.get('station'), desde, hasta)})
+
+@app.route('/archivo/seguimientos', methods=['GET'])
+def getSeguimientosArchivados():
+    """ API Call that lists the passes tracked by the rotors, such as what was tracked on a day.
+
+        Query parameters (all optional):
+        norad_cat_id: NORAD id of the satellite.
+        fecha, desde, hasta, dias: Interval of the start of the tracking, see intervaloConsulta.
+
+        Returns:
+        JSON with "Seguimientos", each one with its rotor, task, session, prediction and satellite when
+        known, start, end and whether it was completed.
+    """
+    if archivo is None:
+        return jsonify({'Seguimientos': None})
+    try:
+        desde, hasta = intervaloConsulta(request.args)
+        norad_cat_id = int(request.args['norad_cat_id']) if request.args.get('norad_cat_id') else None
+    except ValueError as error:
+        return jsonify({'Error': f'Parametro invalido: {error}'}), 400
+    return jsonify({'Seguimientos': archivo.seguimientos(desde, hasta, norad_cat_id)})
+
+@app.route('/archivo/predicciones/<prediccion_id>', methods=['GET'])
+def getPrediccionArchivada(prediccion_id):
+    """ API Call that serves an archived pass prediction again, by the "Prediccion_ID" of /pasadaSatelite.
+
+        Returns:
+        JSON with "Pasada Satelite" as returned by /pasadaSatelite.
+    """
+    prediccion = prediccionArchivada(prediccion_id)
+    if prediccion is None:
+        return jsonify({'Error': f'No existe la prediccion {prediccion_id}'}), 404
+    # Una predicción archivada no cambia, su id es su versión.
+    response = notModifiedResponse(prediccion_id)
+    if response is not None:
+        return response
+    with span('codificacion'):
+        encoded = encodeResponse({'Pasada Satelite': prediccion}, version=prediccion_id)
+    return conditionalResponse(encoded)
 
 # Manejar conexión de clientes
 @socketio.on('connect')
@@ -101,8 +691,32 @@ def handle_connection_status():
     print('Cliente conectado')
     # Envía el estado actual al cliente cuando se conecta
     emit('Estado Conexion', 'conectado')
+    with catalogo_lock:
+        secuencia = catalogo['version'] if catalogo['datos'] is not None else None
+    if secuencia is not None:
+        emit('catalogo_secuencia', {'secuencia': secuencia})
+
+@socketio.on('catalogo_resync')
+def handle_catalogo_resync(data):
+    """Socket.IO event for a client that detected a gap in the sequence of "catalogo_diff".
+
+    Args:
+        data (dict): {"desde": last sequence applied by the client}.
+
+    Returns:
+    Acknowledgement with the result of diffsDesde.
+    """
+    try:
+        desde = int((data or {})['desde'])
+    except (KeyError, TypeError, ValueError):
+        return {'Error': 'Se requiere desde, la secuencia del catalogo'}
+    return diffsDesde(desde)
 
 if __name__ == '__main__':
     # "Production"
-    http_server = WSGIServer(('192.168.1.18', 5018), app)
+    socketio.start_background_task(refrescarCatalogo)
+    # Pasadas del archivo para el servicio de los rotores del mismo host, ver trackHandoff.py
+    if archivo is not None:
+        TrackHandoffServer(archivo).iniciar()
+    http_server = WSGIServer(('192.168.1.18', 5018), app, handler_class=WebSocketHandler)
     http_server.serve_forever()
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""Binary recording of the tracking sessions of the rotors.
+
+Every tracking session (track_prediction_task, track_celestial_object_task, track_schedule_task)
+records the setpoints sent with set and the positions read with status, with time.monotonic
+timestamps. The I/O thread of the controller only writes one row of a preallocated NumPy ring
+buffer per command; a background thread appends the new rows to the file of the session every
+INTERVALO_VACIADO seconds, so the control loop never waits for the disk.
+
+The files are sesiones/<sesion_id>.rot, append-only:
+
+    MAGIC (8 bytes) | largo de la cabecera (uint32 LE) | cabecera JSON | registros REGISTRO_SESION...
+
+The header keeps the wall-clock anchor of the monotonic clock, so the timestamps can be turned
+into UNIX epochs when the session is served. A crash loses the rows not yet flushed, up to
+INTERVALO_VACIADO seconds of them, and a record torn at the end of the file is skipped when it is read.
+Readings only exist when something asks the controller for its status (the telemetry of the
+clients or /status), so the pointing error is measured at those instants.
+"""
+import json
+import os
+import re
+import struct
+import threading
+import time
+
+import numpy as np
+
+from timeUtils import formatearFecha
+
+DIRECTORIO_SESIONES = 'sesiones'
+EXTENSION = '.rot'
+MAGIC = b'ROTSES01'
+VERSION = 1
+
+# Registros de una sesión: tiempo monotónico, tipo (CONSIGNA o LECTURA), azimut y elevación. 17 bytes cada uno.
+REGISTRO_SESION = np.dtype([('t', '<f8'), ('tipo', 'u1'), ('az', '<f4'), ('el', '<f4')])
+CONSIGNA = 0
+LECTURA = 1
+
+# Registros del anillo, suficiente para varios minutos de comandos aunque el vaciado se atrase.
+CAPACIDAD_ANILLO = 4096
+# Segundos entre escrituras del anillo al archivo.
+INTERVALO_VACIADO = 1.0
+# Puntos por defecto de las series de /sesiones/<id>.
+MAX_PUNTOS_SERIE = 1000
+
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+class SessionRecording:
+    """One tracking session being recorded: the ring buffer, its file and the thread that flushes it."""
+
+    def __init__(self, ruta, cabecera, capacidad=CAPACIDAD_ANILLO):
+        """Creates the file with its header and starts flushing the ring buffer.
+
+        Args:
+            ruta (str): Path of the .rot file.
+            cabecera (dict): Header of the session, see SessionRecorder.iniciar.
+            capacidad (int, optional): Records of the ring buffer.
+        """
+        self.ruta = ruta
+        self.cabecera = cabecera
+        self.perdidos = 0
+        self._anillo = np.zeros(capacidad, dtype=REGISTRO_SESION)
+        self._escritos = 0
+        self._vaciados = 0
+        self._lock = threading.Lock()
+        texto = json.dumps(cabecera).encode('utf-8')
+        self._archivo = open(ruta, 'xb')
+        self._archivo.write(MAGIC + struct.pack('<I', len(texto)) + texto)
+        self._archivo.flush()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._vaciarPeriodicamente, name=f'grabacion-{cabecera["sesion_id"]}', daemon=True)
+        self._hilo.start()
+
+    def registrar(self, tipo, az, el):
+        """Adds a setpoint or a reading to the ring buffer. Only called from the I/O thread of the controller."""
+        self._anillo[self._escritos % len(self._anillo)] = (time.monotonic(), tipo, az, el)
+        self._escritos += 1
+
+    def _vaciarPeriodicamente(self):
+        while not self._detener.wait(INTERVALO_VACIADO):
+            self.vaciar()
+
+    def vaciar(self):
+        """Appends to the file the records written since the last flush."""
+        with self._lock:
+            escritos = self._escritos
+            capacidad = len(self._anillo)
+            if escritos - self._vaciados > capacidad:
+                # El anillo dio la vuelta antes de vaciarse, los registros más antiguos ya se sobrescribieron.
+                self.perdidos += escritos - self._vaciados - capacidad
+                self._vaciados = escritos - capacidad
+            if escritos == self._vaciados or self._archivo.closed:
+                return
+            inicio = self._vaciados % capacidad
+            fin = escritos % capacidad
+            if inicio < fin:
+                self._archivo.write(self._anillo[inicio:fin].tobytes())
+            else:
+                self._archivo.write(self._anillo[inicio:].tobytes())
+                self._archivo.write(self._anillo[:fin].tobytes())
+            self._archivo.flush()
+            self._vaciados = escritos
+
+    def cerrar(self):
+        """Stops the flushing thread, flushes the last records and closes the file."""
+        self._detener.set()
+        self._hilo.join()
+        self.vaciar()
+        with self._lock:
+            self._archivo.close()
+        if self.perdidos:
+            print(f'Sesion {self.cabecera["sesion_id"]}: se perdieron {self.perdidos} registros')
+
+class SessionRecorder:
+    """Sessions of the rotors of the host, one file per session in *directorio*."""
+
+    def __init__(self, directorio=DIRECTORIO_SESIONES):
+        self.directorio = directorio
+        self._activas = {}
+        self._lock = threading.Lock()
+
+    def iniciar(self, rotor_id, tarea):
+        """Starts recording a tracking session.
+
+        Args:
+            rotor_id (str): Id of the controller.
+            tarea (str): Name of the tracking task.
+
+        Returns:
+            SessionRecording, to be closed with terminar.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        inicio_epoch = time.time()
+        base = re.sub(r'[^A-Za-z0-9_.-]', '_', f'{rotor_id}-{time.strftime("%Y%m%dT%H%M%S", time.gmtime(inicio_epoch))}')
+        with self._lock:
+            sesion_id = base
+            secuencia = 1
+            while sesion_id in self._activas or os.path.exists(self._ruta(sesion_id)):
+                secuencia += 1
+                sesion_id = f'{base}-{secuencia}'
+            cabecera = {
+                'version': VERSION,
+                'sesion_id': sesion_id,
+                'rotor_id': rotor_id,
+                'tarea': tarea,
+                'inicio_epoch': inicio_epoch,
+                'inicio_monotonico': time.monotonic(),
+                'registro': REGISTRO_SESION.descr,
+            }
+            grabacion = SessionRecording(self._ruta(sesion_id), cabecera)
+            self._activas[sesion_id] = grabacion
+        return grabacion
+
+    def terminar(self, grabacion):
+        """Closes a session started with iniciar."""
+        grabacion.cerrar()
+        with self._lock:
+            self._activas.pop(grabacion.cabecera['sesion_id'], None)
+
+    def _ruta(self, sesion_id):
+        return os.path.join(self.directorio, sesion_id + EXTENSION)
+
+    def listar(self, rotor_id=None):
+        """Returns the summary of every recorded session, the most recent first.
+
+        Args:
+            rotor_id (str, optional): Only the sessions of this controller.
+        """
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return []
+        sesiones = []
+        for nombre in nombres:
+            if not nombre.endswith(EXTENSION):
+                continue
+            try:
+                cabecera, largo_cabecera = leerCabecera(os.path.join(self.directorio, nombre))
+            except (OSError, ValueError):
+                continue
+            if rotor_id is not None and cabecera['rotor_id'] != rotor_id:
+                continue
+            registros = (os.path.getsize(os.path.join(self.directorio, nombre)) - largo_cabecera) // REGISTRO_SESION.itemsize
+            sesiones.append(resumenSesion(cabecera, registros, cabecera['sesion_id'] in self._activas))
+        sesiones.sort(key=lambda sesion: sesion['Epoch_Inicio'], reverse=True)
+        return sesiones
+
+    def leer(self, sesion_id):
+        """Reads a session, also while it is being recorded.
+
+        Returns:
+            (cabecera, registros, activa), registros as a REGISTRO_SESION array.
+
+        Raises:
+            KeyError: There is no session with that id.
+        """
+        ruta = self._ruta(sesion_id)
+        if not _ID_VALIDO.match(sesion_id) or not os.path.isfile(ruta):
+            raise KeyError(sesion_id)
+        cabecera, registros = leerSesion(ruta)
+        return cabecera, registros, sesion_id in self._activas
+
+def leerCabecera(ruta):
+    """Reads the header of a session file.
+
+    Returns:
+        (cabecera, largo), largo being the bytes before the first record.
+
+    Raises:
+        ValueError: The file is not a session file.
+    """
+    with open(ruta, 'rb') as archivo:
+        inicio = archivo.read(len(MAGIC) + 4)
+        if len(inicio) < len(MAGIC) + 4 or inicio[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{ruta} no es un archivo de sesion')
+        largo, = struct.unpack('<I', inicio[len(MAGIC):])
+        cabecera = json.loads(archivo.read(largo).decode('utf-8'))
+    return cabecera, len(MAGIC) + 4 + largo
+
+def leerSesion(ruta):
+    """Reads the header and the records of a session file, ignoring an incomplete last record.
+
+    Returns:
+        (cabecera, registros), registros as a REGISTRO_SESION array.
+    """
+    cabecera, largo = leerCabecera(ruta)
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(largo)
+        datos = archivo.read()
+    completos = len(datos) - len(datos) % REGISTRO_SESION.itemsize
+    return cabecera, np.frombuffer(datos[:completos], dtype=REGISTRO_SESION)
+
+def epochs(cabecera, t):
+    """Converts monotonic timestamps of a session to UNIX epochs."""
+    return cabecera['inicio_epoch'] + (t - cabecera['inicio_monotonico'])
+
+def resumenSesion(cabecera, registros, activa=False):
+    """Fields of a session in the /sesiones listing."""
+    return {
+        'id': cabecera['sesion_id'],
+        'rotorId': cabecera['rotor_id'],
+        'tarea': cabecera['tarea'],
+        'Tiempo_Inicio': formatearFecha(cabecera['inicio_epoch']),
+        'Epoch_Inicio': cabecera['inicio_epoch'],
+        'registros': int(registros),
+        'activa': activa,
+    }
+
+def submuestrear(cantidad, max_puntos):
+    """Indices of at most *max_puntos* points spread evenly over *cantidad* points, the first and last included."""
+    if cantidad <= max_puntos:
+        return np.arange(cantidad)
+    return np.unique(np.linspace(0, cantidad - 1, max(max_puntos, 2)).round().astype(np.int64))
+
+def serieSesion(cabecera, registros, max_puntos=MAX_PUNTOS_SERIE):
+    """Setpoints and readings of a session as columns, each one downsampled to *max_puntos*.
+
+    Returns:
+        Dict with "Consignas" and "Lecturas", each {"Epoch": [...], "az": [...], "el": [...]}.
+    """
+    serie = {}
+    for nombre, tipo in (('Consignas', CONSIGNA), ('Lecturas', LECTURA)):
+        puntos = registros[registros['tipo'] == tipo]
+        puntos = puntos[submuestrear(len(puntos), max_puntos)]
+        serie[nombre] = {
+            'Epoch': np.round(epochs(cabecera, puntos['t']), 3).tolist(),
+            'az': np.round(puntos['az'].astype(float), 1).tolist(),
+            'el': np.round(puntos['el'].astype(float), 1).tolist(),
+        }
+    return serie
+
+def _estadisticas(errores):
+    if len(errores) == 0:
+        return None
+    return {
+        'media': round(float(np.mean(errores)), 3),
+        'rms': round(float(np.sqrt(np.mean(np.square(errores)))), 3),
+        'p50': round(float(np.percentile(errores, 50)), 3),
+        'p95': round(float(np.percentile(errores, 95)), 3),
+        'max': round(float(np.max(errores)), 3),
+    }
+
+def errorApuntamiento(registros):
+    """Pointing error of a session: every reading against the last setpoint sent before it.
+
+    Returns:
+        Dict with the number of setpoints and compared readings, and the statistics (media, rms,
+        p50, p95, max) of the az and el errors and of the largest of both, in degrees.
+    """
+    registros = registros[np.argsort(registros['t'], kind='stable')]
+    consignas = registros[registros['tipo'] == CONSIGNA]
+    lecturas = registros[registros['tipo'] == LECTURA]
+    anterior = np.searchsorted(consignas['t'], lecturas['t'], side='right') - 1
+    comparables = anterior >= 0
+    lecturas = lecturas[comparables]
+    objetivo = consignas[anterior[comparables]]
+    error_az = np.abs(lecturas['az'].astype(float) - objetivo['az'])
+    error_el = np.abs(lecturas['el'].astype(float) - objetivo['el'])
+    return {
+        'consignas': int(len(consignas)),
+        'lecturas': int(len(lecturas)),
+        'az': _estadisticas(error_az),
+        'el': _estadisticas(error_el),
+        'total': _estadisticas(np.maximum(error_az, error_el)),
+    }
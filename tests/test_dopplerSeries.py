@@ -0,0 +1,72 @@
+"""Range and range-rate of dopplerSeries against ephem over the pass of the fixtures of the benchmarks.
+
+    python -m unittest discover tests
+"""
+import json
+import math
+import os
+import sys
+import unittest
+
+import ephem
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(RAIZ, 'benchmarks', 'fixtures')
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from batchPropagation import BatchPropagator
+from dopplerSeries import dopplerPasada, rangoYTasaRango
+from timeUtils import ephemAEpoch, epochAEphem
+
+# Diferencias entre el SGP4 de ephem y el de sgp4 a lo largo de una pasada.
+TOLERANCIA_RANGO_M = 200.0
+TOLERANCIA_TASA_RANGO_M_S = 0.5
+
+class RangoYTasaRangoTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(FIXTURES, 'escenario.json')) as archivo:
+            escenario = json.load(archivo)
+        with open(os.path.join(FIXTURES, 'config.json')) as archivo:
+            config = json.load(archivo)
+        with open(os.path.join(FIXTURES, 'tle.json')) as archivo:
+            tle = next(tle for tle in json.load(archivo) if tle['norad_cat_id'] == escenario['norad_cat_id'])
+
+        cls.estacion = (float(config['lat']), float(config['long']), float(config['elev']))
+        satellite = ephem.readtle(tle['tle0'], tle['tle1'], tle['tle2'])
+        obs = ephem.Observer()
+        obs.lat, obs.long, obs.elev = config['lat'], config['long'], config['elev']
+        obs.date = epochAEphem(escenario['reloj'])
+        tr, _, _, _, ts, _ = obs.next_pass(satellite)
+
+        cls.tiempos = np.arange(ephemAEpoch(tr), ephemAEpoch(ts), 2.0)
+        rangos = []
+        tasas = []
+        for tiempo in cls.tiempos:
+            obs.date = epochAEphem(tiempo)
+            satellite.compute(obs)
+            rangos.append(satellite.range)
+            tasas.append(satellite.range_velocity)
+        cls.rango_ephem = np.array(rangos)
+        cls.tasa_ephem = np.array(tasas)
+        cls.propagador = BatchPropagator([(tle['norad_cat_id'], tle['tle0'], tle['tle1'], tle['tle2'])])
+
+    def test_coincide_con_ephem(self):
+        rango, tasa_rango = rangoYTasaRango(self.propagador, self.tiempos, *self.estacion)
+        self.assertLess(np.abs(rango - self.rango_ephem).max(), TOLERANCIA_RANGO_M)
+        self.assertLess(np.abs(tasa_rango - self.tasa_ephem).max(), TOLERANCIA_TASA_RANGO_M_S)
+
+    def test_doppler_de_la_tasa_de_rango(self):
+        doppler = dopplerPasada(self.propagador, self.tiempos, *self.estacion,
+                                [{'uuid': 'u', 'downlink_low': 437000000, 'uplink_low': None}])
+        esperado = 437000000 * (1 - self.tasa_ephem / 299792458.0)
+        corregido = np.array(doppler['Transmisores'][0]['Downlink_corregido'])
+        # 0.5 m/s de tasa de rango son 0.7 Hz a 437 MHz.
+        self.assertLess(np.abs(corregido - esperado).max(), 2.0)
+        self.assertTrue(math.isclose(doppler['Rango_km'][0], self.rango_ephem[0] / 1000, abs_tol=TOLERANCIA_RANGO_M / 1000))
+
+if __name__ == '__main__':
+    unittest.main()
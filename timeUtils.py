@@ -0,0 +1,63 @@
+"""Time handling shared by the predictors and the trackers.
+
+Every instant is kept as a UNIX epoch in seconds (UTC float) from the propagation to the tracking
+of the rotor. Dates are only turned into Chile/Continental ISO strings when a response is
+serialised, and only read back from them when a request brings nothing else.
+"""
+from datetime import datetime
+
+import ephem
+import numpy as np
+import pytz
+
+ZONA_HORARIA = pytz.timezone('Chile/Continental')
+FORMATO_FECHA = '%Y-%m-%dT%H:%M:%S'
+
+# Fecha de ephem (días desde 1899-12-31 12:00 UTC) del epoch UNIX.
+EPOCH_EPHEM = 25567.5
+# Los cambios de horario ocurren en múltiplos de este bloque, en segundos.
+BLOQUE_DESPLAZAMIENTO = 900
+
+def ephemAEpoch(fecha):
+    """Converts an ephem date to a UNIX epoch in seconds."""
+    return (float(fecha) - EPOCH_EPHEM) * 86400.0
+
+def epochAEphem(epoch):
+    """Converts a UNIX epoch in seconds to an ephem date."""
+    return ephem.Date(epoch / 86400.0 + EPOCH_EPHEM)
+
+def formatearFecha(epoch):
+    """Formats a UNIX epoch as a Chile/Continental date of the API responses."""
+    return datetime.fromtimestamp(epoch, ZONA_HORARIA).strftime(FORMATO_FECHA)
+
+def formatearFechas(epochs):
+    """Formats many UNIX epochs at once, as formatearFecha.
+
+    The UTC offset is only looked up once per block of BLOQUE_DESPLAZAMIENTO seconds, and the dates
+    are written by NumPy, so a series of thousands of points costs a few lookups.
+
+    Returns:
+    List of strings.
+    """
+    segundos = np.floor(np.asarray(epochs, dtype=float) + 5e-7).astype(np.int64)
+    if len(segundos) == 0:
+        return []
+    bloques, posicion = np.unique(segundos // BLOQUE_DESPLAZAMIENTO, return_inverse=True)
+    desplazamientos = np.array([
+        datetime.fromtimestamp(int(bloque) * BLOQUE_DESPLAZAMIENTO, ZONA_HORARIA).utcoffset().total_seconds()
+        for bloque in bloques
+    ], dtype=np.int64)
+    locales = (segundos + desplazamientos[posicion]).astype('datetime64[s]')
+    return np.datetime_as_string(locales, unit='s').tolist()
+
+def fechaAEpoch(fecha):
+    """Reads a Chile/Continental date of the API, such as 2024-05-01T12:00:00, as a UNIX epoch.
+
+    Raises:
+    ValueError: The text is not a date.
+    """
+    return ZONA_HORARIA.localize(datetime.strptime(fecha, FORMATO_FECHA)).timestamp()
+
+def fechaSatNogsAEpoch(fecha):
+    """Converts an "updated" date of SatNogs, such as 2024-05-01T12:00:00.123456+0000, to a UNIX epoch."""
+    return datetime.strptime(fecha[:-5], '%Y-%m-%dT%H:%M:%S.%f').replace(tzinfo=pytz.utc).timestamp()
@@ -0,0 +1,264 @@
+"""Columnar store of the TLEs of the whole catalog.
+
+The TLE list of SatNogs is parsed once per refresh into NumPy arrays: NORAD id, update time, TLE
+epoch and the mean elements of line 2 (inclination, RAAN, eccentricity, argument of perigee, mean
+anomaly, mean motion) plus B*. The fixed-width fields of the lines are cut and converted for all
+the satellites together, so the staleness filter and the orbit classes are array operations
+instead of a strptime and a comparison per satellite.
+
+Rows are kept in the order of SatNogs, only the first TLE of each NORAD id, and the lines are
+kept as text for ephem, sgp4 and the TLERecord of the predictions.
+
+The visibility from a station is also classified for the whole catalog at once, so the pass search
+only runs for the satellites that can rise and set there: an orbit whose inclination plus the
+horizon angle at its apogee does not reach the latitude of the station is never seen, and a
+stationary satellite stays above or below the horizon, at the az/el it has now.
+"""
+import bisect
+
+import numpy as np
+
+from batchPropagation import BatchPropagator
+from predictionRecords import TLERecord
+
+# Antigüedad máxima de la TLE para hacer una predicción, si es mayor puede significar un error con el satelite.
+VIGENCIA_TLE_SEGUNDOS = 3 * 24 * 3600
+
+LARGO_LINEA = 69
+
+# Clases de órbita según el movimiento medio (revoluciones por día) y la excentricidad.
+LEO = 'LEO'
+MEO = 'MEO'
+GEO = 'GEO'
+HEO = 'HEO'
+CLASES_ORBITA = (LEO, MEO, GEO, HEO)
+# Periodo menor a 128 minutos.
+MOVIMIENTO_MINIMO_LEO = 11.25
+MOVIMIENTO_GEO = (0.95, 1.05)
+EXCENTRICIDAD_MAXIMA_GEO = 0.01
+EXCENTRICIDAD_MINIMA_HEO = 0.25
+
+# Visibilidad desde una estación.
+NUNCA = 'nunca'
+SIEMPRE = 'siempre'
+PASA = 'pasa'
+MU_TIERRA = 398600.4418
+RADIO_TIERRA = 6378.137
+# Revoluciones por día de una órbita geoestacionaria, y diferencia máxima para considerarla estacionaria (≈1°/día de deriva).
+MOVIMIENTO_SIDEREO = 1.00273791
+DERIVA_MAXIMA_ESTACIONARIO = 0.003
+# Grados de margen de la clasificación, que cubren la latitud geocéntrica y la perturbación de los elementos medios.
+MARGEN_VISIBILIDAD = 2.0
+
+def _lineas(textos):
+    # Matriz de bytes (n, LARGO_LINEA) con las lineas completadas con espacios.
+    lineas = np.char.ljust(np.array(textos, dtype=f'S{LARGO_LINEA}'), LARGO_LINEA)
+    return lineas.view(np.uint8).reshape(len(textos), LARGO_LINEA)
+
+def _campo(lineas, inicio, fin, prefijo=b''):
+    """Converts the columns [inicio, fin) of every line to float, NaN where the field is not a number."""
+    textos = np.ascontiguousarray(lineas[:, inicio:fin]).view(f'S{fin - inicio}').ravel()
+    if prefijo:
+        textos = np.char.add(prefijo, textos)
+    try:
+        return textos.astype(np.float64)
+    except ValueError:
+        # Alguna TLE mal formada, se convierten una por una para no perder las demás.
+        valores = np.full(len(textos), np.nan)
+        for indice, texto in enumerate(textos):
+            try:
+                valores[indice] = float(texto)
+            except ValueError:
+                pass
+        return valores
+
+def _epochTLE(lineas):
+    """UNIX epochs of the TLE epochs (YYDDD.DDDDDDDD, columns 19-32 of line 1)."""
+    anio = _campo(lineas, 18, 20)
+    anio = np.where(anio < 57, 2000 + anio, 1900 + anio)
+    dia = _campo(lineas, 20, 32)
+    valido = ~(np.isnan(anio) | np.isnan(dia))
+    inicio_anio = np.zeros(len(anio))
+    inicio_anio[valido] = (anio[valido].astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[s]').astype(np.float64)
+    return np.where(valido, inicio_anio + (dia - 1) * 86400.0, np.nan)
+
+def epochsTLE(tle1):
+    """UNIX epochs of the TLE epochs of a list of lines 1."""
+    return _epochTLE(_lineas(tle1))
+
+def _bstar(lineas):
+    """B* of line 1 (columns 54-61, mantissa with implied decimal point and exponent)."""
+    signo = np.where(lineas[:, 53] == ord('-'), -1.0, 1.0)
+    mantisa = _campo(lineas, 54, 59) / 1e5
+    exponente = _campo(lineas, 59, 61)
+    return signo * mantisa * np.power(10.0, exponente)
+
+def _epochActualizado(fechas):
+    """UNIX epochs of the "updated" dates of SatNogs, such as 2024-05-01T12:00:00.123456+0000."""
+    sin_zona = np.char.replace(np.array(fechas, dtype=str), '+0000', '')
+    try:
+        return sin_zona.astype('datetime64[us]').astype(np.float64) / 1e6
+    except ValueError:
+        valores = np.full(len(sin_zona), np.nan)
+        for indice, fecha in enumerate(sin_zona):
+            try:
+                valores[indice] = np.datetime64(fecha, 'us').astype(np.float64) / 1e6
+            except ValueError:
+                pass
+        return valores
+
+class TLEStore:
+    """TLEs of the catalog as columns, one row per satellite."""
+
+    def __init__(self, norad_ids, tle0, tle1, tle2, actualizado):
+        """Parses the lines of the TLEs.
+
+        Args:
+            norad_ids (list): NORAD id of every TLE.
+            tle0, tle1, tle2 (list): Lines of every TLE, tle0 with the name.
+            actualizado (array): UNIX epoch of the last update of every TLE in SatNogs.
+        """
+        norad_ids = np.array([-1 if norad is None else norad for norad in norad_ids], dtype=np.int64)
+        # Solo la primera TLE de cada satelite, que es la que se usa para el computo.
+        _, primeras = np.unique(norad_ids, return_index=True)
+        filas = np.sort(primeras[norad_ids[primeras] >= 0])
+
+        self.norad_ids = norad_ids[filas]
+        self.tle0 = [tle0[fila] for fila in filas]
+        self.tle1 = [tle1[fila] for fila in filas]
+        self.tle2 = [tle2[fila] for fila in filas]
+        self.actualizado = np.asarray(actualizado, dtype=np.float64)[filas]
+
+        self.nombres = [tle[2:] if tle.startswith('0 ') else tle for tle in self.tle0]
+
+        linea1 = _lineas(self.tle1)
+        linea2 = _lineas(self.tle2)
+        self.epoch = _epochTLE(linea1)
+        self.bstar = _bstar(linea1)
+        self.inclinacion = _campo(linea2, 8, 16)
+        self.raan = _campo(linea2, 17, 25)
+        self.excentricidad = _campo(linea2, 26, 33, b'0.')
+        self.argumento_perigeo = _campo(linea2, 34, 42)
+        self.anomalia_media = _campo(linea2, 43, 51)
+        self.movimiento_medio = _campo(linea2, 52, 63)
+        self.clase = self._clasesOrbita()
+
+        self._fila_norad = {int(norad): fila for fila, norad in enumerate(self.norad_ids)}
+        self._nombres_ordenados = sorted((nombre.upper(), fila) for fila, nombre in enumerate(self.nombres))
+
+    @classmethod
+    def fromSatNogs(cls, items):
+        """Builds the store from the TLEs as returned by the SatNogs API, read in a single pass."""
+        norad_ids, tle0, tle1, tle2, actualizado = [], [], [], [], []
+        for item in items:
+            norad_ids.append(item.get('norad_cat_id'))
+            tle0.append(item['tle0'])
+            tle1.append(item['tle1'])
+            tle2.append(item['tle2'])
+            actualizado.append(item['updated'])
+        return cls(norad_ids, tle0, tle1, tle2, _epochActualizado(actualizado))
+
+    def __len__(self):
+        return len(self.norad_ids)
+
+    def _clasesOrbita(self):
+        n = self.movimiento_medio
+        e = self.excentricidad
+        return np.select(
+            [e >= EXCENTRICIDAD_MINIMA_HEO,
+             n >= MOVIMIENTO_MINIMO_LEO,
+             (n >= MOVIMIENTO_GEO[0]) & (n <= MOVIMIENTO_GEO[1]) & (e < EXCENTRICIDAD_MAXIMA_GEO)],
+            [HEO, LEO, GEO],
+            default=MEO)
+
+    def vigentes(self, ahora, vigencia=VIGENCIA_TLE_SEGUNDOS):
+        """Mask of the TLEs updated in SatNogs less than *vigencia* seconds before the UNIX epoch *ahora*."""
+        return (ahora - self.actualizado) <= vigencia
+
+    def deClase(self, *clases):
+        """Mask of the TLEs of the given orbit classes (LEO, MEO, GEO, HEO)."""
+        return np.isin(self.clase, clases)
+
+    def visibilidad(self, lat, lon, elev, ahora):
+        """Classifies the visibility of every satellite from a station.
+
+        NUNCA: the latitude of the station is farther from the ground track than the horizon of the
+        apogee. SIEMPRE: stationary and above the horizon with room for its daily oscillation.
+        PASA: any other, including stationary satellites near the horizon and rows that can not be
+        classified, which go through the pass search.
+
+        Args:
+            lat, lon (float): Latitude and longitude of the station in degrees.
+            elev (float): Elevation of the station in meters.
+            ahora (float): UNIX epoch of the az/el of the stationary satellites.
+
+        Returns:
+            Array of NUNCA, SIEMPRE or PASA, and the arrays of azimuth and elevation in degrees, NaN
+            for the satellites that are not stationary.
+        """
+        lat = float(lat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = self.movimiento_medio * 2 * np.pi / 86400.0
+            semieje = np.cbrt(MU_TIERRA / (n * n))
+            horizonte = np.degrees(np.arccos(RADIO_TIERRA / (semieje * (1 + self.excentricidad))))
+        latitud_maxima = np.minimum(self.inclinacion, 180.0 - self.inclinacion)
+        visibilidad = np.where(abs(lat) > latitud_maxima + horizonte + MARGEN_VISIBILIDAD, NUNCA, PASA).astype('U7')
+
+        az = np.full(len(self), np.nan)
+        el = np.full(len(self), np.nan)
+        estacionarios = self.deClase(GEO) & (abs(self.movimiento_medio - MOVIMIENTO_SIDEREO) < DERIVA_MAXIMA_ESTACIONARIO)
+        if estacionarios.any():
+            propagador = self.propagador(estacionarios)
+            # El propagador omite las TLE que sgp4 no puede leer, esas quedan como PASA.
+            filas = np.array([self._fila_norad[int(norad)] for norad in propagador.norad_ids], dtype=np.intp)
+            az_ahora, el_ahora, _, _, valido = propagador.lookAngles([ahora], lat, lon, elev)
+            valido = valido[:, 0]
+            filas = filas[valido]
+            az[filas] = az_ahora[valido, 0]
+            el[filas] = el_ahora[valido, 0]
+            # En un día la elevación varía a lo sumo lo que la inclinación, la libración por la excentricidad y la deriva.
+            oscilacion = (self.inclinacion[filas] + np.degrees(2 * self.excentricidad[filas])
+                          + abs(self.movimiento_medio[filas] - MOVIMIENTO_SIDEREO) * 360.0) * 1.2 + MARGEN_VISIBILIDAD
+            visibilidad[filas] = np.select([el[filas] > oscilacion, el[filas] < -oscilacion], [SIEMPRE, NUNCA], default=PASA)
+        return visibilidad, az, el
+
+    def deNorad(self, norad_ids):
+        """Mask of the TLEs of the given NORAD ids."""
+        return np.isin(self.norad_ids, [norad for norad in norad_ids if norad is not None])
+
+    def fila(self, norad_cat_id):
+        """Row of a satellite, None if there is no TLE for it."""
+        return self._fila_norad.get(norad_cat_id)
+
+    def buscarNombre(self, prefijo):
+        """Rows of the satellites whose name starts with *prefijo*, ignoring case, in name order."""
+        prefijo = prefijo.upper()
+        inicio = bisect.bisect_left(self._nombres_ordenados, (prefijo,))
+        filas = []
+        for nombre, fila in self._nombres_ordenados[inicio:]:
+            if not nombre.startswith(prefijo):
+                break
+            filas.append(fila)
+        return filas
+
+    def registro(self, fila):
+        """TLERecord of a row."""
+        return TLERecord(int(self.norad_ids[fila]), self.tle0[fila], self.tle1[fila], self.tle2[fila], float(self.actualizado[fila]))
+
+    def registros(self, mascara=None):
+        """TLERecord of the rows of a mask, all of them by default, by NORAD id."""
+        filas = range(len(self)) if mascara is None else np.flatnonzero(mascara)
+        return {int(self.norad_ids[fila]): self.registro(fila) for fila in filas}
+
+    def propagador(self, mascara=None, nombres=None):
+        """BatchPropagator of the rows of a mask, all of them by default.
+
+        Args:
+            mascara (array, optional): Boolean mask of the rows.
+            nombres (dict, optional): Names to use by NORAD id instead of the name of the TLE.
+        """
+        filas = range(len(self)) if mascara is None else np.flatnonzero(mascara)
+        nombres = nombres or {}
+        return BatchPropagator(
+            (int(self.norad_ids[fila]), nombres.get(int(self.norad_ids[fila]), self.nombres[fila]), self.tle1[fila], self.tle2[fila])
+            for fila in filas)
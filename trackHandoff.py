@@ -0,0 +1,214 @@
+"""Handoff of the passes of archived predictions from the prediction service to the rotor service of the host.
+
+The prediction service listens on a Unix socket in the directory of the archive that both services
+share (see predictionArchive.py). The rotor service sends one JSON line with the prediction id
+and the number of the pass, and receives one JSON line with the name of a shared-memory segment,
+its number of points and the satellite of the pass. The points are PUNTO_PASADA rows that the
+rotor reads in place as a NumPy array over the segment, so starting a track only moves the id
+through the browser and a few bytes through the socket.
+
+Each pass is copied from the archive to its segment the first time it is asked for, and the
+segment is kept for the following attaches, the most recent SEGMENTOS_MAXIMOS passes. A rotor that
+attached a segment keeps reading it after it is evicted, until it closes it.
+"""
+import collections
+import json
+import os
+import socket
+import socketserver
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from predictionRecords import PUNTO_PASADA
+
+SOCKET_PASADAS = 'pasadas.sock'
+SEGMENTOS_MAXIMOS = 64
+TIMEOUT_SEGUNDOS = 5.0
+
+# Segmentos creados por este proceso, que su resource_tracker ya conoce.
+_creados = set()
+
+def rutaSocket(archivo):
+    """Path of the socket of the handoff for a PredictionArchive."""
+    return os.path.join(archivo.directorio, SOCKET_PASADAS)
+
+class _Manejador(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            pedido = json.loads(self.rfile.readline())
+            prediccion_id = str(pedido['prediccion_id'])
+            numero_pasada = int(pedido.get('numero_pasada', 1))
+        except (KeyError, TypeError, ValueError) as error:
+            respuesta = {'Error': f'Pedido invalido: {error}'}
+        else:
+            try:
+                respuesta = self.server.handoff.segmento(prediccion_id, numero_pasada)
+            except KeyError as error:
+                respuesta = {'Error': f'No existe la pasada {error.args[0]}'}
+            except Exception as error:
+                # Un archivo o una memoria compartida que fallan no dejan al rotor sin respuesta.
+                print(f'No se pudo compartir la pasada {prediccion_id}/{numero_pasada}: {error}')
+                respuesta = {'Error': f'No se pudo compartir la pasada: {error}', 'Interno': True}
+        self.wfile.write(json.dumps(respuesta).encode('utf-8') + b'\n')
+
+class _Servidor(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TrackHandoffServer:
+    """Side of the prediction service: serves the passes of its archive in shared memory."""
+
+    def __init__(self, archivo, ruta=None, maximo=SEGMENTOS_MAXIMOS):
+        """
+        Args:
+            archivo (PredictionArchive): Archive of the predictions.
+            ruta (str, optional): Path of the socket, rutaSocket(archivo) by default.
+            maximo (int, optional): Segments kept at a time.
+        """
+        self.archivo = archivo
+        self.ruta = ruta or rutaSocket(archivo)
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        # (prediccion_id, numero_pasada) -> (SharedMemory, descripción), el más reciente al final.
+        self._segmentos = collections.OrderedDict()
+        self._servidor = None
+
+    def iniciar(self):
+        """Starts listening on the socket in a background thread, replacing the socket of a previous run."""
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+        self._servidor = _Servidor(self.ruta, _Manejador)
+        self._servidor.handoff = self
+        threading.Thread(target=self._servidor.serve_forever, name='handoff-pasadas', daemon=True).start()
+        return self
+
+    def detener(self):
+        """Stops listening and removes the socket and every segment."""
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+            if os.path.exists(self.ruta):
+                os.unlink(self.ruta)
+        with self._lock:
+            while self._segmentos:
+                self._liberar(self._segmentos.popitem(last=False)[1][0])
+
+    def segmento(self, prediccion_id, numero_pasada=1):
+        """Returns the description of the segment of a pass, copying the pass from the archive if it has none yet.
+
+        Returns:
+            Dict with "segmento" (name of the SharedMemory), "puntos", "prediccion_id", "numero_pasada",
+            "norad_cat_id", "satelite", "aos" and "los".
+
+        Raises:
+            KeyError: The prediction or the pass is not in the archive.
+        """
+        clave = (prediccion_id, numero_pasada)
+        with self._lock:
+            if clave in self._segmentos:
+                self._segmentos.move_to_end(clave)
+                return self._segmentos[clave][1]
+
+        leida = self.archivo.leerPrediccion(prediccion_id)
+        if leida is None:
+            raise KeyError(f'{prediccion_id}/{numero_pasada}')
+        prediccion, pasadas = leida
+        pasada = next((pasada for pasada in pasadas if pasada is not None and pasada.numero == numero_pasada), None)
+        if pasada is None:
+            raise KeyError(f'{prediccion_id}/{numero_pasada}')
+
+        memoria = shared_memory.SharedMemory(create=True, size=max(1, pasada.puntos.nbytes))
+        _creados.add(memoria.name)
+        destino = np.ndarray(len(pasada.puntos), dtype=PUNTO_PASADA, buffer=memoria.buf)
+        destino[:] = pasada.puntos
+        # La vista tiene que desaparecer antes de cerrar el segmento.
+        del destino
+        descripcion = {
+            'segmento': memoria.name,
+            'puntos': len(pasada.puntos),
+            'prediccion_id': prediccion_id,
+            'numero_pasada': numero_pasada,
+            'norad_cat_id': prediccion['norad_cat_id'],
+            'satelite': prediccion['satelite'],
+            'aos': pasada.inicio,
+            'los': pasada.fin,
+        }
+        with self._lock:
+            if clave in self._segmentos:
+                # Otro pedido de la misma pasada lo creó mientras tanto.
+                self._liberar(memoria)
+                return self._segmentos[clave][1]
+            self._segmentos[clave] = (memoria, descripcion)
+            while len(self._segmentos) > self.maximo:
+                self._liberar(self._segmentos.popitem(last=False)[1][0])
+        return descripcion
+
+    @staticmethod
+    def _liberar(memoria):
+        _creados.discard(memoria.name)
+        memoria.close()
+        memoria.unlink()
+
+class PasadaCompartida:
+    """Pass attached from the shared memory of the prediction service, with its points as a read-only PUNTO_PASADA array."""
+
+    def __init__(self, descripcion):
+        self.descripcion = descripcion
+        self._memoria = shared_memory.SharedMemory(name=descripcion['segmento'])
+        # El segmento lo crea y lo borra el servicio de predicciones, no este proceso.
+        if self._memoria.name not in _creados:
+            resource_tracker.unregister(self._memoria._name, 'shared_memory')
+        self.puntos = np.ndarray(descripcion['puntos'], dtype=PUNTO_PASADA, buffer=self._memoria.buf)
+        self.puntos.flags.writeable = False
+
+    def cerrar(self):
+        """Detaches the segment. The points can not be read after this."""
+        self.puntos = None
+        try:
+            self._memoria.close()
+        except BufferError:
+            # Queda alguna vista de los puntos, el segmento se desmapea cuando se recolecte.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+def adjuntarPasada(ruta, prediccion_id, numero_pasada=1, timeout=TIMEOUT_SEGUNDOS):
+    """Attaches a pass of an archived prediction from the prediction service.
+
+    Args:
+        ruta (str): Path of the socket of the prediction service, see rutaSocket.
+        prediccion_id (str): "Prediccion_ID" of /pasadaSatelite.
+        numero_pasada (int, optional): Number of the pass in the prediction.
+
+    Returns:
+        The PasadaCompartida, to close when it is no longer read.
+
+    Raises:
+        KeyError: The prediction service does not have the pass.
+        OSError: The prediction service is not listening, failed or did not give a valid answer.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexion:
+        conexion.settimeout(timeout)
+        conexion.connect(ruta)
+        conexion.sendall(json.dumps({'prediccion_id': prediccion_id, 'numero_pasada': numero_pasada}).encode('utf-8') + b'\n')
+        with conexion.makefile('rb') as lector:
+            linea = lector.readline()
+    try:
+        respuesta = json.loads(linea)
+    except ValueError:
+        respuesta = None
+    if not isinstance(respuesta, dict):
+        raise ConnectionError(f'Respuesta invalida del servicio de predicciones: {linea[:100]!r}')
+    if respuesta.get('Interno'):
+        raise ConnectionError(respuesta['Error'])
+    if 'Error' in respuesta:
+        raise KeyError(respuesta['Error'])
+    return PasadaCompartida(respuesta)
@@ -0,0 +1,92 @@
+"""Sorted interval index over the frequencies of the SatNogs transmitters.
+
+The transmitters are sorted by the lower frequency of their range, and a balanced tree over that
+order keeps the maximum upper frequency of every subtree. Finding the transmitters that overlap a
+frequency window visits O(log n + k) nodes instead of scanning the whole list.
+"""
+
+class FrequencyIntervalIndex:
+    """Static interval tree over (low, high, item) tuples, frequencies in Hz."""
+
+    def __init__(self, intervalos):
+        intervalos = sorted(intervalos, key=lambda intervalo: (intervalo[0], intervalo[1]))
+        self._lows = [low for low, _, _ in intervalos]
+        self._highs = [high for _, high, _ in intervalos]
+        self._items = [item for _, _, item in intervalos]
+        # Máxima frecuencia alta del subarbol cuya raíz es el índice *mid* del rango [lo, hi).
+        self._max = [0.0] * len(intervalos)
+        self._construir(0, len(intervalos))
+
+    def __len__(self):
+        return len(self._items)
+
+    def _construir(self, lo, hi):
+        if lo >= hi:
+            return float('-inf')
+        mid = (lo + hi) // 2
+        maximo = max(self._highs[mid], self._construir(lo, mid), self._construir(mid + 1, hi))
+        self._max[mid] = maximo
+        return maximo
+
+    def overlapping(self, desde, hasta):
+        """Returns the items whose interval overlaps [desde, hasta], in increasing order of their low frequency."""
+        encontrados = []
+        pendientes = [(0, len(self._items))]
+        while pendientes:
+            lo, hi = pendientes.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max[mid] < desde:
+                continue
+            pendientes.append((lo, mid))
+            # Los nodos a la derecha empiezan en frecuencias aún más altas.
+            if self._lows[mid] <= hasta:
+                if self._highs[mid] >= desde:
+                    encontrados.append(mid)
+                pendientes.append((mid + 1, hi))
+        encontrados.sort()
+        return [self._items[indice] for indice in encontrados]
+
+class TransmitterIndex:
+    """Interval indexes over the downlink and uplink ranges of the transmitters."""
+
+    DIRECCIONES = ('downlink', 'uplink')
+
+    def __init__(self, transmitters):
+        """Builds the indexes.
+
+        Parameters:
+        transmitters (iterable): Transmitters as returned by getTransmitterSatellite. A transmitter without
+                                 an upper frequency is indexed as a single frequency.
+        """
+        intervalos = {direccion: [] for direccion in self.DIRECCIONES}
+        for transmitter in transmitters:
+            for direccion in self.DIRECCIONES:
+                low = transmitter.get(f'{direccion}_low')
+                if low is None:
+                    continue
+                high = transmitter.get(f'{direccion}_high')
+                if high is None or high < low:
+                    high = low
+                intervalos[direccion].append((low, high, transmitter))
+        self._indices = {direccion: FrequencyIntervalIndex(intervalos[direccion]) for direccion in self.DIRECCIONES}
+
+    def search(self, direccion, desde, hasta, solo_vivos=True):
+        """Returns the transmitters whose range in the given direction overlaps [desde, hasta] Hz.
+
+        Parameters:
+        direccion (str): "downlink" or "uplink".
+        desde (float): Lower frequency of the window in Hz.
+        hasta (float): Upper frequency of the window in Hz.
+        solo_vivos (bool, optional): Only transmitters marked as alive by SatNogs.
+
+        Raises:
+        ValueError: The direction is not downlink or uplink.
+        """
+        if direccion not in self._indices:
+            raise ValueError(f'direccion debe ser una de {", ".join(self.DIRECCIONES)}')
+        transmitters = self._indices[direccion].overlapping(desde, hasta)
+        if solo_vivos:
+            transmitters = [transmitter for transmitter in transmitters if transmitter.get('alive')]
+        return transmitters